@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, DriverProfile, PasswordReset
+from .models import CustomUser, DriverProfile, PasswordReset, OutboundMessage
 
 # Register your models here.
 class CustomUserAdmin(UserAdmin):
@@ -31,4 +31,16 @@ class PasswordResetAdmin(admin.ModelAdmin):
     list_filter = ('is_used', 'created_at', 'expires_at')
     search_fields = ('user__email', 'reset_token')
     readonly_fields = ('reset_token', 'created_at', 'expires_at')
-    ordering = ('-created_at',)
\ No newline at end of file
+    ordering = ('-created_at',)
+
+@admin.register(OutboundMessage)
+class OutboundMessageAdmin(admin.ModelAdmin):
+    list_display = ('channel', 'recipient', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('channel', 'status', 'created_at')
+    search_fields = ('recipient', 'subject')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    ordering = ('-created_at',)
+
+    def get_exclude(self, request, obj=None):
+        # Verification codes waiting to be sent stay out of the admin
+        return ('body', 'html_body') if obj and obj.sensitive else ()
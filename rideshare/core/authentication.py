@@ -0,0 +1,124 @@
+"""
+Cached JWT authentication
+Verified token claims and users are cached so steady-state authenticated
+requests don't re-verify tokens or query the user table
+"""
+import hashlib
+import time
+import jwt
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, DEFAULT_CACHE_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .caching import is_process_local
+
+User = get_user_model()
+
+CLAIMS_CACHE_PREFIX = 'auth:claims:'
+USER_CACHE_PREFIX = 'auth:user:'
+
+
+def _token_digest(raw_token):
+    if isinstance(raw_token, str):
+        raw_token = raw_token.encode()
+    return hashlib.sha256(raw_token).hexdigest()
+
+
+def get_verified_claims(raw_token):
+    """
+    Get the claims of a signed, unexpired token, verifying it at most once per jti
+
+    Args:
+        raw_token (str | bytes): The encoded JWT
+
+    Returns:
+        dict: The token payload
+
+    Raises:
+        TokenError: If the token is malformed, badly signed or expired
+    """
+    try:
+        # Unverified peek at the jti; the cached digest below proves it's the same token
+        jti = jwt.decode(raw_token, options={'verify_signature': False}).get(api_settings.JTI_CLAIM)
+    except jwt.InvalidTokenError:
+        raise TokenError(_('Token is invalid'))
+
+    digest = _token_digest(raw_token)
+    if jti:
+        cached = cache.get(f'{CLAIMS_CACHE_PREFIX}{jti}')
+        if cached and cached['digest'] == digest and cached['claims']['exp'] > time.time():
+            return cached['claims']
+
+    claims = UntypedToken(raw_token).payload
+    ttl = int(claims['exp'] - time.time())
+    if jti and ttl > 0:
+        cache.set(f'{CLAIMS_CACHE_PREFIX}{jti}', {'digest': digest, 'claims': claims}, timeout=ttl)
+    return claims
+
+
+def user_cache_enabled():
+    """
+    Whether users are cached between requests
+
+    Saves invalidate a cached user only in the cache they reach, so a
+    per-process cache would let other workers keep authenticating a
+    deactivated user or a changed password until the entry expires.
+    Users are only cached when the default cache is shared.
+    """
+    return settings.AUTH_USER_CACHE_SECONDS > 0 and not is_process_local(DEFAULT_CACHE_ALIAS)
+
+
+def get_cached_user(user_id):
+    """
+    Get a user by id, served from the shared cache for AUTH_USER_CACHE_SECONDS
+
+    Returns:
+        User | None: The user, or None if it doesn't exist
+    """
+    key = f'{USER_CACHE_PREFIX}{user_id}'
+    enabled = user_cache_enabled()
+    user = cache.get(key) if enabled else None
+    if user is None:
+        try:
+            user = User.objects.get(id=user_id)
+        except (User.DoesNotExist, ValueError, TypeError):
+            return None
+        if enabled:
+            cache.set(key, user, timeout=settings.AUTH_USER_CACHE_SECONDS)
+    return user
+
+
+def invalidate_user(user_id):
+    """Drop a cached user so the next request reloads it"""
+    cache.delete(f'{USER_CACHE_PREFIX}{user_id}')
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that loads the user through the shared user cache
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
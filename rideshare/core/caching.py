@@ -0,0 +1,298 @@
+"""
+Two-tier read-through cache
+A small per-process LRU in front of the shared Django cache, with namespaced
+keys, version-based invalidation and stampede protection, for hot reads that
+are cheap to serve slightly stale and expensive to recompute
+"""
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'tier:'
+
+# Longest argument part of a key kept readable; longer ones are hashed (memcached caps keys at 250 bytes)
+MAX_KEY_ARGS_LENGTH = 150
+
+# Seconds between a waiting reader's checks for a value another process is computing
+LOCK_POLL_SECONDS = 0.025
+
+# Events counted per namespace
+STAT_EVENTS = ('local_hits', 'hits', 'misses', 'early_recomputes', 'stale_served', 'lock_waits')
+
+# {namespace: TieredCache}, for invalidating and reporting by name
+registry = {}
+
+
+class LocalLRU:
+    """
+    A bounded, thread-safe in-process cache with per-entry expiry
+
+    Least recently used entries are dropped once max_entries is reached.
+    Values are shared between callers, so they must be treated as read-only.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, generation):
+        """The value stored under key at this generation, or None once expired or invalidated"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, entry_generation, deadline = entry
+            if entry_generation != generation or deadline <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, generation, ttl):
+        with self.lock:
+            self.entries[key] = (value, generation, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TieredCache:
+    """
+    Read-through cache for one namespace of values
+
+    Lookups try the process's LRU, then the shared cache, then compute. Each
+    scope, e.g. a user id, has a version token in the shared cache that is
+    read in the same round trip as the value; invalidating a scope replaces
+    its token, so every value stored under the old one misses at once.
+    Other processes may serve their local copy for up to local_ttl seconds
+    after an invalidation.
+
+    Stampedes are prevented two ways. A value is recomputed early with a
+    probability that rises as its expiry nears and with how long it took to
+    compute (XFetch), so one reader usually refreshes it before it expires.
+    Once a value is missing or expired, a single reader takes a lock in the
+    shared cache and computes it; the others serve the expired value, or wait
+    briefly for the new one if it was invalidated.
+    """
+
+    def __init__(self, namespace, ttl, local_ttl=None, beta=None, lock_timeout=None, alias=None):
+        if namespace in registry:
+            raise ValueError(f"Cache namespace '{namespace}' is already in use")
+        registry[namespace] = self
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local_ttl = min(ttl, settings.CACHE_LOCAL_TTL_SECONDS if local_ttl is None else local_ttl)
+        self.beta = settings.CACHE_EARLY_RECOMPUTE_BETA if beta is None else beta
+        self.lock_timeout = lock_timeout or settings.CACHE_LOCK_SECONDS
+        self.alias = alias or settings.TIERED_CACHE
+        self.local = LocalLRU(settings.CACHE_LOCAL_MAX_ENTRIES)
+        # Bumped by invalidations in this process, which drop all of its local copies at once
+        self.generation = 0
+        # This process's counts, and those not yet added to the shared totals
+        self.stats = Counter()
+        self.unflushed = Counter()
+        self.flushed_at = time.monotonic()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def prefix(self, scope):
+        return f'{CACHE_KEY_PREFIX}{self.namespace}:{"" if scope is None else scope}:'
+
+    def get_or_set(self, key, compute, scope=None):
+        """
+        Get the value cached under key in a scope, computing it on a miss
+
+        Args:
+            key (str): Identifies the value within the scope
+            compute (callable): Called with no arguments to produce the value
+            scope: Optional group of keys invalidated together, e.g. a user id
+
+        Returns:
+            The cached or computed value; treat it as read-only, it is shared
+        """
+        generation = self.generation
+        value_key, version_key = f'{self.prefix(scope)}{key}', f'{self.prefix(scope)}version'
+        value = self.local.get(value_key, generation)
+        if value is not None:
+            self.count('local_hits')
+            return value
+
+        found = self.shared.get_many([version_key, value_key])
+        version = found.get(version_key)
+        if version is None:
+            version = self.new_version(version_key)
+        entry = found.get(value_key)
+        if entry is not None and entry[0] == version:
+            _, value, delta, expires = entry
+            now = time.time()
+            # XFetch: recompute early with a probability rising as expiry nears; -log(u) is in [0, inf)
+            if now - delta * self.beta * math.log(1 - random.random()) < expires:
+                self.count('hits')
+                self.local.set(value_key, value, generation, min(self.local_ttl, expires - now))
+                return value
+            self.count('early_recomputes' if now < expires else 'misses')
+        else:
+            entry = None
+            self.count('misses')
+
+        lock_key = f'{value_key}:lock'
+        locked = self.shared.add(lock_key, 1, timeout=self.lock_timeout)
+        if not locked:
+            if entry is not None:
+                # Someone else is refreshing it; the expired value is still this version's
+                self.count('stale_served')
+                return entry[1]
+            value = self.wait_for(value_key, version)
+            if value is not None:
+                return value
+
+        try:
+            started = time.perf_counter()
+            value = compute()
+            delta = time.perf_counter() - started
+            # Kept past its expiry so readers can serve it while one of them recomputes
+            self.shared.set(value_key, (version, value, delta, time.time() + self.ttl), timeout=self.ttl * 2)
+            self.local.set(value_key, value, generation, self.local_ttl)
+        finally:
+            if locked:
+                self.shared.delete(lock_key)
+        return value
+
+    def new_version(self, version_key):
+        """Create a scope's version token, or read the one a concurrent reader created"""
+        version = uuid.uuid4().hex
+        if self.shared.add(version_key, version, timeout=self.ttl * 2):
+            return version
+        return self.shared.get(version_key) or version
+
+    def wait_for(self, value_key, version):
+        """Poll for a value another process is computing; None if it doesn't arrive within the lock timeout"""
+        self.count('lock_waits')
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_SECONDS)
+            entry = self.shared.get(value_key)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+        return None
+
+    def invalidate(self, *scopes):
+        """
+        Drop every value cached in the given scopes (the unscoped values if none
+        are given), once the surrounding transaction commits
+
+        Invalidating before the commit would let a reader recompute from the
+        old rows and cache them under the new version.
+        """
+        scopes = scopes or (None,)
+        transaction.on_commit(lambda: self.invalidate_now(scopes))
+
+    def invalidate_now(self, scopes):
+        self.generation += 1
+        # Tokens are random, so one that expires or is evicted only causes misses; it never outlives its values
+        self.shared.set_many({f'{self.prefix(scope)}version': uuid.uuid4().hex for scope in scopes},
+                             timeout=self.ttl * 2)
+
+    def memoize(self, scope=None):
+        """
+        Decorate a function so its results are cached by argument
+
+        Args:
+            scope (callable): Optional; given the call's arguments, returns the
+                scope to cache the result in
+
+        Returns:
+            callable: The decorator; the wrapped function gets `invalidate` and `tier` attributes
+        """
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                key = ':'.join([str(arg) for arg in args] + [f'{k}={v}' for k, v in sorted(kwargs.items())])
+                if len(key) > MAX_KEY_ARGS_LENGTH:
+                    key = hashlib.sha256(key.encode()).hexdigest()
+                return self.get_or_set(key, lambda: function(*args, **kwargs),
+                                       scope=scope(*args, **kwargs) if scope else None)
+            wrapper.invalidate = self.invalidate
+            wrapper.tier = self
+            return wrapper
+        return decorator
+
+    def stats_key(self, event):
+        return f'{CACHE_KEY_PREFIX}{self.namespace}:stats:{event}'
+
+    def count(self, event):
+        self.stats[event] += 1
+        self.unflushed[event] += 1
+        self.flush_stats()
+
+    def flush_stats(self, force=False):
+        """Add this process's counters to the shared totals, at most every CACHE_STATS_FLUSH_SECONDS"""
+        now = time.monotonic()
+        if not force and now - self.flushed_at < settings.CACHE_STATS_FLUSH_SECONDS:
+            return
+        pending, self.unflushed, self.flushed_at = self.unflushed, Counter(), now
+        for event in STAT_EVENTS:
+            if pending[event]:
+                key = self.stats_key(event)
+                if not self.shared.add(key, pending[event], timeout=None):
+                    try:
+                        self.shared.incr(key, pending[event])
+                    except ValueError:
+                        logger.warning("Lost %s %s cache stats", pending[event], event)
+
+    def shared_stats(self):
+        """Counters summed across every process that has flushed them"""
+        keys = {self.stats_key(event): event for event in STAT_EVENTS}
+        found = self.shared.get_many(list(keys))
+        return Counter({event: found.get(key, 0) for key, event in keys.items()})
+
+
+def cached(namespace, ttl, scope=None, **options):
+    """
+    Cache a function's results in a new TieredCache namespace
+
+    Args:
+        namespace (str): Unique name for the cached values
+        ttl (int): Seconds a value is served before it is recomputed
+        scope (callable): Optional; given the call's arguments, returns the
+            scope the result is invalidated with
+        **options: local_ttl, beta, lock_timeout or alias for the TieredCache
+
+    Returns:
+        callable: The decorator
+    """
+    return TieredCache(namespace, ttl, **options).memoize(scope)
+
+
+def is_process_local(alias):
+    """Whether a cache alias keeps its entries in each process's memory, unseen by other workers"""
+    return settings.CACHES[alias]['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def clear_local():
+    """Drop this process's local copies in every namespace, e.g. after clearing the shared cache"""
+    for tier in registry.values():
+        tier.local.clear()
+
+
+def invalidate(namespace, *scopes):
+    """Invalidate scopes of a registered namespace, on commit"""
+    registry[namespace].invalidate(*scopes)
@@ -0,0 +1,38 @@
+"""
+System checks for settings that only work with a cache shared by all workers
+"""
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.checks import Warning, register
+from .caching import is_process_local
+
+# Settings naming a cache alias that every process must see the same entries in
+SHARED_CACHE_SETTINGS = {
+    'THROTTLE_CACHE': 'rate limits are counted per worker',
+    'OTP_CACHE': 'phone codes are checked in the database on every attempt',
+    'TIERED_CACHE': "invalidated reads stay stale in other workers until they expire",
+}
+
+
+@register()
+def check_shared_caches(app_configs, **kwargs):
+    """Warn when a cache that must be shared is per-process memory, unless running with DEBUG"""
+    if settings.DEBUG:
+        return []
+    warnings = []
+    for name, consequence in SHARED_CACHE_SETTINGS.items():
+        alias = getattr(settings, name)
+        if is_process_local(alias):
+            warnings.append(Warning(
+                f"{name} uses the per-process cache '{alias}', so {consequence}",
+                hint="Point CACHE_BACKEND and CACHE_LOCATION (or the setting) at Redis or memcached",
+                id='core.W001',
+            ))
+    if is_process_local(DEFAULT_CACHE_ALIAS):
+        warnings.append(Warning(
+            "The default cache is per-process, so surge multipliers published by update_surge_pricing "
+            "never reach the web workers",
+            hint="Set CACHE_BACKEND and CACHE_LOCATION to Redis or memcached",
+            id='core.W002',
+        ))
+    return warnings
@@ -0,0 +1,11 @@
+"""
+PostgreSQL backend with connection checkout metrics
+Django's backend, unchanged apart from timing each request's connection
+checkout for core.middleware.ConnectionCheckoutMiddleware
+"""
+from django.db.backends.postgresql import base
+from core.db.checkout import CheckoutMetricsMixin
+
+
+class DatabaseWrapper(CheckoutMetricsMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,69 @@
+"""
+Database connection checkout metrics
+Records how each request got its connection - a new one, a persistent one
+that passed its health check, or one from the worker's pool - and how long
+that took, per request and in per-process totals
+"""
+import threading
+import time
+from collections import Counter, namedtuple
+
+# How a request's first query got a connection
+NEW = 'new'  # Opened for this request: connect, authenticate, set up the session
+REUSED = 'reused'  # Kept from an earlier request and health-checked
+RECONNECTED = 'reconnected'  # Kept, failed its health check, and replaced
+POOLED = 'pooled'  # Taken from the worker's connection pool
+
+Checkout = namedtuple('Checkout', ['kind', 'seconds'])
+
+_lock = threading.Lock()
+checkout_counts = Counter()
+checkout_seconds = Counter()
+
+
+def record_checkout(checkout):
+    """Add a request's checkout to this process's totals"""
+    with _lock:
+        checkout_counts[checkout.kind] += 1
+        checkout_seconds[checkout.kind] += checkout.seconds
+
+
+def checkout_summary():
+    """
+    This process's checkouts so far
+
+    Returns:
+        dict: {kind: (count, mean milliseconds)}
+    """
+    with _lock:
+        return {kind: (count, checkout_seconds[kind] / count * 1000) for kind, count in checkout_counts.items()}
+
+
+class CheckoutMetricsMixin:
+    """
+    Database wrapper mixin timing the first connection use after reset_checkout()
+
+    The checkout covers what Django does before a request's first query: the
+    health check of a kept connection and, if there is none or it failed,
+    opening a new one or taking one from the pool.
+    """
+    checkout = None
+
+    def reset_checkout(self):
+        self.checkout = None
+
+    def _cursor(self, name=None):
+        if self.checkout is None:
+            kept = self.connection is not None
+            started = time.perf_counter()
+            self.close_if_health_check_failed()
+            survived = self.connection is not None
+            self.ensure_connection()
+            if getattr(self, 'pool', None):
+                kind = POOLED
+            elif survived:
+                kind = REUSED
+            else:
+                kind = RECONNECTED if kept else NEW
+            self.checkout = Checkout(kind, time.perf_counter() - started)
+        return super()._cursor(name)
@@ -0,0 +1,108 @@
+"""
+HTTP benchmark helpers
+Run gunicorn on a local port for the length of a benchmark, and drive it with
+concurrent keep-alive clients
+"""
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+import aiohttp
+from django.conf import settings
+from django.core.management.base import CommandError
+
+
+def percentile(samples, q):
+    """The q-th percentile of durations in seconds, as milliseconds"""
+    if len(samples) < 2:
+        return samples[0] * 1000 if samples else 0.0
+    return statistics.quantiles(samples, n=100)[q - 1] * 1000
+
+
+@contextmanager
+def gunicorn(app, port, *options, env=None, timeout=30):
+    """
+    Serve an app with gunicorn.conf.py on 127.0.0.1 until the block exits
+
+    Args:
+        app (str): The WSGI or ASGI application, e.g. 'rideshare.wsgi'
+        port (int): Port to bind
+        options (str): More gunicorn command-line options
+        env (dict): Environment overrides, e.g. for settings read with config()
+        timeout (float): Seconds to wait for the server to listen
+
+    Yields:
+        str: The server's base URL
+    """
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', app, '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', *options],
+        cwd=settings.BASE_DIR, env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if server.poll() is not None:
+                raise CommandError(f"gunicorn exited with status {server.returncode}")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise CommandError(f"gunicorn didn't listen on port {port} within {timeout}s")
+                time.sleep(0.1)
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+async def drive(urls, headers, concurrency, seconds, timeout=10):
+    """
+    Send GET requests from concurrent keep-alive clients for a number of seconds
+
+    Args:
+        urls (list): URLs each client cycles through
+        headers (dict): Headers sent with every request
+        concurrency (int): Clients, each with at most one request in flight
+        seconds (float): How long to keep sending
+        timeout (float): Seconds before a request counts as timed out
+
+    Returns:
+        tuple: (latencies of 2xx responses in seconds, Counter of errors by status or kind, elapsed seconds)
+    """
+    latencies = []
+    errors = Counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, headers=headers,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        started = time.perf_counter()
+        deadline = started + seconds
+
+        async def client(offset):
+            sent = offset
+            while time.perf_counter() < deadline:
+                url = urls[sent % len(urls)]
+                sent += 1
+                requested = time.perf_counter()
+                try:
+                    async with session.get(url) as response:
+                        await response.read()
+                except asyncio.TimeoutError:
+                    errors['timeout'] += 1
+                    continue
+                except aiohttp.ClientError as exc:
+                    errors[type(exc).__name__] += 1
+                    continue
+                if response.status < 300:
+                    latencies.append(time.perf_counter() - requested)
+                else:
+                    errors[response.status] += 1
+
+        await asyncio.gather(*(client(i) for i in range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
@@ -0,0 +1,125 @@
+import random
+import statistics
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.caching import TieredCache, clear_local, registry
+from rideon.models import Rating
+from rideon.reads import ride_totals
+from rideon.seed import seed_users, seed_rides, seed_ratings
+from rideon.signals import rating_values, update_rating_summary
+
+User = get_user_model()
+
+# Cached endpoints timed cold and warm
+ENDPOINTS = {
+    'ride_summary': '/api/summary/',
+    'my_ratings': '/api/my-ratings/',
+    'available_rides': '/api/available/',
+    'fare_info_surge': '/api/fare-info/?lat=6.55&lng=3.375',
+}
+
+
+class Command(BaseCommand):
+    help = 'Time the cached hot reads cold and warm, and check concurrent misses compute a value once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rides', type=int, default=20000, help='Rides seeded across the riders')
+        parser.add_argument('--riders', type=int, default=200)
+        parser.add_argument('--samples', type=int, default=50, help='Requests timed per endpoint and state')
+        parser.add_argument('--threads', type=int, default=32, help='Concurrent readers of one expired key')
+
+    def handle(self, *args, **options):
+        rng = random.Random(22)
+        shared = caches[settings.TIERED_CACHE]
+        self.stdout.write(f"🗄️  {options['rides']:,} rides across {options['riders']} riders")
+        self.stdout.write("=" * 50)
+
+        riders = seed_users(options['riders'], prefix='cacherider')
+        driver = seed_users(1, user_type='DRIVER', prefix='cachedriver')[0]
+        try:
+            # Half the rides are still pending, so the open pool is large
+            seed_rides(riders, options['rides'] // 2, rng=rng)
+            seed_rides(riders, options['rides'] - options['rides'] // 2, status='completed', drivers=[driver], rng=rng)
+            # Seeded ratings skip the signals; give them a summary so deleting them balances out
+            for rating in seed_ratings(driver, riders[:50], rng=rng):
+                update_rating_summary(driver.id, added=rating_values(rating))
+
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(driver).access_token}')
+            client.get('/driver-dashboard/')
+            timings = {}
+            for name, url in ENDPOINTS.items():
+                cold = self.time(client, url, options['samples'], before=lambda: self.clear(shared, client))
+                warm = self.time(client, url, options['samples'])
+                timings[name] = (cold, warm)
+
+            computes = self.stampede(driver.id, options['threads'])
+        finally:
+            # Ratings go before their users, or the cascade reaches them after the summary they decrement
+            Rating.objects.filter(rated_user=driver).delete()
+            User.objects.filter(id__in=[user.id for user in riders] + [driver.id]).delete()
+
+        for name, (cold, warm) in timings.items():
+            self.stdout.write(f"{name + ':':<17} cold p50 {cold:7.2f}ms, warm p50 {warm:6.2f}ms ({cold / warm:.0f}x)")
+        for namespace, tier in registry.items():
+            if namespace == 'benchmark_stampede':
+                continue
+            stats = tier.stats  # This process's counts; cache_stats shows the totals across processes
+            served = stats['local_hits'] + stats['hits']
+            total = served + stats['misses'] + stats['early_recomputes']
+            if total:
+                self.stdout.write(f"{namespace + ':':<17} {stats['local_hits']} local hits, {stats['hits']} shared hits, "
+                                  f"{stats['misses']} misses ({served / total:.0%} hit rate)")
+        self.stdout.write(f"{options['threads']} concurrent readers of an expired key: {computes} computation(s)")
+
+        if computes != 1:
+            raise CommandError(f"{computes} computations for one expired key")
+        self.stdout.write(self.style.SUCCESS("✅ Concurrent misses computed the value once"))
+
+    def clear(self, shared, client):
+        """Empty both tiers, then re-warm the auth cache so only the cached read is cold"""
+        shared.clear()
+        clear_local()
+        client.get('/driver-dashboard/')
+
+    def time(self, client, url, samples, before=None):
+        timings = []
+        for _ in range(samples):
+            if before:
+                before()
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(f"{url} returned {response.status_code}")
+        return statistics.median(timings) * 1000
+
+    def stampede(self, user_id, threads):
+        """Start readers of one key together, as when a hot value expires, and count how many computed it"""
+        tier = TieredCache('benchmark_stampede', ttl=60, local_ttl=0)
+        computes = []
+        barrier = threading.Barrier(threads)
+
+        def compute():
+            computes.append(1)
+            return ride_totals.__wrapped__(user_id)
+
+        def read():
+            barrier.wait()
+            try:
+                tier.get_or_set(str(user_id), compute)
+            finally:
+                close_old_connections()
+
+        workers = [threading.Thread(target=read) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return len(computes)
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.loadgen import gunicorn, percentile
+from rideon.seed import seed_users
+
+User = get_user_model()
+
+# Environment each connection mode runs gunicorn with; see DATABASES in settings
+MODES = {
+    'per_request': {'DB_CONN_MAX_AGE': '0', 'DB_POOL_SIZE': '0'},
+    'persistent': {'DB_CONN_MAX_AGE': '600', 'DB_POOL_SIZE': '0'},
+    'pooled': {'DB_CONN_MAX_AGE': '0'},  # DB_POOL_SIZE is set to the worker's threads
+}
+
+
+class Command(BaseCommand):
+    help = 'Serve a one-query endpoint from gunicorn in each connection mode and compare connection checkout per request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per worker')
+        parser.add_argument('--concurrency', type=int, default=16, help='Clients sending requests at once')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--path', default='/api/messages/unread/', help='Endpoint to request')
+
+    def handle(self, *args, **options):
+        if find_spec('gunicorn') is None:
+            raise CommandError('gunicorn is not installed (pip install -r requirements.txt)')
+        self.stdout.write(f"🔌 {options['requests']:,} requests per mode from {options['concurrency']} clients to "
+                          f"{options['workers']} workers x {options['threads']} threads")
+        self.stdout.write("=" * 50)
+
+        user = seed_users(1, prefix='connbench')[0]
+        token = str(RefreshToken.for_user(user).access_token)
+        results = {}
+        try:
+            for mode in options['modes']:
+                if mode == 'pooled' and find_spec('psycopg_pool') is None:
+                    self.stdout.write(f"{mode}: skipped, needs psycopg 3 with its pool (pip install \"psycopg[binary,pool]\")")
+                    continue
+                results[mode] = self.run_mode(mode, token, options)
+        finally:
+            User.objects.filter(id=user.id).delete()
+
+        failures = []
+        for mode, (rate, latencies, checkouts) in results.items():
+            durations = [seconds for _, seconds in checkouts]
+            kinds = Counter(kind for kind, _ in checkouts)
+            self.stdout.write(f"{mode + ':':<13} {rate:7,.0f} req/s, request p50 {percentile(latencies, 50):6.2f}ms "
+                              f"p99 {percentile(latencies, 99):6.2f}ms, checkout p50 {percentile(durations, 50):5.2f}ms "
+                              f"p99 {percentile(durations, 99):5.2f}ms ({', '.join(f'{n:,} {kind}' for kind, n in kinds.most_common())})")
+            if len(checkouts) < len(latencies):
+                failures.append(f"{mode}: {len(latencies) - len(checkouts)} responses had no checkout timing")
+            # A persistent connection is opened once per thread, not per request
+            if mode == 'persistent' and kinds['new'] > options['workers'] * options['threads']:
+                failures.append(f"persistent mode opened {kinds['new']} connections")
+
+        if failures:
+            raise CommandError('; '.join(failures))
+        self.stdout.write(self.style.SUCCESS("✅ Every request reported its connection checkout"))
+
+    def run_mode(self, mode, token, options):
+        """Start gunicorn in a connection mode, warm every thread, then time a burst of requests"""
+        env = dict(MODES[mode])
+        if mode == 'pooled':
+            env['DB_POOL_SIZE'] = str(options['threads'])
+        with gunicorn('rideshare.wsgi', options['port'], '--workers', str(options['workers']),
+                      '--threads', str(options['threads']), env=env) as base_url:
+            url = base_url + options['path']
+            sessions = threading.local()
+
+            def fetch(_):
+                if not hasattr(sessions, 'session'):
+                    sessions.session = requests.Session()
+                    sessions.session.headers['Authorization'] = f'Bearer {token}'
+                started = time.perf_counter()
+                response = sessions.session.get(url, timeout=30)
+                elapsed = time.perf_counter() - started
+                if response.status_code != 200:
+                    raise CommandError(f"{url} returned {response.status_code} in {mode} mode")
+                return elapsed, self.parse_checkout(response.headers.get('Server-Timing', ''))
+
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                # Warm up: load the app and fill the auth cache in every worker
+                list(pool.map(fetch, range(options['workers'] * options['threads'] * 4)))
+                started = time.perf_counter()
+                outcomes = list(pool.map(fetch, range(options['requests'])))
+                rate = options['requests'] / (time.perf_counter() - started)
+
+        latencies = [elapsed for elapsed, _ in outcomes]
+        checkouts = [checkout for _, checkout in outcomes if checkout]
+        return rate, latencies, checkouts
+
+    @staticmethod
+    def parse_checkout(header):
+        """Read (kind, seconds) from a `db-checkout;dur=0.41;desc="reused"` Server-Timing entry"""
+        for entry in header.split(','):
+            name, *params = [part.strip() for part in entry.split(';')]
+            if name != 'db-checkout':
+                continue
+            values = dict(param.split('=', 1) for param in params if '=' in param)
+            return values.get('desc', '').strip('"'), float(values.get('dur', 0)) / 1000
+        return None
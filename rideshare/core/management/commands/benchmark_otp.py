@@ -0,0 +1,102 @@
+import random
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from core.caching import is_process_local
+from core.models import PhoneVerification
+from core.otp import OTPStore, VERIFIED, INVALID, generate_code, hash_code
+from rideon.seed import seed_users
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare issuing and verifying phone codes through the cache-backed OTP store against the old per-row flow'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--codes', type=int, default=2000, help='Codes issued and verified per flow')
+        parser.add_argument('--users', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if is_process_local(settings.OTP_CACHE):
+            raise CommandError("OTP_CACHE is per-process memory, so codes are only kept in the database; "
+                               "point it at a shared cache (CACHE_BACKEND) to benchmark the store")
+        count = options['codes']
+        rng = random.Random(21)
+        caches[settings.OTP_CACHE].clear()
+        self.stdout.write(f"🔐 {count:,} codes, each with a wrong guess and then the right one")
+        self.stdout.write("=" * 50)
+
+        users = seed_users(options['users'], prefix='otpuser')
+        picks = [rng.choice(users) for _ in range(count)]
+        try:
+            statements = [0]
+            with connection.execute_wrapper(self.counter(statements)):
+                started = time.perf_counter()
+                for user in picks:
+                    self.legacy(user)
+                legacy = count / (time.perf_counter() - started)
+            legacy_statements, statements[0] = statements[0] / count, 0
+
+            store = OTPStore()
+            outcomes = []
+            with connection.execute_wrapper(self.counter(statements)):
+                started = time.perf_counter()
+                for user in picks:
+                    code, _ = store.issue(user, user.phone_number)
+                    outcomes.append(store.verify(user, user.phone_number, self.wrong(code))[0])
+                    outcomes.append(store.verify(user, user.phone_number, code)[0])
+                cached = count / (time.perf_counter() - started)
+            cached_statements = statements[0] / count
+
+            # Wrong guesses alone, the traffic a brute-force attempt generates
+            code, _ = store.issue(picks[0], picks[0].phone_number)
+            with CaptureQueriesContext(connection) as queries:
+                store.verify(picks[0], picks[0].phone_number, self.wrong(code))
+            guess_statements = len(queries)
+        finally:
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+
+        self.stdout.write(f"PhoneVerification rows:  {legacy:,.0f} codes/s ({legacy_statements:.0f} statements each)")
+        self.stdout.write(f"Cache-backed OTP store:  {cached:,.0f} codes/s ({cached_statements:.0f} statements each)")
+        self.stdout.write(f"Speedup: {cached / legacy:.1f}x; a wrong guess ran {guess_statements} statements")
+
+        expected = [INVALID, VERIFIED] * count
+        if outcomes != expected:
+            raise CommandError(f"{sum(a != b for a, b in zip(outcomes, expected))} codes verified wrongly")
+        if guess_statements:
+            raise CommandError(f"A wrong guess ran {guess_statements} statements")
+        self.stdout.write(self.style.SUCCESS("✅ Every code verified from the cache, wrong guesses without the database"))
+
+    def legacy(self, user):
+        """The flow send_verification_code and verify_phone_code ran before the OTP store"""
+        code = generate_code()
+        PhoneVerification.objects.create(
+            user=user, phone_number=user.phone_number,
+            code_hash=hash_code(user.pk, user.phone_number, code),
+        )
+        for guess in (self.wrong(code), code):
+            verification = PhoneVerification.objects.filter(
+                user=user, phone_number=user.phone_number, is_verified=False,
+            ).order_by('-created_at').first()
+            verification.attempts += 1
+            verification.save()
+            if verification.code_hash == hash_code(user.pk, user.phone_number, guess):
+                verification.is_verified = True
+                verification.save()
+
+    @staticmethod
+    def counter(statements):
+        """An execute wrapper counting statements, without keeping them like CaptureQueriesContext"""
+        def count(execute, sql, params, many, context):
+            statements[0] += 1
+            return execute(sql, params, many, context)
+        return count
+
+    @staticmethod
+    def wrong(code):
+        return f'{(int(code) + 1) % 1000000:06d}'
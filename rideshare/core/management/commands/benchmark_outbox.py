@@ -0,0 +1,89 @@
+import logging
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from core.models import OutboundMessage
+from core.outbox import OutboxWorker, enqueue_sms
+from core.sms_service import SMSService
+
+
+def percentiles(samples):
+    """Get p50/p99 of a list of durations in seconds, as milliseconds"""
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return value, value
+    cuts = statistics.quantiles(samples, n=100)
+    return cuts[49] * 1000, cuts[98] * 1000
+
+
+class Command(BaseCommand):
+    help = 'Benchmark outbox delivery against a local fake SMS provider'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200, help='Messages to deliver per run')
+        parser.add_argument('--latency', type=int, default=200, help='Fake provider round trip in ms')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of fake sends that fail')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 8, 32], help='Thread pool sizes to compare')
+
+    def handle(self, *args, **options):
+        sms = SMSService()
+        sms.enabled = True
+        sms.provider = 'fake'
+        sms.fake_latency_ms = options['latency']
+        sms.fake_failure_rate = options['failure_rate']
+        count = options['messages']
+
+        # Simulated failures are expected; don't log a warning for each retry
+        logging.getLogger('core.outbox').setLevel(logging.ERROR)
+
+        self.stdout.write(f"📤 {count} messages, fake provider at {options['latency']}ms, "
+                          f"{options['failure_rate']:.0%} failures")
+        self.stdout.write("=" * 60)
+
+        # What a request handler used to pay per message
+        inline = []
+        for _ in range(min(count, 10)):
+            started = time.perf_counter()
+            sms.send_message('+2348000000000', 'Benchmark message')
+            inline.append(time.perf_counter() - started)
+        inline_p50, _ = percentiles(inline)
+        self.stdout.write(f"Inline send in request:  p50 {inline_p50:.1f}ms")
+
+        # Retry immediately so failed messages don't stretch the run with backoff
+        with override_settings(OUTBOX_RETRY_BASE_SECONDS=0):
+            for workers in options['workers']:
+                with transaction.atomic():
+                    self.run(sms, workers, count)
+                    transaction.set_rollback(True)
+
+    def run(self, sms, workers, count):
+        enqueue_times = []
+        for i in range(count):
+            started = time.perf_counter()
+            enqueue_sms(f'+234800{i:07d}', 'Benchmark message')
+            enqueue_times.append(time.perf_counter() - started)
+        enqueue_p50, enqueue_p99 = percentiles(enqueue_times)
+
+        worker = OutboxWorker(workers=workers, batch_size=max(workers * 2, 50), sms=sms)
+        queued = OutboundMessage.objects.filter(status='pending')
+        started = time.perf_counter()
+        try:
+            outcomes = worker.run(poll_interval=0, stop=lambda: not queued.exists())
+        finally:
+            worker.close()
+        elapsed = time.perf_counter() - started
+
+        delays = [
+            (message.sent_at - message.created_at).total_seconds()
+            for message in OutboundMessage.objects.filter(status='sent').only('created_at', 'sent_at')
+        ]
+        delay_p50, delay_p99 = percentiles(delays)
+
+        self.stdout.write(f"\n{workers} worker threads:")
+        self.stdout.write(f"  Enqueue in request:   p50 {enqueue_p50:.2f}ms, p99 {enqueue_p99:.2f}ms")
+        self.stdout.write(f"  Throughput:           {count / elapsed:.0f} messages/s")
+        self.stdout.write(f"  Enqueue to sent:      p50 {delay_p50:.0f}ms, p99 {delay_p99:.0f}ms")
+        self.stdout.write(f"  Outcomes:             sent {outcomes['sent']}, retried {outcomes['retried']}, "
+                          f"dead {outcomes['dead']}")
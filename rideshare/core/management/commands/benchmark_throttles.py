@@ -0,0 +1,91 @@
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.authentication import user_cache_enabled
+from core.models import PhoneVerification
+from core.throttling import OTPSendThrottle
+from rideon.seed import seed_users
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure how fast throttled auth and OTP requests are rejected, and check they skip the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per burst')
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        caches[settings.THROTTLE_CACHE].clear()
+        self.stdout.write(f"🚦 Bursts of {count} requests against the throttled endpoints")
+        self.stdout.write("=" * 50)
+
+        user = seed_users(1, prefix='throttleuser')[0]
+        try:
+            User.objects.filter(id=user.id).update(is_phone_verified=False)
+
+            # The check send_verification_code used to run on every request
+            started = time.perf_counter()
+            for _ in range(count):
+                PhoneVerification.objects.filter(
+                    user=user, phone_number=user.phone_number,
+                    created_at__gte=timezone.now() - timedelta(minutes=1),
+                ).count()
+            legacy = count / (time.perf_counter() - started)
+
+            # The throttle's check alone, for the same user
+            throttle, request = OTPSendThrottle(), SimpleNamespace(user=user)
+            started = time.perf_counter()
+            for _ in range(count):
+                throttle.allow_request(request, None)
+            cached = count / (time.perf_counter() - started)
+            caches[settings.THROTTLE_CACHE].clear()
+
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+            otp = self.burst(client, '/api/phone/send-code/', {'phone_number': user.phone_number}, count)
+            login = self.burst(Client(), '/auth/login/', {'email': 'nobody@example.com', 'password': 'wrong'}, count)
+        finally:
+            User.objects.filter(id=user.id).delete()
+
+        self.stdout.write(f"Database rate-limit check:  {legacy:,.0f} checks/s (1 statement each)")
+        self.stdout.write(f"Cache sliding window check: {cached:,.0f} checks/s")
+        # Without a shared cache signed-in requests load their user (see core.authentication)
+        user_queries = 0 if user_cache_enabled() else count
+        if user_queries:
+            self.stdout.write("Auth user cache off (per-process cache), allowing a user query per signed-in request")
+        failures = []
+        for name, (allowed, rejected, rate, statements), expected in (('OTP send', otp, user_queries),
+                                                                       ('Login', login, 0)):
+            self.stdout.write(f"{name + ':':<27} {allowed} allowed, {rejected:,} rejected at {rate:,.0f} requests/s "
+                              f"({statements} statements)")
+            if statements > expected:
+                failures.append(f"{name} ran {statements - expected} statements on rejected requests")
+            if not rejected:
+                failures.append(f"{name} never throttled")
+
+        if failures:
+            raise CommandError('; '.join(failures))
+        self.stdout.write(self.style.SUCCESS("✅ Bursts were rejected from the cache without touching the database"))
+
+    def burst(self, client, url, data, count):
+        """Send requests until the throttle kicks in, then time a burst of rejected ones"""
+        allowed = 0
+        while client.post(url, data, content_type='application/json').status_code != 429:
+            allowed += 1
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            rejected = sum(client.post(url, data, content_type='application/json').status_code == 429
+                           for _ in range(count))
+            elapsed = time.perf_counter() - started
+        return allowed, rejected, rejected / elapsed, len(queries)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from core.caching import STAT_EVENTS, registry
+
+
+class Command(BaseCommand):
+    help = 'Show hit and miss counters of the cached hot reads, summed across processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after showing them')
+
+    def handle(self, *args, **options):
+        self.stdout.write("🗄️  Cached reads since the counters were last reset")
+        self.stdout.write("=" * 50)
+        for namespace, tier in sorted(registry.items()):
+            stats = tier.shared_stats()
+            served = stats['local_hits'] + stats['hits']
+            lookups = served + stats['misses'] + stats['early_recomputes']
+            rate = f"{served / lookups:.1%}" if lookups else "n/a"
+            self.stdout.write(f"{namespace + ':':<16} {rate:>6} hit rate over {lookups:,} lookups "
+                              f"({stats['local_hits']:,} local, {stats['hits']:,} shared, {stats['misses']:,} misses, "
+                              f"{stats['early_recomputes']:,} early, {stats['stale_served']:,} stale, "
+                              f"{stats['lock_waits']:,} waits)")
+            if options['reset']:
+                tier.shared.delete_many([tier.stats_key(event) for event in STAT_EVENTS])
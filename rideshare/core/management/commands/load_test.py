@@ -0,0 +1,308 @@
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import time
+from collections import Counter, defaultdict
+from importlib.util import find_spec
+import aiohttp
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.loadgen import gunicorn, percentile
+from rideon.models import Rating, Ride
+from rideon.seed import random_point, seed_driver_profiles, seed_messages, seed_ratings, seed_rides, seed_users
+from rideon.signals import rating_values, update_rating_summary
+
+User = get_user_model()
+
+SEED_PREFIX = 'loadtest'
+PASSWORD = 'load-test-password'
+
+RIDER, DRIVER = 'rider', 'driver'
+
+# Every virtual user connects from 127.0.0.1, so the server's throttle limits are raised this far
+# to let the per-address ones through (see THROTTLE_RATE_MULTIPLIER)
+THROTTLE_RATE_MULTIPLIER = 10_000
+
+# The traffic mix: (name, method, path, weight, roles). Paths are filled in per virtual user:
+# {ride} is a ride they're on, {peer} the other person on it, {lat}/{lng} a point in Lagos
+ENDPOINTS = [
+    ('login', 'POST', '/auth/login/', 1, (RIDER, DRIVER)),
+    ('token_refresh', 'POST', '/api/token/refresh/', 2, (RIDER, DRIVER)),
+    ('profile', 'GET', '/profile/', 4, (RIDER, DRIVER)),
+    ('phone_status', 'GET', '/api/phone/status/', 2, (RIDER, DRIVER)),
+    ('driver_profile', 'GET', '/driver-profile/', 3, (DRIVER,)),
+    ('rides', 'GET', '/api/', 10, (RIDER, DRIVER)),
+    ('ride_summary', 'GET', '/api/summary/', 4, (RIDER, DRIVER)),
+    ('fare_info', 'GET', '/api/fare-info/?lat={lat}&lng={lng}', 6, (RIDER,)),
+    ('create_ride', 'POST', '/api/', 1, (RIDER,)),
+    ('available_rides', 'GET', '/api/available/', 8, (DRIVER,)),
+    ('available_nearby', 'GET', '/api/available/?lat={lat}&lng={lng}', 8, (DRIVER,)),
+    ('ride_offers', 'GET', '/api/offers/', 6, (DRIVER,)),
+    ('driver_location', 'POST', '/api/location/', 10, (DRIVER,)),
+    ('ride_messages', 'GET', '/api/{ride}/messages/', 8, (RIDER, DRIVER)),
+    ('send_message', 'POST', '/api/{ride}/messages/', 2, (RIDER, DRIVER)),
+    ('mark_messages_read', 'POST', '/api/{ride}/messages/read/', 2, (RIDER, DRIVER)),
+    ('unread_messages', 'GET', '/api/messages/unread/', 8, (RIDER, DRIVER)),
+    ('my_ratings', 'GET', '/api/my-ratings/', 3, (RIDER, DRIVER)),
+    ('user_ratings', 'GET', '/api/users/{peer}/ratings/', 3, (RIDER, DRIVER)),
+]
+
+
+class VirtualUser:
+    """A seeded user sending a weighted mix of requests, one at a time, with their own tokens"""
+
+    def __init__(self, user, role, ride, peer):
+        self.email = user.email
+        self.role = role
+        self.ride = ride.id
+        self.peer = peer.id
+        refresh = RefreshToken.for_user(user)
+        self.refresh = str(refresh)
+        self.access = str(refresh.access_token)
+        self.endpoints = [endpoint for endpoint in ENDPOINTS if role in endpoint[4]]
+        self.weights = [endpoint[3] for endpoint in self.endpoints]
+
+    def payload(self, name, rng):
+        """The JSON body to send to an endpoint"""
+        if name == 'login':
+            return {'email': self.email, 'password': PASSWORD}
+        if name == 'token_refresh':
+            return {'refresh': self.refresh}
+        if name == 'create_ride':
+            (pickup_lat, pickup_lng), (dropoff_lat, dropoff_lng) = random_point(rng), random_point(rng)
+            return {
+                'pickup_location': 'Load test pickup, Lagos',
+                'pickup_latitude': f'{pickup_lat:.6f}', 'pickup_longitude': f'{pickup_lng:.6f}',
+                'dropoff_location': 'Load test dropoff, Lagos',
+                'dropoff_latitude': f'{dropoff_lat:.6f}', 'dropoff_longitude': f'{dropoff_lng:.6f}',
+            }
+        if name == 'driver_location':
+            latitude, longitude = random_point(rng)
+            return {'latitude': float(latitude), 'longitude': float(longitude), 'heading': rng.uniform(0, 360)}
+        if name == 'send_message':
+            return {'message': 'On my way'}
+        if name == 'mark_messages_read':
+            return {}
+        return None
+
+    def keep_tokens(self, name, data):
+        """Switch to the tokens a login or refresh returned; refresh tokens are rotated and blacklisted"""
+        tokens = data.get('tokens', {}) if name == 'login' else data
+        self.access = tokens.get('access', self.access)
+        self.refresh = tokens.get('refresh', self.refresh)
+
+
+class Command(BaseCommand):
+    help = 'Seed a dataset, load every API endpoint from concurrent virtual users and write per-endpoint results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--riders', type=int, default=200)
+        parser.add_argument('--drivers', type=int, default=50, help='Drivers, each with a DriverProfile')
+        parser.add_argument('--rides', type=int, default=5000, help='Rides, spread over every status')
+        parser.add_argument('--messages', type=int, default=20, help='Messages on each virtual user\'s ride')
+        parser.add_argument('--ratings', type=int, default=10, help='Ratings per driver')
+        parser.add_argument('--concurrency', type=int, default=32, help='Virtual users, half riders and half drivers')
+        parser.add_argument('--seconds', type=float, default=30)
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per gthread worker')
+        parser.add_argument('--port', type=int, default=8767)
+        parser.add_argument('--output', default='load-test.json', help='Where to write the results')
+        parser.add_argument('--baseline', help='Results of an earlier run to compare against')
+
+    def handle(self, *args, **options):
+        if find_spec('gunicorn') is None:
+            raise CommandError('gunicorn is not installed (pip install -r requirements.txt)')
+        if options['concurrency'] < 2 or options['drivers'] < 1:
+            raise CommandError('Need at least 2 virtual users and 1 driver')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        self.stdout.write(f"🚦 {options['concurrency']} virtual users for {options['seconds']:g}s against "
+                          f"{options['server']} ({options['workers']} workers)")
+        self.stdout.write("=" * 50)
+
+        started_at = timezone.now()
+        try:
+            started = time.perf_counter()
+            virtual_users, dataset = self.seed(options)
+            self.stdout.write(f"Seeded {', '.join(f'{n:,} {kind}' for kind, n in dataset.items())} "
+                              f"in {time.perf_counter() - started:.1f}s")
+
+            if options['server'] == 'asgi':
+                app, worker_options = 'rideshare.asgi', ['--worker-class', 'uvicorn_worker.UvicornWorker']
+            else:
+                app, worker_options = 'rideshare.wsgi', ['--worker-class', 'gthread', '--threads', str(options['threads'])]
+            env = {'DB_QUERY_TIMING': 'True', 'ASYNC_API': str(options['server'] == 'asgi'),
+                   'THROTTLE_RATE_MULTIPLIER': str(THROTTLE_RATE_MULTIPLIER)}
+            with gunicorn(app, options['port'], '--workers', str(options['workers']), *worker_options,
+                          env=env) as base_url:
+                samples, elapsed = asyncio.run(self.run(base_url, virtual_users, options['seconds']))
+        finally:
+            Rating.objects.filter(rated_user__email__startswith=SEED_PREFIX).delete()
+            User.objects.filter(email__startswith=SEED_PREFIX).delete()
+
+        results = {
+            'started_at': started_at.isoformat(),
+            'revision': self.revision(),
+            'server': {key: options[key] for key in ('server', 'workers', 'threads')},
+            'load': {key: options[key] for key in ('concurrency', 'seconds')},
+            'dataset': dataset,
+            'total': self.summarize([sample for endpoint in samples.values() for sample in endpoint], elapsed),
+            'endpoints': {name: self.summarize(samples[name], elapsed) for name, *_ in ENDPOINTS if samples[name]},
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+
+        self.report(results, baseline)
+        self.stdout.write(self.style.SUCCESS(f"✅ Results written to {options['output']}"))
+
+    def seed(self, options):
+        """Create the dataset and a virtual user for each seat on a conversation ride"""
+        rng = random.Random(0)
+        riders = seed_users(options['riders'], prefix=f'{SEED_PREFIX}rider')
+        drivers = seed_users(options['drivers'], user_type='DRIVER', prefix=f'{SEED_PREFIX}driver')
+        # One hash for every account: hashing each password would take longer than the test
+        User.objects.filter(id__in=[user.id for user in riders + drivers]).update(password=make_password(PASSWORD))
+        seed_driver_profiles(drivers, located=True, rng=rng)
+
+        statuses = [choice for choice, _ in Ride.RIDE_STATUS]
+        for i, ride_status in enumerate(statuses):
+            count = options['rides'] // len(statuses) + (i < options['rides'] % len(statuses))
+            seed_rides(riders, count, status=ride_status, drivers=drivers, rng=rng)
+
+        ratings = 0
+        for driver in drivers:
+            for rating in seed_ratings(driver, rng.sample(riders, min(options['ratings'], len(riders))), rng=rng):
+                # seed_ratings skips the signals that keep rating summaries
+                update_rating_summary(driver.id, added=rating_values(rating))
+                ratings += 1
+
+        # Each pair of virtual users, a rider and a driver, chats on an accepted ride
+        virtual_users = []
+        for pair in range(options['concurrency'] // 2):
+            rider, driver = riders[pair % len(riders)], drivers[pair % len(drivers)]
+            ride = seed_rides([rider], 1, status='accepted', drivers=[driver], rng=rng)[0]
+            seed_messages(ride, options['messages'])
+            virtual_users.append(VirtualUser(rider, RIDER, ride, driver))
+            virtual_users.append(VirtualUser(driver, DRIVER, ride, rider))
+
+        dataset = {
+            'riders': len(riders),
+            'drivers': len(drivers),
+            'rides': options['rides'] + ratings + len(virtual_users) // 2,
+            'messages': options['messages'] * (len(virtual_users) // 2),
+            'ratings': ratings,
+        }
+        return virtual_users, dataset
+
+    async def run(self, base_url, virtual_users, seconds):
+        """
+        Run every virtual user until the time is up
+
+        Returns:
+            tuple: ({endpoint: [(seconds, status, queries)]}, elapsed seconds)
+        """
+        samples = defaultdict(list)
+        connector = aiohttp.TCPConnector(limit=len(virtual_users))
+        # Cookies off: the API is authenticated by header, and login would set token cookies
+        async with aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar(),
+                                         timeout=aiohttp.ClientTimeout(total=30)) as session:
+            started = time.perf_counter()
+            deadline = started + seconds
+            await asyncio.gather(*(self.virtual_user(session, base_url, user, random.Random(i), deadline, samples)
+                                   for i, user in enumerate(virtual_users)))
+            return samples, time.perf_counter() - started
+
+    async def virtual_user(self, session, base_url, user, rng, deadline, samples):
+        lat, lng = random_point(rng)
+        while time.perf_counter() < deadline:
+            name, method, path, _, _ = rng.choices(user.endpoints, weights=user.weights)[0]
+            url = base_url + path.format(ride=user.ride, peer=user.peer, lat=f'{lat:.5f}', lng=f'{lng:.5f}')
+            headers = {}
+            if name not in ('login', 'token_refresh'):
+                headers['Authorization'] = f'Bearer {user.access}'
+            requested = time.perf_counter()
+            try:
+                async with session.request(method, url, json=user.payload(name, rng), headers=headers) as response:
+                    body = await response.read()
+                    elapsed = time.perf_counter() - requested
+                    outcome = response.status
+                    queries = self.query_count(response.headers.get('Server-Timing', ''))
+            except asyncio.TimeoutError:
+                elapsed, outcome, queries, body = time.perf_counter() - requested, 'timeout', None, b''
+            except aiohttp.ClientError as exc:
+                elapsed, outcome, queries, body = time.perf_counter() - requested, type(exc).__name__, None, b''
+            samples[name].append((elapsed, outcome, queries))
+            if name in ('login', 'token_refresh') and outcome == 200:
+                user.keep_tokens(name, json.loads(body))
+
+    @staticmethod
+    def query_count(header):
+        """The query count from a `db-queries;dur=1.92;desc="3"` Server-Timing entry, if there is one"""
+        for entry in header.split(','):
+            name, *params = [part.strip() for part in entry.split(';')]
+            if name == 'db-queries':
+                values = dict(param.split('=', 1) for param in params if '=' in param)
+                return int(values['desc'].strip('"'))
+        return None
+
+    @staticmethod
+    def summarize(samples, elapsed):
+        """Throughput, latency percentiles of successful requests, failures by status and query counts"""
+        latencies = [seconds for seconds, outcome, _ in samples if isinstance(outcome, int) and outcome < 400]
+        queries = [count for _, _, count in samples if count is not None]
+        failures = Counter(str(outcome) for _, outcome, _ in samples if not (isinstance(outcome, int) and outcome < 400))
+        return {
+            'requests': len(samples),
+            'throughput': round(len(samples) / elapsed, 2),
+            'failures': dict(failures.most_common()),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 2),
+                'p95': round(percentile(latencies, 95), 2),
+                'p99': round(percentile(latencies, 99), 2),
+            },
+            'queries': {
+                'mean': round(statistics.fmean(queries), 2) if queries else None,
+                'max': max(queries, default=None),
+            },
+        }
+
+    @staticmethod
+    def revision():
+        """The checked-out commit, to tell runs apart"""
+        try:
+            result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                    capture_output=True, text=True, timeout=10)
+        except (OSError, subprocess.SubprocessError):
+            return None
+        return result.stdout.strip() or None
+
+    def report(self, results, baseline):
+        self.stdout.write(f"\n{'endpoint':<20} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8}  failures")
+        rows = list(results['endpoints'].items()) + [('total', results['total'])]
+        for name, result in rows:
+            latency = result['latency_ms']
+            queries = result['queries']['mean']
+            failures = ', '.join(f'{n:,} x {outcome}' for outcome, n in result['failures'].items())
+            line = (f"{name:<20} {result['throughput']:8,.1f} {latency['p50']:7.1f}ms {latency['p95']:7.1f}ms "
+                    f"{latency['p99']:7.1f}ms {'-' if queries is None else f'{queries:.1f}':>8}  {failures}")
+            before = baseline and (baseline['total'] if name == 'total' else baseline['endpoints'].get(name))
+            if before:
+                line += f"  (p95 {self.change(before['latency_ms']['p95'], latency['p95'])}"
+                if before['queries']['mean'] is not None and queries is not None:
+                    line += f", queries {queries - before['queries']['mean']:+.1f}"
+                line += f" vs {baseline.get('revision') or 'baseline'})"
+            self.stdout.write(line)
+
+    @staticmethod
+    def change(before, after):
+        return f"{(after - before) / before:+.0%}" if before else 'n/a'
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from core.outbox import OutboxWorker
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued SMS and email messages from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent provider calls')
+        parser.add_argument('--batch-size', type=int, default=50, help='Messages leased per batch')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Deliver one batch and exit')
+
+    def handle(self, *args, **options):
+        worker = OutboxWorker(workers=options['workers'], batch_size=options['batch_size'])
+        self.stdout.write(f"📤 Outbox worker started with {options['workers']} threads")
+
+        try:
+            if options['once']:
+                outcomes = worker.run_once()
+            else:
+                outcomes = worker.run(poll_interval=options['poll_interval'])
+        except KeyboardInterrupt:
+            outcomes = None
+        finally:
+            worker.close()
+
+        if outcomes is not None:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Sent {outcomes['sent']}, retried {outcomes['retried']}, dead-lettered {outcomes['dead']}"
+            ))
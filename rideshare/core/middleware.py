@@ -0,0 +1,171 @@
+import logging
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .db.checkout import checkout_summary, record_checkout
+
+logger = logging.getLogger(__name__)
+
+# [queries, seconds] of the async request being handled; sync_to_async threads share the list
+async_request_queries = ContextVar('async_request_queries', default=None)
+
+
+def add_server_timing(response, entry):
+    """Append an entry to the response's Server-Timing header"""
+    existing = response.get('Server-Timing')
+    response['Server-Timing'] = f'{existing}, {entry}' if existing else entry
+
+
+class ConnectionCheckoutMiddleware:
+    """
+    Reports how long each request waited for its database connection
+
+    Adds a Server-Timing entry, e.g. `db-checkout;dur=0.41;desc="reused"`, to
+    responses of requests that queried the default database, and logs the
+    process's totals every DB_CHECKOUT_LOG_SECONDS. Backends without checkout
+    metrics (see core.db.backends) are passed through untouched, and so are
+    async requests, whose queries run on other threads' connections.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.logged_at = time.monotonic()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        connection = connections['default']
+        if self.async_mode or not hasattr(connection, 'reset_checkout'):
+            return self.get_response(request)
+
+        connection.reset_checkout()
+        response = self.get_response(request)
+        checkout = connection.checkout
+        if checkout is not None:
+            record_checkout(checkout)
+            add_server_timing(response, f'db-checkout;dur={checkout.seconds * 1000:.2f};desc="{checkout.kind}"')
+            self.log_totals()
+        return response
+
+    def log_totals(self):
+        now = time.monotonic()
+        if now - self.logged_at < settings.DB_CHECKOUT_LOG_SECONDS:
+            return
+        self.logged_at = now
+        logger.info("DB checkouts: %s", ', '.join(
+            f'{count} {kind} ({mean:.2f}ms mean)' for kind, (count, mean) in sorted(checkout_summary().items())))
+
+
+def count_async_request_query(execute, sql, params, many, context):
+    """Execute wrapper counting a query towards the async request it runs for, if one is being counted"""
+    totals = async_request_queries.get()
+    if totals is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        totals[0] += 1
+        totals[1] += time.perf_counter() - started
+
+
+def install_async_query_counter(sender, connection, **kwargs):
+    """Wrap every new default connection, as async requests query on whichever thread the ORM runs on"""
+    if connection.alias == 'default' and count_async_request_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_async_request_query)
+
+
+class QueryCountMiddleware:
+    """
+    Reports how many queries each request ran on the default database, when DB_QUERY_TIMING is on
+
+    Adds a Server-Timing entry with their count and total time, e.g.
+    `db-queries;dur=1.92;desc="3"`, so load tests (see the load_test command)
+    can read per-endpoint query counts from outside the server. Async
+    requests run their queries on sync_to_async threads, so they are counted
+    by a wrapper on every connection, against a context variable those
+    threads inherit.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DB_QUERY_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            connection_created.connect(install_async_query_counter)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        count = 0
+        seconds = 0.0
+
+        def timed(execute, sql, params, many, context):
+            nonlocal count, seconds
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                count += 1
+                seconds += time.perf_counter() - started
+
+        with connections['default'].execute_wrapper(timed):
+            response = self.get_response(request)
+        add_server_timing(response, f'db-queries;dur={seconds * 1000:.2f};desc="{count}"')
+        return response
+
+    async def __acall__(self, request):
+        totals = [0, 0.0]
+        token = async_request_queries.set(totals)
+        try:
+            response = await self.get_response(request)
+        finally:
+            async_request_queries.reset(token)
+        count, seconds = totals
+        add_server_timing(response, f'db-queries;dur={seconds * 1000:.2f};desc="{count}"')
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise's middleware, able to sit in an async middleware chain
+
+    WhiteNoise only declares sync support, which under ASGI would put every
+    request through a thread. Finding a static file is a dict lookup, so async
+    requests for one are served inline and all others are awaited.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
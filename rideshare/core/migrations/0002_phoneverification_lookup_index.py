@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='phoneverification',
+            index=models.Index(fields=['user', 'phone_number', '-created_at'], name='phoneverif_user_phone_idx'),
+        ),
+        migrations.AlterField(
+            model_name='phoneverification',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='phone_verifications', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
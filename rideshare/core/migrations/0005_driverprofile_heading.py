@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_driverprofile_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driverprofile',
+            name='heading',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:41
+
+import hashlib
+import hmac
+from django.conf import settings
+from django.db import migrations, models
+
+
+def hash_codes(apps, schema_editor):
+    PhoneVerification = apps.get_model('core', 'PhoneVerification')
+
+    # Same keyed hash as core.otp.hash_code, so codes sent before the upgrade still verify
+    key = settings.SECRET_KEY.encode()
+    rows = PhoneVerification.objects.only('id', 'user_id', 'phone_number', 'verification_code')
+    batch = []
+    for row in rows.iterator(chunk_size=1000):
+        message = f'{row.user_id}:{row.phone_number}:{row.verification_code}'.encode()
+        row.code_hash = hmac.new(key, message, hashlib.sha256).hexdigest()
+        batch.append(row)
+        if len(batch) == 1000:
+            PhoneVerification.objects.bulk_update(batch, ['code_hash'])
+            batch = []
+    PhoneVerification.objects.bulk_update(batch, ['code_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_driverprofile_heading'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='phoneverification',
+            name='code_hash',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(hash_codes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='phoneverification',
+            name='verification_code',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+def redact_codes(apps, schema_editor):
+    OutboundMessage = apps.get_model('core', 'OutboundMessage')
+
+    # Verification codes queued before the upgrade: blank those already handled, redact the rest once sent
+    codes = OutboundMessage.objects.filter(channel='sms', body__startswith='Your RideOn verification code is')
+    codes.exclude(status='pending').update(body='[redacted]', sensitive=True)
+    codes.filter(status='pending').update(sensitive=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_phoneverification_code_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundmessage',
+            name='sensitive',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(redact_codes, migrations.RunPython.noop),
+    ]
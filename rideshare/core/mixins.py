@@ -1,16 +1,11 @@
-import jwt
 from django.contrib.auth.mixins import AccessMixin
 from django.http import JsonResponse
 from django.shortcuts import redirect
 from django.urls import reverse
-from django.conf import settings
-from django.contrib.auth import get_user_model
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-
-User = get_user_model()
+from .authentication import get_verified_claims, get_cached_user
 
 class JWTAuthenticationMixin(AccessMixin):
     """
@@ -42,36 +37,24 @@ class JWTAuthenticationMixin(AccessMixin):
             return False
         
         try:
-            # Validate the token using Simple JWT
-            UntypedToken(token)
-            
-            # Decode the token to get user information
-            decoded_token = jwt.decode(
-                token, 
-                settings.SECRET_KEY, 
-                algorithms=['HS256']
-            )
-            
-            # Get user from token
-            user_id = decoded_token.get('user_id')
-            if user_id:
-                try:
-                    user = User.objects.get(id=user_id)
-                    # Attach user to request for use in views
-                    request.user = user
-                    request.jwt_token = token
-                    return True
-                except User.DoesNotExist:
-                    return False
-            
+            # Verified claims and users are cached, so repeat page loads skip both the
+            # signature check and the user query
+            claims = get_verified_claims(token)
+        except (InvalidToken, TokenError):
             return False
-            
-        except (InvalidToken, TokenError, jwt.DecodeError, jwt.ExpiredSignatureError):
+        
+        user_id = claims.get('user_id')
+        if not user_id:
             return False
-        except Exception as e:
-            # Log the exception in production
-            print(f"JWT Authentication error: {e}")
+        
+        user = get_cached_user(user_id)
+        if user is None:
             return False
+        
+        # Attach user to request for use in views
+        request.user = user
+        request.jwt_token = token
+        return True
     
     def get_jwt_token(self, request):
         """
@@ -1,6 +1,5 @@
 from uuid import uuid4
-import random
-import string
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import AbstractUser, AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
@@ -63,15 +62,30 @@ class DriverProfile(models.Model):
     is_available = models.BooleanField(default=True)
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=5.0)
     created_at = models.DateTimeField(auto_now_add=True)
+    
+    # Last reported position, written in batches by rideon.locations
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    heading = models.FloatField(null=True, blank=True)  # Degrees clockwise from north
+    location_geohash = models.CharField(max_length=12, blank=True)
+    location_updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Nearby available drivers, by geohash prefix
+            models.Index(fields=['location_geohash'], name='driver_available_geohash_idx',
+                         opclasses=['varchar_pattern_ops'], condition=models.Q(is_available=True)),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.vehicle_make} {self.vehicle_model}"
 
 
 class PhoneVerification(models.Model):
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='phone_verifications')
+    """Audit record of a code sent by core.otp; live codes and their attempts are kept in the cache"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='phone_verifications', db_index=False)
     phone_number = models.CharField(max_length=15)
-    verification_code = models.CharField(max_length=6)
+    code_hash = models.CharField(max_length=64)  # Keyed hash from core.otp.hash_code; the code itself isn't stored
     is_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
@@ -79,29 +93,26 @@ class PhoneVerification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Cache-miss fallback and the status endpoint filter on user + phone over recent rows
+            models.Index(fields=['user', 'phone_number', '-created_at'], name='phoneverif_user_phone_idx'),
+        ]
     
     def save(self, *args, **kwargs):
-        if not self.verification_code:
-            self.verification_code = self.generate_code()
         if not self.expires_at:
-            self.expires_at = timezone.now() + timedelta(minutes=15)  # 15 minutes expiry
+            self.expires_at = timezone.now() + timedelta(minutes=settings.OTP_TTL_MINUTES)
         super().save(*args, **kwargs)
     
-    @staticmethod
-    def generate_code():
-        """Generate a 6-digit verification code"""
-        return ''.join(random.choices(string.digits, k=6))
-    
     def is_expired(self):
         """Check if the verification code has expired"""
         return timezone.now() > self.expires_at
     
     def is_valid(self):
         """Check if the verification code is still valid"""
-        return not self.is_verified and not self.is_expired() and self.attempts < 3
+        return not self.is_verified and not self.is_expired() and self.attempts < settings.OTP_MAX_ATTEMPTS
     
     def __str__(self):
-        return f"Verification for {self.phone_number} - {self.verification_code}"
+        return f"Verification for {self.phone_number} at {self.created_at:%Y-%m-%d %H:%M}"
 
 
 class PasswordReset(models.Model):
@@ -128,4 +139,50 @@ class PasswordReset(models.Model):
         return not self.is_used and not self.is_expired()
     
     def __str__(self):
-        return f"Password reset for {self.user.email} - {self.reset_token}"
\ No newline at end of file
+        return f"Password reset for {self.user.email} - {self.reset_token}"
+
+class OutboundMessage(models.Model):
+    """
+    SMS or email waiting to be handed to a provider.
+
+    Request handlers only insert a row here; the send_outbox worker does the
+    network round trip, retrying with backoff until the message is sent or
+    dead-lettered.
+    """
+    CHANNEL_CHOICES = (
+        ('sms', 'SMS'),
+        ('email', 'Email'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead'),
+    )
+
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=200, blank=True)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    # Bodies carrying a secret, such as a verification code, are blanked once the message is done with
+    sensitive = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # The worker only ever scans messages that are still due
+            models.Index(
+                fields=['next_attempt_at'],
+                name='outbox_pending_due_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} to {self.recipient} ({self.status})"
@@ -0,0 +1,178 @@
+"""
+Cache-backed store for phone verification codes
+Codes live in the OTP_CACHE cache as keyed hashes with an atomic attempt
+counter and expire with their TTL; a PhoneVerification row is kept per
+code for audit, and is read back only if the cache has lost the code.
+OTP_CACHE must be shared by all workers; with per-process memory codes are
+checked against the database alone, so each worker can't count its own attempts.
+"""
+import hashlib
+import hmac
+import secrets
+import string
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .caching import is_process_local
+from .models import PhoneVerification
+
+OTP_CACHE_PREFIX = 'otp:'
+
+# Outcomes of verify()
+VERIFIED = 'verified'
+INVALID = 'invalid'
+EXHAUSTED = 'exhausted'
+MISSING = 'missing'
+
+
+def generate_code(length=6):
+    """A random numeric code from the OS's CSPRNG"""
+    return ''.join(secrets.choice(string.digits) for _ in range(length))
+
+
+def hash_code(user_id, phone_number, code):
+    """
+    Keyed hash of a code, bound to the user and phone it was sent to
+
+    Args:
+        user_id (int): The user the code was issued to
+        phone_number (str): The phone number it was sent to
+        code (str): The plain code
+
+    Returns:
+        str: A hex HMAC-SHA256 digest; six-digit codes can't be recovered from it without SECRET_KEY
+    """
+    message = f'{user_id}:{phone_number}:{code}'.encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+class OTPStore:
+    """
+    Issues and checks one-time codes, one live code per user and phone
+
+    Each code is two cache keys: its hash, audit row id and expiry, and an
+    attempt counter. Verifying counts the attempt with an atomic increment
+    before comparing, so concurrent guesses can't exceed max_attempts, and
+    wrong guesses never touch the database. Issuing a new code replaces the
+    previous one and resets its attempts.
+
+    A per-process cache would give every worker its own attempt counter, so
+    with one the store keeps codes and attempts in the database only.
+    """
+
+    def __init__(self, cache=None, ttl=None, max_attempts=None):
+        alias = cache or settings.OTP_CACHE
+        self.cache = None if is_process_local(alias) else caches[alias]
+        self.ttl = timedelta(minutes=ttl or settings.OTP_TTL_MINUTES)
+        self.max_attempts = max_attempts or settings.OTP_MAX_ATTEMPTS
+
+    def keys(self, user_id, phone_number):
+        key = f'{OTP_CACHE_PREFIX}{user_id}:{phone_number}'
+        return key, f'{key}:attempts'
+
+    def issue(self, user, phone_number):
+        """
+        Create a code for a user's phone and record it for audit
+
+        The cache is written once the surrounding transaction commits, so a
+        rolled-back request never leaves a live code behind.
+
+        Args:
+            user (CustomUser): The user verifying their phone
+            phone_number (str): The phone number the code will be sent to
+
+        Returns:
+            tuple: (code, PhoneVerification) - the plain code to send, and its audit row
+        """
+        code = generate_code()
+        code_hash = hash_code(user.pk, phone_number, code)
+        verification = PhoneVerification.objects.create(
+            user=user,
+            phone_number=phone_number,
+            code_hash=code_hash,
+            expires_at=timezone.now() + self.ttl,
+        )
+
+        if self.cache is None:
+            return code, verification
+        key, attempts_key = self.keys(user.pk, phone_number)
+        record = {'hash': code_hash, 'id': verification.id, 'expires_at': verification.expires_at}
+        timeout = int(self.ttl.total_seconds())
+        transaction.on_commit(lambda: self.cache.set_many({key: record, attempts_key: 0}, timeout=timeout))
+        return code, verification
+
+    def verify(self, user, phone_number, code):
+        """
+        Check a code, counting the attempt
+
+        Args:
+            user (CustomUser): The user verifying their phone
+            phone_number (str): The phone number the code was sent to
+            code (str): The code the user entered
+
+        Returns:
+            tuple: (outcome, remaining attempts), outcome being VERIFIED,
+            INVALID, EXHAUSTED or MISSING
+        """
+        if self.cache is None:
+            return self.verify_from_database(user, phone_number, code)
+        key, attempts_key = self.keys(user.pk, phone_number)
+        try:
+            attempts = self.cache.incr(attempts_key)
+        except ValueError:
+            # Expired, never issued, or evicted from the cache: the audit row decides
+            return self.verify_from_database(user, phone_number, code)
+
+        record = self.cache.get(key)
+        if record is None:
+            return self.verify_from_database(user, phone_number, code)
+        if attempts > self.max_attempts:
+            return EXHAUSTED, 0
+
+        if not hmac.compare_digest(record['hash'], hash_code(user.pk, phone_number, code)):
+            remaining = self.max_attempts - attempts
+            if not remaining:
+                # Record the lockout; earlier misses only ever lived in the cache
+                PhoneVerification.objects.filter(id=record['id']).update(attempts=attempts)
+            return INVALID, remaining
+
+        self.cache.delete_many([key, attempts_key])
+        PhoneVerification.objects.filter(id=record['id']).update(is_verified=True, attempts=attempts)
+        return VERIFIED, self.max_attempts - attempts
+
+    def verify_from_database(self, user, phone_number, code):
+        """
+        Check a code against its audit row, for codes the cache no longer holds,
+        or every code when OTP_CACHE is per-process
+
+        Misses counted only in the cache are lost with it, so a flushed cache
+        can allow up to max_attempts more guesses at a code; OTPVerifyThrottle
+        still bounds the rate.
+        """
+        verification = PhoneVerification.objects.filter(
+            user=user,
+            phone_number=phone_number,
+            is_verified=False,
+        ).order_by('-created_at').first()
+        if verification is None or verification.is_expired():
+            return MISSING, 0
+
+        # Count the attempt in the same statement that checks the limit
+        counted = PhoneVerification.objects.filter(
+            id=verification.id, attempts__lt=self.max_attempts,
+        ).update(attempts=F('attempts') + 1)
+        if not counted:
+            return EXHAUSTED, 0
+
+        remaining = self.max_attempts - verification.attempts - 1
+        if not hmac.compare_digest(verification.code_hash, hash_code(user.pk, phone_number, code)):
+            return INVALID, remaining
+
+        PhoneVerification.objects.filter(id=verification.id).update(is_verified=True)
+        return VERIFIED, remaining
+
+
+otp_store = OTPStore()
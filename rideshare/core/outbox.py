@@ -0,0 +1,163 @@
+"""
+Transactional outbox for SMS and email
+Request handlers enqueue messages in the database; the send_outbox worker
+delivers them through the providers in a thread pool, with retries
+"""
+import logging
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import OutboundMessage
+from .sms_service import sms_service
+
+logger = logging.getLogger(__name__)
+
+# Stored in place of a sensitive message's body once it is sent or dead-lettered
+REDACTED_BODY = '[redacted]'
+
+
+def enqueue_sms(phone_number, body, sensitive=False):
+    """
+    Queue an SMS for delivery by the outbox worker
+
+    Args:
+        phone_number (str): The phone number to send to
+        body (str): The message body
+        sensitive (bool): Whether the body holds a secret, to be redacted once delivered or dead-lettered
+
+    Returns:
+        OutboundMessage: The queued message
+    """
+    return OutboundMessage.objects.create(channel='sms', recipient=phone_number, body=body, sensitive=sensitive)
+
+
+def enqueue_email(email, subject, body, html_body=''):
+    """
+    Queue an email for delivery by the outbox worker
+
+    Args:
+        email (str): The address to send to
+        subject (str): The email subject
+        body (str): The plain text body
+        html_body (str): Optional HTML alternative
+
+    Returns:
+        OutboundMessage: The queued message
+    """
+    return OutboundMessage.objects.create(
+        channel='email',
+        recipient=email,
+        subject=subject,
+        body=body,
+        html_body=html_body,
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, so failed messages don't retry in lockstep"""
+    base = settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return timedelta(seconds=random.uniform(base / 2, base))
+
+
+class OutboxWorker:
+    """
+    Delivers due outbox messages through a pool of sender threads.
+
+    Only the calling thread touches the database: it leases a batch, hands the
+    provider calls to the pool and records each outcome as it completes.
+    """
+
+    def __init__(self, workers=8, batch_size=50, sms=None):
+        self.batch_size = batch_size
+        self.sms = sms or sms_service
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='outbox')
+
+    def claim(self):
+        """Lease a batch of due messages so other workers skip them until the lease runs out"""
+        now = timezone.now()
+        with transaction.atomic():
+            messages = list(
+                OutboundMessage.objects
+                .select_for_update(skip_locked=True)
+                .filter(status='pending', next_attempt_at__lte=now)
+                .order_by('next_attempt_at')[:self.batch_size]
+            )
+            if messages:
+                OutboundMessage.objects.filter(id__in=[message.id for message in messages]).update(
+                    attempts=F('attempts') + 1,
+                    next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS),
+                )
+        for message in messages:
+            message.attempts += 1
+        return messages
+
+    def deliver(self, message):
+        """Send one message, returning None on success or the error text"""
+        try:
+            if message.channel == 'sms':
+                result = self.sms.send_message(message.recipient, message.body)
+                if not result.get('success'):
+                    return result.get('message') or 'SMS provider error'
+            else:
+                send_mail(
+                    subject=message.subject,
+                    message=message.body,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    recipient_list=[message.recipient],
+                    html_message=message.html_body or None,
+                    fail_silently=False,
+                )
+        except Exception as e:
+            return str(e) or e.__class__.__name__
+        return None
+
+    def record(self, message, error):
+        """Mark a message sent, schedule its retry or dead-letter it, redacting a sensitive body once done"""
+        messages = OutboundMessage.objects.filter(id=message.id)
+        redacted = {'body': REDACTED_BODY, 'html_body': ''} if message.sensitive else {}
+        if error is None:
+            messages.update(status='sent', sent_at=timezone.now(), last_error='', **redacted)
+            return 'sent'
+        if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            logger.error(f"Outbox {message.channel} to {message.recipient} dead after "
+                         f"{message.attempts} attempts: {error}")
+            messages.update(status='dead', last_error=error, **redacted)
+            return 'dead'
+        logger.warning(f"Outbox {message.channel} to {message.recipient} failed "
+                       f"(attempt {message.attempts}): {error}")
+        messages.update(next_attempt_at=timezone.now() + retry_delay(message.attempts), last_error=error)
+        return 'retried'
+
+    def run_once(self):
+        """
+        Deliver one batch of due messages
+
+        Returns:
+            Counter: Number of messages sent, retried and dead-lettered
+        """
+        outcomes = Counter()
+        messages = self.claim()
+        futures = {self.executor.submit(self.deliver, message): message for message in messages}
+        for future in as_completed(futures):
+            outcomes[self.record(futures[future], future.result())] += 1
+        return outcomes
+
+    def run(self, poll_interval=1.0, stop=None):
+        """Deliver messages until stop() returns true, sleeping whenever the outbox is drained"""
+        totals = Counter()
+        while not (stop and stop()):
+            outcomes = self.run_once()
+            totals.update(outcomes)
+            if not outcomes:
+                time.sleep(poll_interval)
+        return totals
+
+    def close(self):
+        self.executor.shutdown(wait=True)
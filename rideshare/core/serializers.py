@@ -130,9 +130,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
     
     def send_verification_email(self, user):
-        from django.core.mail import send_mail
-        from django.urls import reverse
-        from django.conf import settings
+        from .outbox import enqueue_email
         
         # Create verification URL - Send users to the frontend verification page
         verification_url = f"http://127.0.0.1:8000/verify-email/{user.email_verification_token}/"
@@ -200,18 +198,8 @@ The Rideon Team
         </html>
         """
         
-        try:
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
-        except Exception as e:
-            print(f"Failed to send verification email: {e}")
-            # You could log this error or handle it differently in production
+        # Delivered by the outbox worker so registration doesn't wait on SMTP
+        enqueue_email(user.email, subject, message, html_message)
         
 class LoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
@@ -269,8 +257,8 @@ class CustomTokenView(TokenObtainPairView):
 class PhoneVerificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = PhoneVerification
-        fields = ['phone_number', 'verification_code', 'created_at', 'expires_at']
-        read_only_fields = ['verification_code', 'created_at', 'expires_at']
+        fields = ['phone_number', 'is_verified', 'created_at', 'expires_at']
+        read_only_fields = ['is_verified', 'created_at', 'expires_at']
 
 
 class SendVerificationCodeSerializer(serializers.Serializer):
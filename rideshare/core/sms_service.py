@@ -3,9 +3,14 @@ SMS Service for phone number verification
 This module handles sending SMS verification codes to users
 """
 import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +34,104 @@ class SMSService:
         # Termii settings (Nigerian SMS provider)
         self.termii_api_key = getattr(settings, 'TERMII_API_KEY', '')
         self.termii_sender_id = getattr(settings, 'TERMII_SENDER_ID', 'Rideon')
+        self.termii_url = getattr(settings, 'TERMII_API_URL', 'https://api.ng.termii.com/api/sms/send')
+        
+        # Fake provider settings, for benchmarking the outbox offline
+        self.fake_latency_ms = getattr(settings, 'SMS_FAKE_LATENCY_MS', 200)
+        self.fake_failure_rate = getattr(settings, 'SMS_FAKE_FAILURE_RATE', 0.0)
+        
+        # Connection pooling: one keep-alive session shared by every send
+        self.pool_size = getattr(settings, 'SMS_POOL_SIZE', 16)
+        self.timeouts = settings.SMS_TIMEOUTS  # (connect, read) seconds per provider
+        self._session = None
+        self._twilio_client = None
+        self._client_lock = threading.Lock()
+    
+    @property
+    def session(self) -> requests.Session:
+        """Long-lived HTTP session, so repeat sends reuse open TLS connections"""
+        if self._session is None:
+            with self._client_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+    
+    @property
+    def twilio_client(self):
+        """Twilio client built once, sending over the shared session"""
+        if self._twilio_client is None:
+            session = self.session
+            with self._client_lock:
+                if self._twilio_client is None:
+                    from twilio.rest import Client
+                    from twilio.http.http_client import TwilioHttpClient
+                    
+                    http_client = TwilioHttpClient()
+                    http_client.session = session
+                    # Set after construction: the constructor only validates a single float,
+                    # but the value is handed straight to requests, which takes (connect, read)
+                    http_client.timeout = self.timeouts['twilio']
+                    self._twilio_client = Client(
+                        self.twilio_account_sid,
+                        self.twilio_auth_token,
+                        http_client=http_client
+                    )
+        return self._twilio_client
+    
+    def send_message(self, phone_number: str, message: str) -> Dict[str, any]:
+        """
+        Send an SMS through the configured provider
+        
+        Args:
+            phone_number (str): The phone number to send to
+            message (str): The message body
+            
+        Returns:
+            Dict: Response with success status and message
+        """
+        if not self.enabled or self.provider == 'mock':
+            logger.info(f"Mock SMS to {phone_number}: {message}")
+            return {
+                'success': True,
+                'message': f'Mock SMS sent to {phone_number}',
+                'provider': 'mock'
+            }
+        
+        if self.provider == 'twilio':
+            return self._send_via_twilio(phone_number, message)
+        elif self.provider == 'termii':
+            return self._send_via_termii(phone_number, message)
+        elif self.provider == 'fake':
+            return self._send_via_fake(phone_number, message)
+        else:
+            logger.error(f"Unknown SMS provider: {self.provider}")
+            return {
+                'success': False,
+                'message': 'SMS service not configured',
+                'provider': self.provider
+            }
+    
+    def send_many(self, phone_numbers: List[str], message: str, max_workers: Optional[int] = None) -> List[Dict[str, any]]:
+        """
+        Send the same SMS to many recipients concurrently, e.g. broadcasts to drivers
+        
+        Args:
+            phone_numbers (List[str]): The phone numbers to send to
+            message (str): The message body
+            max_workers (int): Concurrent sends, capped at the connection pool size
+            
+        Returns:
+            List[Dict]: One response per phone number, in the same order
+        """
+        if not phone_numbers:
+            return []
+        workers = min(max_workers or self.pool_size, self.pool_size, len(phone_numbers))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sms') as executor:
+            return list(executor.map(lambda phone_number: self.send_message(phone_number, message), phone_numbers))
     
     def send_verification_code(self, phone_number: str, code: str) -> Dict[str, any]:
         """
@@ -68,11 +171,7 @@ class SMSService:
     def _send_via_twilio(self, phone_number: str, message: str) -> Dict[str, any]:
         """Send SMS via Twilio"""
         try:
-            from twilio.rest import Client
-            
-            client = Client(self.twilio_account_sid, self.twilio_auth_token)
-            
-            message = client.messages.create(
+            message = self.twilio_client.messages.create(
                 from_=self.twilio_phone_number,
                 body=message,
                 to=phone_number
@@ -97,8 +196,6 @@ class SMSService:
     def _send_via_termii(self, phone_number: str, message: str) -> Dict[str, any]:
         """Send SMS via Termii (African SMS provider)"""
         try:
-            url = "https://api.ng.termii.com/api/sms/send"
-            
             payload = {
                 "to": phone_number,
                 "from": self.termii_sender_id,
@@ -108,7 +205,7 @@ class SMSService:
                 "channel": "generic"
             }
             
-            response = requests.post(url, json=payload, timeout=30)
+            response = self.session.post(self.termii_url, json=payload, timeout=self.timeouts['termii'])
             response.raise_for_status()
             
             result = response.json()
@@ -144,6 +241,21 @@ class SMSService:
                 'provider': 'termii'
             }
     
+    def _send_via_fake(self, phone_number: str, message: str) -> Dict[str, any]:
+        """Simulate a provider round trip locally, with configurable latency and failures"""
+        time.sleep(self.fake_latency_ms / 1000)
+        if random.random() < self.fake_failure_rate:
+            return {
+                'success': False,
+                'message': 'Failed to send SMS: simulated provider error',
+                'provider': 'fake'
+            }
+        return {
+            'success': True,
+            'message': 'SMS sent successfully',
+            'provider': 'fake'
+        }
+    
     def send_welcome_message(self, phone_number: str, user_type: str) -> Dict[str, any]:
         """Send welcome message after successful verification"""
         if user_type.upper() == 'DRIVER':
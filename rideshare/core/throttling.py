@@ -0,0 +1,184 @@
+"""
+Cache-backed throttles for the auth and OTP endpoints
+Sliding-window counters kept in the THROTTLE_CACHE cache with atomic
+increments, so bursts are rejected without a database query
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.exceptions import Throttled
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+from rest_framework.views import exception_handler as drf_exception_handler
+
+THROTTLE_CACHE_PREFIX = 'throttle:'
+
+RATE_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Allow `rate` requests per window, e.g. '5/min', per identity
+
+    Requests are counted in fixed windows, and the previous window's count
+    is weighted by how much of it still overlaps the sliding window. That
+    is two cache keys per identity, and an atomic increment and one read
+    per request, however high the rate. Rejected requests are taken back off the count,
+    so a client that keeps retrying gets the full rate once it slows down.
+
+    Subclasses set `scope`, whose rate is read from DEFAULT_THROTTLE_RATES
+    and scaled by THROTTLE_RATE_MULTIPLIER, and say what identifies the
+    client in get_ident_key().
+    """
+    scope = None
+
+    def __init__(self):
+        limit, self.window = self.parse_rate(self.get_rate())
+        self.limit = limit * settings.THROTTLE_RATE_MULTIPLIER
+        self.cache = caches[settings.THROTTLE_CACHE]
+        self.retry_after = None
+
+    def get_rate(self):
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(f"No throttle rate set for scope '{self.scope}'")
+
+    @staticmethod
+    def parse_rate(rate):
+        """Split a rate like '5/min' into (requests, window seconds)"""
+        count, period = rate.split('/')
+        return int(count), RATE_PERIODS[period[0]]
+
+    def get_ident_key(self, request, view):
+        """The identity to count requests against, or None to let the request through"""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        ident = self.get_ident_key(request, view)
+        if ident is None:
+            return True
+
+        now = time.time()
+        window, elapsed = divmod(now, self.window)
+        digest = hashlib.sha256(str(ident).encode()).hexdigest()[:32]
+        prefix = f'{THROTTLE_CACHE_PREFIX}{self.scope}:{digest}:'
+        current_key, previous_key = f'{prefix}{int(window)}', f'{prefix}{int(window) - 1}'
+
+        current = self.increment(current_key)
+        previous = self.cache.get(previous_key, 0)
+        overlap = 1 - elapsed / self.window
+        if previous * overlap + current <= self.limit:
+            return True
+
+        try:
+            self.cache.decr(current_key)
+        except ValueError:
+            pass
+        self.retry_after = self.time_until_allowed(previous, current - 1, elapsed)
+        return False
+
+    def increment(self, key):
+        """Atomically count a request in a window, creating the counter on first use"""
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Kept for two windows: the current one and the one it is weighted into next
+            if self.cache.add(key, 1, timeout=self.window * 2):
+                return 1
+            return self.cache.incr(key)
+
+    def time_until_allowed(self, previous, current, elapsed):
+        """Seconds until one more request fits, given the counts that were allowed"""
+        if current < self.limit:
+            # Wait for the previous window's weight to decay by the excess
+            excess = previous * (1 - elapsed / self.window) + current + 1 - self.limit
+            return excess / previous * self.window
+        # The current window alone is full: it has to become the previous one and decay by a request
+        return self.window - elapsed + self.window / self.limit
+
+    def wait(self):
+        return self.retry_after
+
+
+class ClientIPThrottle(SlidingWindowThrottle):
+    """
+    Counts requests per client IP address
+
+    The address is REMOTE_ADDR, or with NUM_PROXIES set the one that many
+    hops back in X-Forwarded-For, so clients can't pick their own.
+    """
+
+    def get_ident_key(self, request, view):
+        return self.get_ident(request)
+
+
+class RequestFieldThrottle(SlidingWindowThrottle):
+    """Counts requests per account named in the request, however many addresses they come from"""
+    field = 'email'
+
+    def get_ident_key(self, request, view):
+        value = request.data.get(self.field) if hasattr(request.data, 'get') else None
+        if not isinstance(value, str) or not value.strip():
+            return None
+        return value.strip().lower()
+
+
+class UserThrottle(SlidingWindowThrottle):
+    """Counts requests per signed-in user"""
+
+    def get_ident_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return self.get_ident(request)
+
+
+class LoginThrottle(ClientIPThrottle):
+    scope = 'login'
+
+
+class LoginAccountThrottle(RequestFieldThrottle):
+    scope = 'login_account'
+
+
+class RegisterThrottle(ClientIPThrottle):
+    scope = 'register'
+
+
+class RegisterEmailThrottle(RequestFieldThrottle):
+    scope = 'register_account'
+
+
+class RegisterPhoneThrottle(RequestFieldThrottle):
+    scope = 'register_phone'
+    field = 'phone_number'
+
+
+class PasswordResetThrottle(ClientIPThrottle):
+    scope = 'password_reset'
+
+
+class PasswordResetAccountThrottle(RequestFieldThrottle):
+    scope = 'password_reset_account'
+
+
+class OTPSendThrottle(UserThrottle):
+    scope = 'otp_send'
+
+
+class OTPVerifyThrottle(UserThrottle):
+    scope = 'otp_verify'
+
+
+def exception_handler(exc, context):
+    """
+    DRF's exception handler, with throttled responses also carrying the
+    'error' and 'message' keys the API clients and auth pages display
+    """
+    response = drf_exception_handler(exc, context)
+    if isinstance(exc, Throttled) and response is not None:
+        text = 'Too many attempts. Please wait before trying again.'
+        response.data = {'error': text, 'message': text, 'retry_after': exc.wait}
+    return response
@@ -3,27 +3,33 @@ from django.contrib.auth import authenticate
 from django.shortcuts import get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.utils import timezone
+from django.conf import settings
+from django.db import transaction
 from rest_framework import generics, permissions, status
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.throttling import UserRateThrottle
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from .serializers import (CustomTokenSerializer, UserSerializer, RegisterSerializer, 
                         DriverProfileSerializer, LoginSerializer, PhoneVerificationSerializer,
                         SendVerificationCodeSerializer, VerifyPhoneCodeSerializer,
                         ChangePasswordSerializer, ForgotPasswordSerializer, ResetPasswordSerializer)
 from .models import CustomUser, DriverProfile, PhoneVerification, PasswordReset
-from .sms_service import sms_service
+from .otp import otp_store, MISSING, EXHAUSTED, INVALID
+from .outbox import enqueue_sms, enqueue_email
+from .throttling import (LoginThrottle, LoginAccountThrottle, RegisterThrottle, RegisterEmailThrottle,
+                         RegisterPhoneThrottle, PasswordResetThrottle, PasswordResetAccountThrottle,
+                         OTPSendThrottle, OTPVerifyThrottle)
 
 # Create your views here.
 @method_decorator(csrf_exempt, name='dispatch')
 class RegisterView(generics.CreateAPIView):
     queryset = CustomUser.objects.all()
     permission_classes = [permissions.AllowAny]
+    # Each sign-up sends an email and an SMS, so also limit them per address and number
+    throttle_classes = [RegisterThrottle, RegisterEmailThrottle, RegisterPhoneThrottle]
     serializer_class = RegisterSerializer
     
     def create(self, request, *args, **kwargs):
@@ -86,6 +92,7 @@ class RegisterView(generics.CreateAPIView):
 
 class CustomTokenView(TokenObtainPairView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [LoginThrottle, LoginAccountThrottle]
     serializer_class = CustomTokenSerializer
 
 class ProfileView(APIView):
@@ -149,6 +156,7 @@ class DriverProfileView(APIView):
 
 class LoginView(TokenObtainPairView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [LoginThrottle, LoginAccountThrottle]
     serializer_class = TokenObtainPairSerializer
 
     def post(self, request):
@@ -265,6 +273,7 @@ class LogoutView(APIView):
 # Phone Verification Views
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@throttle_classes([OTPSendThrottle])
 def send_verification_code(request):
     """Send SMS verification code to user's phone number"""
     
@@ -291,43 +300,22 @@ def send_verification_code(request):
             'error': 'Phone number is already verified'
         }, status=status.HTTP_400_BAD_REQUEST)
         
-    # Check for recent verification attempts (rate limiting)
-    recent_attempts = PhoneVerification.objects.filter(
-        user=user,
-        phone_number=phone_number,
-        created_at__gte=timezone.now() - timezone.timedelta(minutes=1)
-    ).count()
-        
-    if recent_attempts >= 3:
-        return Response({
-            'error': 'Too many verification attempts. Please wait before requesting another code.'
-        }, status=status.HTTP_429_TOO_MANY_REQUESTS)
-        
-    # Create new verification record
-    verification = PhoneVerification.objects.create(
-        user=user,
-        phone_number=phone_number
-    )
-    
-    # Send SMS using the configured SMS service
-    message = f"Your RideOn verification code is: {verification.verification_code}. This code expires in 10 minutes."
-    sms_success = sms_service._send_via_twilio(phone_number, message)
+    # Requests per user are rate limited by OTPSendThrottle, in the cache
+    # Record the code and queue its SMS together; the outbox worker sends it
+    with transaction.atomic():
+        code, verification = otp_store.issue(user, phone_number)
+        message = f"Your RideOn verification code is: {code}. This code expires in {settings.OTP_TTL_MINUTES} minutes."
+        enqueue_sms(phone_number, message, sensitive=True)
     
-    if sms_success:
-        return Response({
-            'message': 'Verification code sent successfully',
-            'expires_at': verification.expires_at
-        }, status=status.HTTP_200_OK)
-    else:
-        # Delete the verification record if SMS failed
-        verification.delete()
-        return Response({
-            'error': 'Failed to send verification code. Please try again.'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response({
+        'message': 'Verification code sent successfully',
+        'expires_at': verification.expires_at
+    }, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@throttle_classes([OTPVerifyThrottle])
 def verify_phone_code(request):
     """Verify the SMS code sent to user's phone number"""
     serializer = VerifyPhoneCodeSerializer(data=request.data)
@@ -349,31 +337,20 @@ def verify_phone_code(request):
                 'error': 'Phone number is already verified'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Find the most recent verification record
-        verification = PhoneVerification.objects.filter(
-            user=user,
-            phone_number=phone_number,
-            is_verified=False
-        ).order_by('-created_at').first()
+        # One atomic attempt count and a read from the cache; the database is only written once the code matches
+        outcome, remaining_attempts = otp_store.verify(user, phone_number, verification_code)
         
-        if not verification:
+        if outcome == MISSING:
             return Response({
                 'error': 'No verification request found. Please request a new verification code.'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Check if verification is still valid
-        if not verification.is_valid():
+        if outcome == EXHAUSTED:
             return Response({
                 'error': 'Verification code has expired or exceeded maximum attempts. Please request a new code.'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Increment attempts
-        verification.attempts += 1
-        verification.save()
-        
-        # Check if code matches
-        if verification.verification_code != verification_code:
-            remaining_attempts = 3 - verification.attempts
+        if outcome == INVALID:
             if remaining_attempts > 0:
                 return Response({
                     'error': f'Invalid verification code. You have {remaining_attempts} attempts remaining.'
@@ -383,17 +360,13 @@ def verify_phone_code(request):
                     'error': 'Invalid verification code. Maximum attempts exceeded. Please request a new code.'
                 }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Verification successful
-        verification.is_verified = True
-        verification.save()
-        
         # Update user's phone verification status
         user.is_phone_verified = True
         user.save()
         
         # Send welcome message
         welcome_message = f"Welcome to RideOn! Your phone number has been verified successfully. You're all set to {'start driving' if user.user_type == 'driver' else 'book rides'}!"
-        sms_service._send_via_twilio(phone_number, welcome_message)
+        enqueue_sms(phone_number, welcome_message)
         
         return Response({
             'message': 'Phone number verified successfully!',
@@ -452,11 +425,11 @@ class ChangePasswordView(APIView):
 class ForgotPasswordView(APIView):
     """Send password reset email"""
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [PasswordResetThrottle, PasswordResetAccountThrottle]
     
     def post(self, request):
         from .serializers import ForgotPasswordSerializer
         from .models import PasswordReset
-        from django.core.mail import send_mail
         from django.conf import settings
         
         serializer = ForgotPasswordSerializer(data=request.data, context={'request': request})
@@ -490,13 +463,7 @@ Best regards,
 The RideShare Team
                 """
                 
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [email],
-                    fail_silently=False,
-                )
+                enqueue_email(email, subject, message)
                 
             except CustomUser.DoesNotExist:
                 # For security, don't reveal whether email exists
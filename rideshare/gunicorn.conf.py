@@ -0,0 +1,24 @@
+"""
+gunicorn settings: gunicorn rideshare.wsgi (run from this directory)
+Threaded workers, each holding at most `threads` database connections -
+one persistent connection per thread, or a DB_POOL_SIZE pool shared by them.
+For ASGI: gunicorn -k uvicorn_worker.UvicornWorker rideshare.asgi, with a pool
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Recycle workers now and then; their connections and pools are closed with them
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+timeout = 30
+
+
+def post_fork(server, worker):
+    # With --preload the master has loaded Django, and a connection it opened mustn't be shared
+    if server.cfg.preload_app:
+        from django.db import connections
+        connections.close_all()
@@ -0,0 +1,76 @@
+"""
+Async read views
+The read-heavy endpoints of rideon.views as coroutines, routed in place of the
+DRF views when ASYNC_API is on (the ASGI server). They share the DRF views'
+query building and serializers; only fetching the rows awaits the async ORM.
+Writes to the same URLs are passed on to the DRF views.
+"""
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from rest_framework.response import Response
+from core.async_api import async_api_view
+from . import views
+from .driver_table import driver_position
+from .models import Ride, Rating
+from .pagination import CreatedAtCursorPagination
+from .reads import rating_summary, pending_rides as cached_pending_rides
+from .serializers import RideSerializer, RideMessageSerializer, RatingSerializer
+
+
+@async_api_view(views.rides)
+async def rides(request):
+    """Get rides for the current user, one page at a time; see views.rides"""
+    user_rides, fields = views._user_rides(request)
+    paginator = CreatedAtCursorPagination()
+    page = await paginator.apaginate_queryset(user_rides, request)
+    return paginator.get_paginated_response(RideSerializer(page, many=True, fields=fields).data)
+
+
+@async_api_view(views.available_rides)
+async def available_rides(request):
+    """Get pending rides for drivers; see views.available_rides"""
+    position = None
+    if request.query_params.get('near') == 'me':
+        # Shared memory, but falls back to the database when the table is stale
+        position = await sync_to_async(driver_position)(request.user.id)
+    area = views._search_area(request, position)
+    if area is None:
+        pool = await sync_to_async(cached_pending_rides)()
+        offered = {ride_id async for ride_id in views._offered_elsewhere(request.user)}
+        return Response(views._open_to(request.user, pool, offered))
+
+    lat, lng, radius, limit = area
+    candidates = [ride async for ride in views._pending_near(request.user, lat, lng, radius)]
+    return Response(views._nearest(candidates, lat, lng, radius, limit))
+
+
+@async_api_view(views.ride_messages)
+async def ride_messages(request, ride_id):
+    """Get messages for a ride, or those after ``after``; see views.ride_messages"""
+    try:
+        ride = await Ride.objects.aget(id=ride_id)
+    except Ride.DoesNotExist:
+        return Response({'error': 'Ride not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if ride.rider_id != request.user.id and ride.driver_id != request.user.id:
+        return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+
+    messages = [message async for message in views._thread(ride, request)]
+    return Response(RideMessageSerializer(messages, many=True).data)
+
+
+@async_api_view(views.user_ratings)
+async def user_ratings(request, user_id=None):
+    """Get the rating summary for a user, with ``?details=true`` a page of ratings; see views.user_ratings"""
+    target_user_id = user_id or request.user.id
+
+    data = dict(await sync_to_async(rating_summary)(target_user_id))
+
+    if request.query_params.get('details') in ('1', 'true'):
+        ratings = Rating.objects.filter(rated_user_id=target_user_id).select_related('rater', 'rated_user')
+        paginator = CreatedAtCursorPagination()
+        page = await paginator.apaginate_queryset(ratings, request)
+        data['ratings'] = RatingSerializer(page, many=True).data
+        data['next'] = paginator.get_next_link()
+
+    return Response(data)
@@ -0,0 +1,456 @@
+"""
+Batch dispatch
+Pending rides are matched to free drivers on a short tick by solving a
+min-cost assignment over pickup distances, and each ride is offered to its
+matched driver, then to widening waves of nearby drivers
+"""
+import time
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+import numpy as np
+from django.db.models import Exists, Max, OuterRef, Q
+from django.utils import timezone
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+from .driver_table import available_drivers
+from .events import ride_events
+from .geo import KM_PER_DEGREE
+from .models import RELEASED_RIDES, Ride, RideRequest
+from .pricing import distance_matrix
+from .signals import notify_ride_created, notify_ride_reserved
+
+DISPATCH_TICK_SECONDS = 5
+
+# Drivers further than this from a pickup are never batch matched to it
+MAX_PICKUP_KM = 5
+
+# Offer waves: (drivers offered, search radius in km, seconds to accept).
+# Wave 1 is the batch match, one driver per ride; each later wave goes to
+# the nearest free drivers not yet offered the ride. Rides nobody accepts
+# in any wave are left to the open available_rides list.
+OFFER_WAVES = [
+    (1, MAX_PICKUP_KM, 20),
+    (3, 5, 20),
+    (6, 10, 30),
+    (12, 20, 45),
+]
+
+# Cost of leaving a ride unmatched; twice the longest pickup, so serving another ride outweighs longer pickups
+UNMATCHED_PENALTY_KM = 2 * MAX_PICKUP_KM
+
+# Up to this many rides x drivers the full cost matrix is solved exactly
+DENSE_MAX_PAIRS = 1_000_000
+
+# Larger problems are cut into tiles of about TILE_RIDES rides, each ride
+# considering only its CANDIDATE_DRIVERS nearest drivers
+TILE_RIDES = 1000
+CANDIDATE_DRIVERS = 32
+
+# Each pass re-solves every tile of a tiling rotated by this many degrees,
+# so pairs cut apart by one tiling's edges are solved together by the next
+TILING_ANGLES = (0, 45, 22.5, 67.5, 11.25)
+
+# Rides per tick, oldest first
+MAX_DISPATCH_RIDES = 10_000
+
+NO_MATCH = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))
+
+
+def candidate_pairs(ride_points, driver_points, max_km=MAX_PICKUP_KM, neighbours=CANDIDATE_DRIVERS):
+    """
+    Each ride's nearest drivers within max_km
+
+    Points are bucketed into a grid of cells at least max_km wide, and each
+    ride is measured only against drivers in its own and the eight
+    surrounding cells, so the work grows with local density rather than
+    with rides x drivers.
+
+    Returns:
+        tuple: Ride indexes, driver indexes and distances in km of the pairs
+    """
+    if not len(ride_points) or not len(driver_points):
+        return NO_MATCH
+    cell_lat = max_km / KM_PER_DEGREE
+    # Cells are widest in degrees of longitude nearest the poles
+    widest = np.abs(np.concatenate([ride_points[:, 0], driver_points[:, 0]])).max()
+    cell_lng = cell_lat / max(np.cos(np.radians(widest)), 0.01)
+
+    def cells(points):
+        return zip(np.floor(points[:, 0] / cell_lat).astype(np.int64).tolist(),
+                   np.floor(points[:, 1] / cell_lng).astype(np.int64).tolist())
+
+    driver_cells = {}
+    for index, cell in enumerate(cells(driver_points)):
+        driver_cells.setdefault(cell, []).append(index)
+    ride_cells = {}
+    for index, cell in enumerate(cells(ride_points)):
+        ride_cells.setdefault(cell, []).append(index)
+
+    rows, cols, distances = [], [], []
+    for (lat_cell, lng_cell), rides in ride_cells.items():
+        candidates = [index
+                      for d_lat in (-1, 0, 1) for d_lng in (-1, 0, 1)
+                      for index in driver_cells.get((lat_cell + d_lat, lng_cell + d_lng), ())]
+        if not candidates:
+            continue
+        rides = np.array(rides)
+        candidates = np.array(candidates)
+        block = distance_matrix(ride_points[rides], driver_points[candidates])
+        if len(candidates) > neighbours:
+            nearest = np.argpartition(block, neighbours - 1, axis=1)[:, :neighbours]
+        else:
+            nearest = np.broadcast_to(np.arange(len(candidates)), block.shape)
+        block = np.take_along_axis(block, nearest, axis=1)
+
+        within = block <= max_km
+        rows.append(np.broadcast_to(rides[:, np.newaxis], block.shape)[within])
+        cols.append(candidates[nearest][within])
+        distances.append(block[within])
+
+    if not rows:
+        return NO_MATCH
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(distances)
+
+
+def tiles(ride_points, driver_points, size=TILE_RIDES, angle=0.0):
+    """
+    Split rides and drivers into spatial tiles of at most about `size` rides
+
+    Tiles are cut recursively at the median ride across the longer side of
+    their bounding box, so they follow ride density. Every ride and driver
+    lands in exactly one tile. A non-zero angle cuts along axes rotated by
+    that many degrees, giving tiles whose edges cross the unrotated ones.
+
+    Yields:
+        tuple: Ride indexes and driver indexes of each tile
+    """
+    def plane(points):
+        # Roughly equal-area x/y, then rotated
+        y = points[:, 0]
+        x = points[:, 1] * np.cos(np.radians(points[:, 0]))
+        theta = np.radians(angle)
+        return np.column_stack([y * np.cos(theta) - x * np.sin(theta), y * np.sin(theta) + x * np.cos(theta)])
+
+    ride_plane, driver_plane = plane(ride_points), plane(driver_points)
+    stack = [(np.arange(len(ride_points)), np.arange(len(driver_points)))]
+    while stack:
+        rides, drivers = stack.pop()
+        points = ride_plane[rides]
+        if len(rides) > size:
+            axis = int(np.ptp(points[:, 1]) > np.ptp(points[:, 0]))
+            cut = np.median(points[:, axis])
+            below = points[:, axis] < cut
+            if below.any() and not below.all():
+                driver_below = driver_plane[drivers, axis] < cut
+                stack.append((rides[below], drivers[driver_below]))
+                stack.append((rides[~below], drivers[~driver_below]))
+                continue
+        yield rides, drivers
+
+
+def match_sparse(ride_points, driver_points, rides, drivers, blocked, max_km):
+    """
+    Min-cost matching of a subset of rides to a subset of drivers over their candidate pairs
+
+    Args:
+        rides, drivers (ndarray): Indexes into ride_points and driver_points
+        blocked (ndarray): Sorted ride index * len(driver_points) + driver index codes never to match
+
+    Returns:
+        tuple: Matched ride indexes, driver indexes and distances, as indexes into the full arrays
+    """
+    local_rides, local_drivers, distances = candidate_pairs(ride_points[rides], driver_points[drivers], max_km)
+    pair_rides, pair_drivers = rides[local_rides], drivers[local_drivers]
+    if len(blocked):
+        keep = ~np.isin(pair_rides * len(driver_points) + pair_drivers, blocked, assume_unique=True)
+        local_rides, local_drivers, distances = local_rides[keep], local_drivers[keep], distances[keep]
+    if not len(distances):
+        return NO_MATCH
+
+    # Each ride also gets a private "unmatched" column so a full matching always
+    # exists; weights are shifted by 1 as the solver needs them to be positive
+    n, m = len(rides), len(drivers)
+    own = np.arange(n)
+    graph = csr_matrix(
+        (np.concatenate([distances, np.full(n, UNMATCHED_PENALTY_KM)]) + 1,
+         (np.concatenate([local_rides, own]), np.concatenate([local_drivers, m + own]))),
+        shape=(n, m + n),
+    )
+    matched_rides, columns = min_weight_full_bipartite_matching(graph)
+    matched = columns < m
+    matched_rides, columns = matched_rides[matched], columns[matched]
+    distances = np.asarray(graph[matched_rides, columns]).ravel() - 1
+    return rides[matched_rides], drivers[columns], distances
+
+
+def assign(ride_points, driver_points, excluded=(), max_km=MAX_PICKUP_KM, dense_max_pairs=DENSE_MAX_PAIRS):
+    """
+    Match rides to drivers, minimising the total pickup distance
+
+    Leaving a ride unmatched costs UNMATCHED_PENALTY_KM, so rides are
+    passed over only when that shortens other pickups by more. Up to
+    dense_max_pairs the full cost matrix is solved exactly with the
+    Hungarian method. Beyond that the problem is cut into spatial tiles
+    solved independently over each ride's nearest drivers, once per
+    tiling in TILING_ANGLES. A tile's solution is kept only if it is
+    cheaper than the pairs it replaces, so later passes only improve on
+    matches the earlier tile edges got wrong.
+
+    Args:
+        ride_points (ndarray): (N, 2) pickup [lat, lng]
+        driver_points (ndarray): (M, 2) driver [lat, lng]
+        excluded (iterable): (ride index, driver index) pairs never to match
+        max_km (float): Longest pickup allowed
+        dense_max_pairs (int): Largest rides x drivers solved without pruning
+
+    Returns:
+        tuple: Matched ride indexes, driver indexes and pickup distances in km
+    """
+    excluded = list(excluded)
+    if not len(ride_points) or not len(driver_points):
+        return NO_MATCH
+
+    if len(ride_points) * len(driver_points) <= dense_max_pairs:
+        distances = distance_matrix(ride_points, driver_points)
+        if excluded:
+            distances[tuple(np.array(excluded).T)] = np.inf
+        cost = np.where(distances <= max_km, distances, UNMATCHED_PENALTY_KM)
+        rides, drivers = linear_sum_assignment(cost)
+        matched = distances[rides, drivers] <= max_km
+        return rides[matched], drivers[matched], distances[rides, drivers][matched]
+
+    blocked = np.unique([ride * len(driver_points) + driver for ride, driver in excluded]).astype(np.int64)
+    ride_driver = np.full(len(ride_points), -1)
+    driver_ride = np.full(len(driver_points), -1)
+    ride_distance = np.zeros(len(ride_points))
+
+    # A single tile is solved in one pass
+    angles = TILING_ANGLES if len(ride_points) > TILE_RIDES else TILING_ANGLES[:1]
+    for angle in angles:
+        for rides, drivers in tiles(ride_points, driver_points, angle=angle):
+            # Pairs reaching outside the tile stay as they are
+            rides = rides[np.isin(ride_driver[rides], np.append(drivers, -1))]
+            drivers = drivers[np.isin(driver_ride[drivers], np.append(rides, -1))]
+            current = ride_distance[rides].sum() + (ride_driver[rides] < 0).sum() * UNMATCHED_PENALTY_KM
+
+            matched_rides, matched_drivers, distances = match_sparse(
+                ride_points, driver_points, rides, drivers, blocked, max_km)
+            if distances.sum() + (len(rides) - len(distances)) * UNMATCHED_PENALTY_KM >= current - 1e-9:
+                continue
+            ride_driver[rides], driver_ride[drivers], ride_distance[rides] = -1, -1, 0
+            ride_driver[matched_rides] = matched_drivers
+            driver_ride[matched_drivers] = matched_rides
+            ride_distance[matched_rides] = distances
+
+    matched = np.flatnonzero(ride_driver >= 0)
+    return matched, ride_driver[matched], ride_distance[matched]
+
+
+def fan_out(point, driver_points, eligible, after_wave):
+    """
+    Pick the drivers for a ride's next offer wave
+
+    The waves after after_wave are tried in turn, so a ride nobody is near
+    skips straight to a wave with a wider radius.
+
+    Args:
+        point (ndarray): The pickup [lat, lng]
+        driver_points (ndarray): (M, 2) driver [lat, lng]
+        eligible (ndarray): (M,) mask of drivers who may be offered the ride
+        after_wave (int): The ride's last wave, 0 if it has had none
+
+    Returns:
+        tuple: The wave, and the indexes and distances of its drivers nearest
+        first; the wave is None if no remaining wave reaches anyone
+    """
+    distances = distance_matrix(point[np.newaxis], driver_points)[0]
+    for wave in range(after_wave + 1, len(OFFER_WAVES) + 1):
+        drivers, radius_km, _ = OFFER_WAVES[wave - 1]
+        candidates = np.flatnonzero(eligible & (distances <= radius_km))
+        if len(candidates):
+            nearest = candidates[np.argsort(distances[candidates], kind='stable')[:drivers]]
+            return wave, nearest, distances[nearest]
+    return None, np.empty(0, dtype=np.int64), np.empty(0)
+
+
+def dispatch_once(since=None):
+    """
+    Run one dispatch tick
+
+    Rides whose last wave ran out without an accept move on to their next
+    wave first, oldest first. New rides are then batch matched to the
+    remaining free drivers as wave 1, and new rides nobody was matched to go
+    straight on to the later waves. Rides already under an offer, and
+    drivers holding one, sit the tick out; a driver is never offered the
+    same ride twice. The offers, and rides whose offers lapsed since the
+    previous tick, are then published to the live ride feed.
+
+    Args:
+        since (datetime): When the previous tick ran, None on the first
+
+    Returns:
+        dict: Rides and free drivers considered, offers made per wave and the
+        batch solve time in ms
+    """
+    now = timezone.now()
+    outstanding = RideRequest.objects.filter(ride=OuterRef('pk'), expires_at__gt=now)
+    rides = list(Ride.objects
+                 .filter(status='pending')
+                 .filter(RELEASED_RIDES)
+                 .filter(~Exists(outstanding))
+                 .annotate(last_wave=Max('riderequest__wave'))
+                 # Rides past the last wave are left to the open list; filtered before the
+                 # limit so they can't fill it and starve newer rides
+                 .filter(Q(last_wave__isnull=True) | Q(last_wave__lt=len(OFFER_WAVES)))
+                 .order_by('created_at')
+                 .values_list('id', 'rider_id', 'pickup_latitude', 'pickup_longitude', 'last_wave')[:MAX_DISPATCH_RIDES])
+    stats = {'rides': len(rides), 'drivers': 0, 'offers': Counter(), 'solve_ms': 0.0}
+    offers = make_offers(rides, now, stats) if rides else []
+    RideRequest.objects.bulk_create(offers, batch_size=1000, ignore_conflicts=True)
+    stats['offers'] = Counter(offer.wave for offer in offers)
+    publish_offers(rides, offers, since, now)
+    return stats
+
+
+def make_offers(rides, now, stats):
+    """
+    Match a tick's rides to free drivers and build their offers
+
+    Args:
+        rides (list): (id, rider_id, pickup_latitude, pickup_longitude, last_wave) per ride
+        now (datetime): The tick's time
+        stats (dict): dispatch_once()'s stats, given the free drivers and solve time
+
+    Returns:
+        list: Unsaved RideRequests
+    """
+    driver_ids, driver_points = available_drivers()
+    busy = RideRequest.objects.filter(expires_at__gt=now, ride__status='pending').values_list('driver_id', flat=True)
+    keep = ~np.isin(driver_ids, list(busy))
+    driver_ids, driver_points = driver_ids[keep], driver_points[keep]
+    stats['drivers'] = len(driver_ids)
+    if not len(driver_ids):
+        return []
+
+    # Drivers who were already offered a ride, and a rider's own driver account, never get it
+    ride_ids = [ride[0] for ride in rides]
+    passed = {ride_id: {rider_id} for ride_id, rider_id, _, _, _ in rides}
+    for ride_id, driver_id in RideRequest.objects.filter(ride_id__in=ride_ids).values_list('ride_id', 'driver_id'):
+        passed[ride_id].add(driver_id)
+
+    free = np.ones(len(driver_ids), dtype=bool)
+    offers = []
+
+    def offer(ride_id, wave, drivers, distances):
+        free[drivers] = False
+        expires_at = now + timedelta(seconds=OFFER_WAVES[wave - 1][2])
+        offers.extend(
+            RideRequest(ride_id=ride_id, driver_id=driver_id, wave=wave,
+                        pickup_distance=Decimal(f'{distance:.2f}'), expires_at=expires_at)
+            for driver_id, distance in zip(driver_ids[drivers].tolist(), distances.tolist())
+        )
+
+    def next_wave(ride_id, latitude, longitude, after_wave):
+        eligible = free & ~np.isin(driver_ids, list(passed[ride_id]))
+        point = np.array([float(latitude), float(longitude)])
+        wave, drivers, distances = fan_out(point, driver_points, eligible, after_wave)
+        if wave is not None:
+            offer(ride_id, wave, drivers, distances)
+
+    for ride_id, _, latitude, longitude, last_wave in rides:
+        if last_wave:
+            next_wave(ride_id, latitude, longitude, last_wave)
+
+    new = [ride for ride in rides if not ride[4]]
+    candidates = np.flatnonzero(free)
+    if new and len(candidates):
+        ride_points = np.array([(float(lat), float(lng)) for _, _, lat, lng, _ in new])
+        driver_index = {driver_id: i for i, driver_id in enumerate(driver_ids[candidates].tolist())}
+        excluded = [(i, driver_index[driver_id])
+                    for i, ride in enumerate(new) for driver_id in passed[ride[0]] if driver_id in driver_index]
+
+        started = time.perf_counter()
+        matched_rides, matched_drivers, distances = assign(ride_points, driver_points[candidates], excluded)
+        stats['solve_ms'] = (time.perf_counter() - started) * 1000
+        for ride, driver, distance in zip(matched_rides.tolist(), matched_drivers.tolist(), distances.tolist()):
+            offer(new[ride][0], 1, candidates[[driver]], np.array([distance]))
+
+        matched = set(matched_rides.tolist())
+        for i, (ride_id, _, latitude, longitude, _) in enumerate(new):
+            if i not in matched:
+                next_wave(ride_id, latitude, longitude, 1)
+    return offers
+
+
+def publish_offers(rides, offers, since, now):
+    """
+    Keep the live ride feed in step with the offers, as available_rides is
+
+    Every driver but those offered a ride drops it. Drivers offered a ride
+    in a later wave had dropped it when the earlier wave was offered, so they
+    get it back. A ride whose offers lapsed since the previous tick and which
+    wasn't offered again is open to every driver, and is published to all.
+
+    Args:
+        rides (list): The tick's rides, as passed to make_offers()
+        offers (list): The tick's RideRequests
+        since (datetime): When the previous tick ran, None on the first
+        now (datetime): The tick's time
+    """
+    if not ride_events.has_audience:
+        return
+    offered = {}
+    for offer in offers:
+        offered.setdefault(offer.ride_id, []).append(offer.driver_id)
+    for ride_id, driver_ids in offered.items():
+        notify_ride_reserved(ride_id, driver_ids)
+
+    reoffered = [ride_id for ride_id, _, _, _, last_wave in rides if last_wave and ride_id in offered]
+    if since is None and not reoffered:
+        return
+    returned = Q(id__in=reoffered)
+    if since is not None:
+        lapsed = RideRequest.objects.filter(ride=OuterRef('pk'), expires_at__gt=since, expires_at__lte=now)
+        outstanding = RideRequest.objects.filter(ride=OuterRef('pk'), expires_at__gt=now)
+        returned |= Q(Exists(lapsed), ~Exists(outstanding), status='pending')
+    for ride in Ride.objects.filter(returned).select_related('rider', 'driver'):
+        notify_ride_created(ride, to=offered.get(ride.id))
+
+
+def wave_metrics(since):
+    """
+    Offer outcomes per wave, for offers made since a moment
+
+    Returns:
+        list: A dict per wave with the offers made, rides offered, offers
+        accepted, and median and 90th percentile seconds to accept, counted
+        from the ride request and from the offer
+    """
+    offers = (RideRequest.objects
+              .filter(created_at__gte=since)
+              .values_list('wave', 'ride_id', 'created_at', 'accepted_at', 'ride__created_at'))
+    waves = {}
+    for wave, ride_id, offered_at, accepted_at, requested_at in offers:
+        entry = waves.setdefault(wave, {'offers': 0, 'rides': set(), 'from_request': [], 'from_offer': []})
+        entry['offers'] += 1
+        entry['rides'].add(ride_id)
+        if accepted_at is not None:
+            entry['from_request'].append((accepted_at - requested_at).total_seconds())
+            entry['from_offer'].append((accepted_at - offered_at).total_seconds())
+
+    metrics = []
+    for wave, entry in sorted(waves.items()):
+        accepted = len(entry['from_offer'])
+        metrics.append({
+            'wave': wave,
+            'offers': entry['offers'],
+            'rides': len(entry['rides']),
+            'accepted': accepted,
+            'acceptance_rate': accepted / len(entry['rides']),
+            'p50_from_request': float(np.median(entry['from_request'])) if accepted else None,
+            'p90_from_request': float(np.percentile(entry['from_request'], 90)) if accepted else None,
+            'p50_from_offer': float(np.median(entry['from_offer'])) if accepted else None,
+        })
+    return metrics
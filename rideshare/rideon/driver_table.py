@@ -0,0 +1,441 @@
+"""
+Shared-memory driver table
+Driver positions and availability in a fixed-layout array in a memory-mapped
+file. One writer per host keeps it in sync with the database; every web
+worker on the host reads it without locks, queries or IPC.
+"""
+import fcntl
+import logging
+import math
+import mmap
+import os
+import threading
+import time
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from core.models import DriverProfile
+from .models import Ride
+from .pricing import distance_matrix
+
+logger = logging.getLogger(__name__)
+
+TABLE_MAGIC = b'RIDEDRV1'
+TABLE_VERSION = 1
+HEADER_SIZE = 64
+
+HEADER = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('capacity', '<u4'),
+    ('count', '<u4'),  # Slots in use, published after the slots are written
+    ('synced_at', '<f8'),  # Unix time of the writer's last sync
+], align=True)
+
+# 48-byte records, aligned so each field is written with a single store
+RECORD = np.dtype([
+    ('seq', '<u4'),  # Odd while the writer is updating the slot
+    ('available', 'u1'),  # Online and not on a ride
+    ('driver_id', '<i8'),
+    ('latitude', '<f8'),
+    ('longitude', '<f8'),
+    ('heading', '<f4'),  # NaN when the device didn't report one
+    ('timestamp', '<f8'),  # Unix time of the position
+], align=True)
+DATA_FIELDS = RECORD.names[1:]
+
+# Re-reads of a slot caught mid-write before it is left out of a snapshot
+READ_RETRIES = 3
+
+# Seconds between checks that the writer hasn't replaced the file
+REOPEN_CHECK_SECONDS = 5
+
+# Readers fall back to the database if the writer hasn't synced for this long
+TABLE_STALE_SECONDS = 30
+
+# Positions older than this aren't used for proximity or ETA
+LOCATION_MAX_AGE_SECONDS = 300
+
+# Pickup ETA: the nearest free driver within ETA_SEARCH_RADIUS_KM, driving at PICKUP_SPEED_KMH
+ETA_SEARCH_RADIUS_KM = 5
+PICKUP_SPEED_KMH = 20
+
+
+class DriverTable:
+    """
+    Fixed-capacity array of driver records in a memory-mapped file
+
+    The writer and every reader map the same file, so all processes on a
+    host share one copy of the state. Each slot carries a sequence number
+    the writer makes odd while updating the slot and even again afterwards;
+    readers copy slots between two reads of the sequence numbers and re-read
+    any that changed, so a read never blocks and never returns a torn
+    record. This relies on stores becoming visible in program order, as on
+    x86-64.
+
+    Slots are only appended, so a driver keeps their slot for the life of
+    the file. Use create() in the single writer and open() in readers.
+    """
+
+    def __init__(self, path, fd, writable=False):
+        self.path = path
+        self.writable = writable
+        self.inode = os.fstat(fd).st_ino
+        size = os.fstat(fd).st_size
+        if size < HEADER_SIZE:
+            raise ValueError(f'{path} is not a driver table')
+        self._mmap = mmap.mmap(fd, size, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+
+        self.header = np.frombuffer(self._mmap, dtype=HEADER, count=1)
+        if self.header['magic'][0] != TABLE_MAGIC or self.header['version'][0] != TABLE_VERSION:
+            raise ValueError(f'{path} is not a version {TABLE_VERSION} driver table')
+        self.capacity = int(self.header['capacity'][0])
+        if size < HEADER_SIZE + self.capacity * RECORD.itemsize:
+            raise ValueError(f'{path} is truncated')
+        self.records = np.frombuffer(self._mmap, dtype=RECORD, count=self.capacity, offset=HEADER_SIZE)
+
+        # Writer only: driver id -> slot
+        self._slots = {}
+        if writable:
+            ids = self.records['driver_id'][:self.count].tolist()
+            self._slots = {driver_id: slot for slot, driver_id in enumerate(ids)}
+
+    @classmethod
+    def open(cls, path):
+        """
+        Map an existing table read-only
+
+        Raises:
+            FileNotFoundError: If no writer has created the table
+            ValueError: If the file isn't a table of this layout
+        """
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            return cls(path, fd)
+        finally:
+            # The mapping keeps its own reference to the file
+            os.close(fd)
+
+    @classmethod
+    def create(cls, path, capacity):
+        """
+        Map the table for writing, creating the file if needed
+
+        An existing table of the same layout and capacity is reused, so a
+        restarted writer keeps the slots readers already know. Otherwise a
+        new file is swapped in with a rename and readers pick it up on their
+        next reopen check. Writers hold an exclusive lock on ``<path>.lock``
+        until they exit.
+
+        Raises:
+            RuntimeError: If another process is already writing the table
+        """
+        lock_fd = os.open(f'{path}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(lock_fd)
+            raise RuntimeError(f'Another process is already writing {path}')
+
+        try:
+            fd = os.open(path, os.O_RDWR)
+            try:
+                table = cls(path, fd, writable=True)
+            finally:
+                os.close(fd)
+            if table.capacity == capacity:
+                table._lock_fd = lock_fd
+                return table
+        except (FileNotFoundError, ValueError):
+            pass
+
+        header = np.zeros(1, dtype=HEADER)
+        header['magic'] = TABLE_MAGIC
+        header['version'] = TABLE_VERSION
+        header['capacity'] = capacity
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, HEADER_SIZE + capacity * RECORD.itemsize)
+            os.pwrite(fd, header.tobytes(), 0)
+            os.replace(tmp_path, path)
+            table = cls(path, fd, writable=True)
+        finally:
+            os.close(fd)
+        table._lock_fd = lock_fd
+        return table
+
+    @property
+    def count(self):
+        return int(self.header['count'][0])
+
+    @property
+    def synced_at(self):
+        return float(self.header['synced_at'][0])
+
+    def write(self, rows, complete=False):
+        """
+        Update the records of a batch of distinct drivers
+
+        Only records that differ from the table are rewritten, so readers
+        rarely have to retry. Drivers beyond capacity are dropped.
+
+        Args:
+            rows (ndarray): RECORD array, one row per driver; seq is ignored
+            complete (bool): rows cover every driver, so anyone else in the
+                table is marked unavailable
+
+        Returns:
+            int: Records written
+        """
+        if not self.writable:
+            raise RuntimeError('Driver table was opened read-only')
+
+        rows = np.ascontiguousarray(rows, dtype=RECORD)
+        if complete:
+            listed = set(rows['driver_id'].tolist())
+            gone = [slot for driver_id, slot in self._slots.items() if driver_id not in listed]
+            if gone:
+                departed = self.records[gone].copy()
+                departed['available'] = 0
+                rows = np.concatenate([rows, departed])
+
+        slots = np.empty(len(rows), dtype=np.int64)
+        count = self.count
+        for i, driver_id in enumerate(rows['driver_id'].tolist()):
+            slot = self._slots.get(driver_id)
+            if slot is None:
+                if count >= self.capacity:
+                    slot = -1
+                else:
+                    slot = self._slots[driver_id] = count
+                    count += 1
+            slots[i] = slot
+        if (slots < 0).any():
+            logger.warning("Driver table is full; %d drivers left out", (slots < 0).sum())
+            rows, slots = rows[slots >= 0], slots[slots >= 0]
+
+        current = self.records[slots]
+        changed = np.zeros(len(rows), dtype=bool)
+        for name in DATA_FIELDS:
+            differs = current[name] != rows[name]
+            if name == 'heading':
+                # NaN, for no heading, compares unequal to itself
+                differs &= ~(np.isnan(current[name]) & np.isnan(rows[name]))
+            changed |= differs
+        rows, slots = rows[changed], slots[changed]
+
+        seq = self.records['seq']
+        seq[slots] += 1
+        for name in DATA_FIELDS:
+            self.records[name][slots] = rows[name]
+        seq[slots] += 1
+
+        # New slots become visible to readers only once they are complete
+        self.header['count'] = count
+        self.header['synced_at'] = time.time()
+        return len(slots)
+
+    def snapshot(self):
+        """
+        Copy every record, leaving out slots still mid-write after READ_RETRIES re-reads
+
+        Returns:
+            ndarray: RECORD array
+        """
+        records = self.records[:self.count]
+        before = records['seq'].copy()
+        rows = records.copy()
+        after = records['seq'].copy()
+        torn = (before != after) | (before % 2 == 1)
+
+        for _ in range(READ_RETRIES):
+            if not torn.any():
+                break
+            index = np.flatnonzero(torn)
+            before = records['seq'][index]
+            rows[index] = records[index]
+            after = records['seq'][index]
+            torn[index] = (before != after) | (before % 2 == 1)
+        return rows[~torn]
+
+    def position(self, driver_id):
+        """
+        Get one driver's record
+
+        Returns:
+            np.void | None: The record, or None if the driver isn't in the table
+        """
+        slots = np.flatnonzero(self.records['driver_id'][:self.count] == driver_id)
+        if not len(slots):
+            return None
+        slot = slots[0]
+        for _ in range(READ_RETRIES + 1):
+            before = self.records['seq'][slot]
+            row = self.records[slot].copy()
+            if before % 2 == 0 and before == self.records['seq'][slot]:
+                return row
+        return None
+
+    def free_drivers(self, max_age=LOCATION_MAX_AGE_SECONDS):
+        """
+        Records of available drivers whose position is under max_age seconds old
+
+        Returns:
+            ndarray: RECORD array
+        """
+        rows = self.snapshot()
+        return rows[(rows['available'] == 1) & (rows['timestamp'] >= time.time() - max_age)]
+
+    def nearby(self, latitude, longitude, radius_km, limit=None, max_age=LOCATION_MAX_AGE_SECONDS):
+        """
+        Free drivers with a recent position within radius_km of a point, closest first
+
+        Returns:
+            tuple: RECORD array of the drivers and an array of their distances in kilometers
+        """
+        rows = self.free_drivers(max_age)
+        points = np.column_stack([rows['latitude'], rows['longitude']])
+        distances = distance_matrix(np.array([[latitude, longitude]]), points)[0]
+
+        within = distances <= radius_km
+        rows, distances = rows[within], distances[within]
+        order = np.argsort(distances, kind='stable')[:limit]
+        return rows[order], distances[order]
+
+
+_reader = None
+_reader_checked = None
+_reader_lock = threading.Lock()
+
+
+def get_driver_table():
+    """
+    The host's driver table, mapped read-only once per process
+
+    Returns:
+        DriverTable | None: The table, or None if no writer has created it or
+        the writer has stopped syncing it
+    """
+    global _reader, _reader_checked
+    now = time.monotonic()
+    if _reader_checked is None or now - _reader_checked >= REOPEN_CHECK_SECONDS:
+        with _reader_lock:
+            if _reader_checked is None or now - _reader_checked >= REOPEN_CHECK_SECONDS:
+                _reader = _reopen(_reader)
+                _reader_checked = now
+
+    table = _reader
+    if table is None or time.time() - table.synced_at > TABLE_STALE_SECONDS:
+        return None
+    return table
+
+
+def _reopen(current):
+    path = settings.DRIVER_TABLE_PATH
+    try:
+        inode = os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+    if current is not None and current.inode == inode:
+        return current
+    try:
+        return DriverTable.open(path)
+    except (OSError, ValueError):
+        logger.warning("Can't map driver table %s", path, exc_info=True)
+        return None
+
+
+def driver_position(driver_id):
+    """
+    Get a driver's recent position, from the table when it is live and from
+    the database otherwise
+
+    Returns:
+        tuple | None: (latitude, longitude), or None if the driver hasn't
+        reported a position in the last LOCATION_MAX_AGE_SECONDS
+    """
+    cutoff = timezone.now() - timedelta(seconds=LOCATION_MAX_AGE_SECONDS)
+    table = get_driver_table()
+    if table is not None:
+        row = table.position(driver_id)
+        if row is None or row['timestamp'] < cutoff.timestamp():
+            return None
+        return float(row['latitude']), float(row['longitude'])
+
+    profile = (DriverProfile.objects
+               .filter(user_id=driver_id, location_updated_at__gte=cutoff)
+               .values_list('latitude', 'longitude')
+               .first())
+    if profile is None:
+        return None
+    return float(profile[0]), float(profile[1])
+
+
+def available_drivers():
+    """
+    Get free drivers with a recent position, from the table when it is live
+    and from the database otherwise
+
+    Returns:
+        tuple: (N,) driver ids and (N, 2) array of [lat, lng] positions
+    """
+    table = get_driver_table()
+    if table is not None:
+        rows = table.free_drivers()
+        return rows['driver_id'], np.column_stack([rows['latitude'], rows['longitude']])
+
+    active = Ride.objects.filter(driver=OuterRef('user'), status__in=['accepted', 'in_progress'])
+    drivers = list(DriverProfile.objects
+                   .filter(is_available=True,
+                           location_updated_at__gte=timezone.now() - timedelta(seconds=LOCATION_MAX_AGE_SECONDS))
+                   .filter(~Exists(active))
+                   .values_list('user_id', 'latitude', 'longitude'))
+    driver_ids = np.array([user_id for user_id, _, _ in drivers], dtype=np.int64)
+    points = np.array([(float(lat), float(lng)) for _, lat, lng in drivers]).reshape(-1, 2)
+    return driver_ids, points
+
+
+def pickup_estimate(latitude, longitude):
+    """
+    Count free drivers near a pickup point and estimate how soon the nearest could arrive
+
+    Returns:
+        dict | None: drivers_nearby and pickup_eta_minutes (None when nobody
+        is within ETA_SEARCH_RADIUS_KM), or None if the table isn't live
+    """
+    table = get_driver_table()
+    if table is None:
+        return None
+    _, distances = table.nearby(latitude, longitude, ETA_SEARCH_RADIUS_KM)
+    eta = None
+    if len(distances):
+        eta = max(1, math.ceil(distances[0] / PICKUP_SPEED_KMH * 60))
+    return {'drivers_nearby': len(distances), 'pickup_eta_minutes': eta}
+
+
+def sync_driver_table(table):
+    """
+    Copy every located driver's position and availability from the database
+
+    A driver is available when they are online and not on an accepted or
+    in-progress ride. Drivers who no longer have a position are marked
+    unavailable.
+
+    Returns:
+        int: Records that changed
+    """
+    active = Ride.objects.filter(driver=OuterRef('user'), status__in=['accepted', 'in_progress'])
+    drivers = (DriverProfile.objects
+               .filter(location_updated_at__isnull=False)
+               .annotate(on_ride=Exists(active))
+               .values_list('user_id', 'latitude', 'longitude', 'heading', 'location_updated_at',
+                            'is_available', 'on_ride'))
+    rows = np.array([
+        (0, is_available and not on_ride, user_id, latitude, longitude,
+         math.nan if heading is None else heading, updated_at.timestamp())
+        for user_id, latitude, longitude, heading, updated_at, is_available, on_ride in drivers
+    ], dtype=RECORD)
+    return table.write(rows, complete=True)
@@ -0,0 +1,235 @@
+"""
+Fan-out of ride events to streaming clients
+Events are carried between processes on a Postgres LISTEN/NOTIFY channel, so
+a feed sees changes made by any web worker or by the dispatch, reaper and
+scheduler workers; each process then fans them out to its own feeds. Without
+Postgres (SQLite in development) events only reach the publishing process.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import select
+import threading
+import time
+from functools import cached_property
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before it is asked to resync
+SUBSCRIBER_QUEUE_SIZE = 100
+
+RIDE_EVENTS_CHANNEL = 'ride_events'
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more; larger events are sent as a resync
+MAX_NOTIFY_BYTES = 7999
+
+# Seconds before the listener reconnects after losing its connection, doubling up to the maximum
+LISTEN_RETRY_SECONDS = 1
+LISTEN_RETRY_MAX_SECONDS = 30
+
+RESYNC = {'event': 'resync', 'data': '{}'}
+
+
+class PostgresNotifyTransport:
+    """
+    Carries ride events between processes on a Postgres NOTIFY channel
+
+    Sending is one NOTIFY on the caller's database connection. Each process
+    that serves feeds listens on a dedicated connection of its own, opened by
+    a background thread when the first feed subscribes, and hands what it
+    receives to `deliver`.
+    """
+
+    def __init__(self, deliver, alias=DEFAULT_DB_ALIAS, channel=RIDE_EVENTS_CHANNEL):
+        self.deliver = deliver
+        self.alias = alias
+        self.channel = channel
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        """Notify every listening process of an event; inside a transaction Postgres sends it on commit"""
+        payload = json.dumps(message)
+        if len(payload.encode()) > MAX_NOTIFY_BYTES:
+            payload = json.dumps(RESYNC)
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+    def start(self):
+        """Start listening in this process, if it isn't already"""
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self.listen, name='ride-events', daemon=True)
+                self._listener.start()
+
+    def listen(self):
+        """Deliver notifications for the life of the process, reconnecting when the connection drops"""
+        delay = LISTEN_RETRY_SECONDS
+        reconnecting = False
+        while True:
+            try:
+                connection = self.connect()
+            except Exception as e:
+                logger.warning(f"Ride events listener couldn't connect, retrying in {delay}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, LISTEN_RETRY_MAX_SECONDS)
+                continue
+
+            delay = LISTEN_RETRY_SECONDS
+            if reconnecting:
+                # Events sent while disconnected are lost; feeds reload their lists instead
+                self.deliver(RESYNC)
+            try:
+                for payload in self.notifications(connection):
+                    self.deliver(json.loads(payload))
+            except Exception as e:
+                logger.warning(f"Ride events listener lost its connection: {e}")
+            finally:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            reconnecting = True
+
+    def connect(self):
+        """Open an autocommit connection of its own, outside Django's (and any pool), and LISTEN on it"""
+        wrapper = connections[self.alias]
+        connection = wrapper.Database.connect(**wrapper.get_connection_params())
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.channel}')
+        return connection
+
+    @staticmethod
+    def notifications(connection):
+        """Yield notification payloads as they arrive, until the connection fails"""
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+        if is_psycopg3:
+            for notify in connection.notifies():
+                yield notify.payload
+            return
+        while True:
+            select.select([connection], [], [])
+            connection.poll()
+            while connection.notifies:
+                yield connection.notifies.pop(0).payload
+
+
+class RideEventBroker:
+    """
+    Fans ride events out to every connected feed in this process.
+
+    Events are published from synchronous code (model signals running in a
+    worker thread) and delivered to subscribers on their own event loop, so
+    each event is encoded once no matter how many drivers are connected.
+
+    A shared broker sends events through PostgresNotifyTransport when the
+    database is Postgres, and every process fans out what it receives; a
+    local one, or one on another database, only reaches this process.
+    """
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE, shared=False):
+        self.queue_size = queue_size
+        self.shared = shared
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+
+    @cached_property
+    def transport(self):
+        if self.shared and connections[DEFAULT_DB_ALIAS].vendor == 'postgresql':
+            return PostgresNotifyTransport(self.dispatch)
+        return None
+
+    def subscribe(self):
+        """Register a feed on the running event loop and return its queue"""
+        if self.transport:
+            self.transport.start()
+        subscription = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.queue_size))
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    @property
+    def has_audience(self):
+        """Whether a published event can reach a feed: any process's with a transport, else this one's"""
+        return self.transport is not None or bool(self._subscribers)
+
+    def publish(self, event_type, data, to=None, exclude=None):
+        """
+        Publish an event to all subscribers, in every process when shared
+
+        Feeds pass an event on only to the users it is addressed to; it is
+        encoded once either way.
+
+        Args:
+            event_type (str): Event name, e.g. 'ride_created'
+            data (dict): JSON-serialisable payload
+            to (list): User ids to deliver to, None for everyone
+            exclude (list): User ids not to deliver to
+        """
+        message = {'event': event_type, 'data': json.dumps(data, default=str)}
+        if to is not None:
+            message['to'] = list(to)
+        if exclude:
+            message['exclude'] = list(exclude)
+        if self.transport:
+            self.transport.send(message)
+        else:
+            self.dispatch(message)
+
+    def dispatch(self, message):
+        """
+        Hand an event to this process's subscribers, numbered in the order they receive it
+
+        Returns:
+            dict: The event, with its id
+        """
+        event = {'id': next(self._sequence), **message}
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                # The subscriber's loop has been closed
+                self.unsubscribe((loop, queue))
+        return event
+
+    @staticmethod
+    def _deliver(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: drop its backlog and tell it to reload
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({'id': event['id'], **RESYNC})
+
+
+def addressed_to(event, user_id):
+    """Whether an event is for a user, per the `to` and `exclude` it was published with"""
+    if user_id in event.get('exclude', ()):
+        return False
+    return 'to' not in event or user_id in event['to']
+
+
+def format_sse(event):
+    """Encode an event for a text/event-stream response"""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {event['data']}\n\n"
+
+
+# Global broker instance, shared between processes
+ride_events = RideEventBroker(shared=True)
@@ -0,0 +1,133 @@
+"""
+Geospatial helpers for ride matching
+"""
+import math
+
+EARTH_RADIUS_KM = 6371
+
+# Geohash base32 alphabet (no a, i, l, o)
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Precision stored on Ride.pickup_geohash (~5m x 5m cells)
+GEOHASH_PRECISION = 9
+
+KM_PER_DEGREE = 111.32
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Calculate the great-circle distance between two coordinates
+
+    Args:
+        lat1, lon1 (float): First point in degrees
+        lat2, lon2 (float): Second point in degrees
+
+    Returns:
+        float: Distance in kilometers
+    """
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlon = math.radians(lon2 - lon1)
+
+    a = (math.sin(dlat / 2) ** 2 +
+         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """
+    Encode a coordinate as a geohash string
+
+    Args:
+        latitude (float): Latitude in degrees
+        longitude (float): Longitude in degrees
+        precision (int): Number of characters in the hash
+
+    Returns:
+        str: Geohash of the cell containing the coordinate
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(geohash)
+
+
+def geohash_cell_size(precision):
+    """
+    Get the size of a geohash cell in degrees
+
+    Returns:
+        tuple: (lat_degrees, lng_degrees)
+    """
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def precision_for_radius(radius_km, latitude=0.0):
+    """
+    Pick the finest geohash precision whose cells are at least radius_km wide,
+    so a 3x3 block of cells around a point covers the whole search circle.
+    """
+    lng_scale = max(math.cos(math.radians(latitude)), 0.01)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_deg, lng_deg = geohash_cell_size(precision)
+        if (lat_deg * KM_PER_DEGREE >= radius_km and
+                lng_deg * KM_PER_DEGREE * lng_scale >= radius_km):
+            return precision
+    return 1
+
+
+def covering_geohashes(latitude, longitude, radius_km):
+    """
+    Get the geohash prefixes covering a circle around a coordinate
+
+    Args:
+        latitude (float): Centre latitude in degrees
+        longitude (float): Centre longitude in degrees
+        radius_km (float): Search radius in kilometers
+
+    Returns:
+        set: Geohash prefixes (the centre cell and its neighbours)
+    """
+    precision = precision_for_radius(radius_km, latitude)
+    lat_deg, lng_deg = geohash_cell_size(precision)
+
+    cells = set()
+    for dlat in (-lat_deg, 0, lat_deg):
+        for dlng in (-lng_deg, 0, lng_deg):
+            lat = max(min(latitude + dlat, 90.0), -90.0)
+            lng = ((longitude + dlng + 180.0) % 360.0) - 180.0
+            cells.add(geohash_encode(lat, lng, precision))
+    return cells
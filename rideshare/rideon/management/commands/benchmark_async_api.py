@@ -0,0 +1,108 @@
+import asyncio
+import random
+from importlib.util import find_spec
+import aiohttp
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.loadgen import drive, gunicorn, percentile
+from rideon.models import Rating
+from rideon.seed import seed_messages, seed_ratings, seed_rides, seed_users
+from rideon.signals import rating_values, update_rating_summary
+
+User = get_user_model()
+
+SEED_PREFIX = 'asyncbench'
+
+
+class Command(BaseCommand):
+    help = 'Compare how many concurrent clients the read endpoints serve under WSGI gthread and ASGI uvicorn workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per gthread worker')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 64, 256],
+                            help='Concurrent clients to try, one request in flight each')
+        parser.add_argument('--seconds', type=float, default=10, help='Load duration per concurrency level')
+        parser.add_argument('--feeds', type=int, default=100, help='Ride feed streams held open during the load')
+        parser.add_argument('--target-ms', type=float, default=500, help='p99 latency a server must keep to count a level')
+        parser.add_argument('--port', type=int, default=8766)
+
+    def handle(self, *args, **options):
+        if find_spec('gunicorn') is None:
+            raise CommandError('gunicorn is not installed (pip install -r requirements.txt)')
+        self.stdout.write(f"🔀 rides, available, messages and ratings reads from {options['concurrency']} clients, "
+                          f"{options['seconds']:g}s each, with {options['feeds']} ride feeds open")
+        self.stdout.write("=" * 50)
+
+        rng = random.Random(0)
+        riders = seed_users(50, prefix=f'{SEED_PREFIX}rider')
+        driver = seed_users(1, user_type='DRIVER', prefix=f'{SEED_PREFIX}driver')[0]
+        try:
+            seed_rides(riders, 300, rng=rng)
+            accepted = seed_rides(riders[:1], 1, status='accepted', drivers=[driver], rng=rng)[0]
+            seed_messages(accepted, 50)
+            # seed_ratings skips the signals that keep rating summaries
+            for rating in seed_ratings(driver, riders[1:], rng=rng):
+                update_rating_summary(driver.id, added=rating_values(rating))
+
+            paths = ['/api/?role=driver', '/api/available/', f'/api/{accepted.id}/messages/',
+                     f'/api/users/{driver.id}/ratings/', '/api/my-ratings/?details=true']
+            token = str(RefreshToken.for_user(driver).access_token)
+            servers = {
+                'wsgi': ('WSGI gthread', 'rideshare.wsgi', ['--worker-class', 'gthread', '--threads', str(options['threads'])],
+                         {'ASYNC_API': 'False'}),
+                'asgi': ('ASGI uvicorn', 'rideshare.asgi', ['--worker-class', 'uvicorn_worker.UvicornWorker'],
+                         {'ASYNC_API': 'True'}),
+            }
+            for name in options['servers']:
+                label, app, worker_options, env = servers[name]
+                if name == 'asgi' and find_spec('uvicorn_worker') is None:
+                    self.stdout.write(f"{label}: skipped, uvicorn-worker is not installed (pip install -r requirements.txt)")
+                    continue
+                with gunicorn(app, options['port'], '--workers', str(options['workers']), *worker_options,
+                              env=env) as base_url:
+                    self.stdout.write(f"\n{label}, {options['workers']} workers:")
+                    asyncio.run(self.run_server(base_url, paths, token, options))
+        finally:
+            Rating.objects.filter(rated_user=driver).delete()
+            User.objects.filter(email__startswith=SEED_PREFIX).delete()
+
+    async def run_server(self, base_url, paths, token, options):
+        headers = {'Authorization': f'Bearer {token}'}
+        urls = [base_url + path for path in paths]
+        # Warm up: load the app and fill the caches in every worker
+        await drive(urls, headers, options['workers'] * 4, 1)
+
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0), headers=headers,
+                                         timeout=aiohttp.ClientTimeout(sock_connect=10)) as feeds:
+            statuses = await asyncio.gather(*(self.open_feed(feeds, base_url + '/api/feed/')
+                                              for _ in range(options['feeds'])))
+            held = statuses.count(200)
+            refused = ', '.join(f'{statuses.count(code)} x {code}' for code in sorted(set(statuses) - {200}, key=str))
+            self.stdout.write(f"  ride feeds held open: {held} of {options['feeds']}" + (f" ({refused})" if refused else ''))
+
+            capacity = 0
+            for concurrency in options['concurrency']:
+                latencies, errors, elapsed = await drive(urls, headers, concurrency, options['seconds'])
+                p99 = percentile(latencies, 99)
+                self.stdout.write(f"  {concurrency:5} clients: {len(latencies) / elapsed:7,.0f} req/s, "
+                                  f"p50 {percentile(latencies, 50):7.1f}ms, p99 {p99:7.1f}ms, "
+                                  f"{sum(errors.values()):,} errors" +
+                                  (f" ({', '.join(f'{n:,} {kind}' for kind, n in errors.most_common())})" if errors else ''))
+                if not errors and latencies and p99 <= options['target_ms']:
+                    capacity = concurrency
+            within = f"{capacity}" if capacity else f"under {min(options['concurrency'])}"
+            self.stdout.write(f"  capacity: {within} concurrent clients within p99 {options['target_ms']:g}ms")
+
+    @staticmethod
+    async def open_feed(session, url):
+        """Open a ride feed stream and leave it open until the session closes, returning its status"""
+        try:
+            response = await session.get(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            return type(exc).__name__
+        if response.status != 200:
+            response.release()
+        return response.status
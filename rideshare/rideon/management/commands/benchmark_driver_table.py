@@ -0,0 +1,155 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.test import Client, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.models import DriverProfile
+from rideon import driver_table
+from rideon.driver_table import RECORD, DriverTable, ETA_SEARCH_RADIUS_KM, LOCATION_MAX_AGE_SECONDS, sync_driver_table
+from rideon.geo import covering_geohashes, haversine
+from rideon.models import Ride
+from rideon.seed import seed_users, seed_driver_profiles, random_point
+from .benchmark_location_ingest import StatementCounter
+
+User = get_user_model()
+
+
+def nearby_from_database(latitude, longitude, radius_km):
+    """The proximity lookup the table replaces: geohash-narrowed query, then exact distances"""
+    cells = Q()
+    for cell in covering_geohashes(latitude, longitude, radius_km):
+        cells |= Q(location_geohash__startswith=cell)
+    active = Ride.objects.filter(driver=OuterRef('user'), status__in=['accepted', 'in_progress'])
+    drivers = (DriverProfile.objects
+               .filter(cells, is_available=True,
+                       location_updated_at__gte=timezone.now() - timedelta(seconds=LOCATION_MAX_AGE_SECONDS))
+               .filter(~Exists(active))
+               .values_list('user_id', 'latitude', 'longitude'))
+    found = [(haversine(latitude, longitude, float(lat), float(lng)), user_id) for user_id, lat, lng in drivers]
+    return sorted(distance for distance, _ in found if distance <= radius_km)
+
+
+def read_until(path, deadline, results):
+    """Reader process: snapshot the table until the deadline, counting torn records"""
+    table = DriverTable.open(path)
+    reads = torn = 0
+    while time.time() < deadline:
+        rows = table.snapshot()
+        # The writer keeps longitude = latitude + 0.5 and timestamp = latitude in every record
+        torn += int(((rows['longitude'] != rows['latitude'] + 0.5) | (rows['timestamp'] != rows['latitude'])).sum())
+        reads += 1
+    results.put((reads, torn))
+
+
+class Command(BaseCommand):
+    help = 'Compare driver proximity lookups from the shared-memory table with database queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', type=int, default=2000)
+        parser.add_argument('--lookups', type=int, default=500)
+        parser.add_argument('--readers', type=int, default=4, help='Reader processes in the torn-read check')
+        parser.add_argument('--seconds', type=float, default=3, help='Duration of the torn-read check')
+
+    def handle(self, *args, **options):
+        rng = random.Random(11)
+        lookups = options['lookups']
+        points = [tuple(map(float, random_point(rng))) for _ in range(lookups)]
+
+        self.stdout.write(f"🗺️  {options['drivers']} drivers, {lookups} proximity lookups")
+        self.stdout.write("=" * 50)
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(DRIVER_TABLE_PATH=os.path.join(directory, 'drivers')):
+            path = os.path.join(directory, 'drivers')
+            table = DriverTable.create(path, options['drivers'] * 2)
+            driver_table._reader_checked = None
+
+            drivers = seed_users(options['drivers'], user_type='DRIVER', prefix='tabledriver')
+            try:
+                seed_driver_profiles(drivers, located=True, rng=rng)
+
+                started = time.perf_counter()
+                sync_driver_table(table)
+                sync = time.perf_counter() - started
+
+                db_statements = StatementCounter()
+                started = time.perf_counter()
+                with connection.execute_wrapper(db_statements):
+                    expected = [nearby_from_database(lat, lng, ETA_SEARCH_RADIUS_KM) for lat, lng in points]
+                database = time.perf_counter() - started
+
+                reader = DriverTable.open(path)
+                table_statements = StatementCounter()
+                started = time.perf_counter()
+                with connection.execute_wrapper(table_statements):
+                    found = [reader.nearby(lat, lng, ETA_SEARCH_RADIUS_KM)[1] for lat, lng in points]
+                shared = time.perf_counter() - started
+
+                mismatches = sum(len(e) != len(f) or not np.allclose(e, f, atol=1e-6)
+                                 for e, f in zip(expected, found))
+
+                # Full request path: a fare estimate with the pickup ETA
+                client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(drivers[0]).access_token}')
+                client.get('/api/fare-info/', {'lat': points[0][0], 'lng': points[0][1]})
+                api_statements = StatementCounter()
+                with connection.execute_wrapper(api_statements):
+                    response = client.get('/api/fare-info/', {'lat': points[0][0], 'lng': points[0][1]})
+                if 'pickup_eta_minutes' not in response.json():
+                    raise CommandError(f"fare-info returned no pickup ETA: {response.json()}")
+            finally:
+                User.objects.filter(id__in=[driver.id for driver in drivers]).delete()
+
+            reads, torn, writes = self.check_torn_reads(path, table, options['readers'], options['seconds'])
+
+        self.stdout.write(f"Sync from database:   {table.count} drivers in {sync * 1000:.0f}ms")
+        self.stdout.write(f"Database lookup:      {lookups / database:,.0f} lookups/s "
+                          f"({db_statements.count} statements)")
+        self.stdout.write(f"Shared table lookup:  {lookups / shared:,.0f} lookups/s "
+                          f"({table_statements.count} statements)")
+        self.stdout.write(f"Fare info with ETA:   {api_statements.count} statements")
+        self.stdout.write(f"Concurrent reads:     {reads / options['seconds']:,.0f} snapshots/s across "
+                          f"{options['readers']} processes during {writes:,} full-table writes")
+
+        if mismatches:
+            raise CommandError(f"{mismatches} of {lookups} lookups differ from the database")
+        if torn:
+            raise CommandError(f"{torn} torn records seen by readers")
+        self.stdout.write(self.style.SUCCESS("✅ Lookups match the database and no reader saw a torn record"))
+
+    def check_torn_reads(self, path, table, readers, seconds):
+        """Rewrite every record continuously while reader processes snapshot the table"""
+        rows = np.zeros(table.count, dtype=RECORD)
+        rows['driver_id'] = table.records['driver_id'][:table.count]
+        rows['available'] = 1
+        rows['longitude'] = 0.5
+        table.write(rows)
+
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        deadline = time.time() + seconds
+        processes = [context.Process(target=read_until, args=(path, deadline, results)) for _ in range(readers)]
+        for process in processes:
+            process.start()
+
+        writes = 0
+        while time.time() < deadline:
+            value = float(writes % 80)
+            rows['latitude'] = value
+            rows['longitude'] = value + 0.5
+            rows['timestamp'] = value
+            table.write(rows)
+            writes += 1
+
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        return sum(r for r, _ in totals), sum(t for _, t in totals), writes
@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from rideon.models import Ride
+from rideon.reaper import REAPER_BATCH_SIZE, cancel_batch, stale_rides
+from rideon.seed import seed_users, seed_rides, random_point
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure available/ with an unreaped pending pool, then reap it in batches and measure again'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale', type=int, default=50000, help='Abandoned pending rides')
+        parser.add_argument('--fresh', type=int, default=500, help='Pending rides within their TTL')
+        parser.add_argument('--batch-size', type=int, default=REAPER_BATCH_SIZE)
+        parser.add_argument('--samples', type=int, default=20, help='available/ requests to time')
+
+    def handle(self, *args, **options):
+        rng = random.Random(3)
+        self.stdout.write(f"🧹 {options['stale']:,} abandoned and {options['fresh']:,} live pending rides")
+        self.stdout.write("=" * 50)
+
+        riders = seed_users(50, prefix='reaprider')
+        driver = seed_users(1, user_type='DRIVER', prefix='reapdriver')[0]
+        try:
+            stale = seed_rides(riders, options['stale'], rng=rng)
+            fresh = seed_rides(riders, options['fresh'], rng=rng)
+            # Half the abandoned rides are immediate requests from hours ago, half scheduled rides never picked up
+            now = timezone.now()
+            ids = [ride.id for ride in stale]
+            Ride.objects.filter(id__in=ids[::2]).update(created_at=now - timedelta(hours=6))
+            Ride.objects.filter(id__in=ids[1::2]).update(
+                created_at=now - timedelta(days=2), is_scheduled=True,
+                scheduled_pickup_time=now - timedelta(hours=3), released_at=now - timedelta(hours=3, minutes=15))
+
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(driver).access_token}')
+            points = [random_point(rng) for _ in range(options['samples'])]
+            before = self.time_available(client, points)
+
+            batch_times, counts = [], {}
+            started = time.perf_counter()
+            for reason, rides in stale_rides(timezone.now()).items():
+                counts[reason] = 0
+                while True:
+                    batch_started = time.perf_counter()
+                    cancelled = cancel_batch(rides, options['batch_size'])
+                    batch_times.append(time.perf_counter() - batch_started)
+                    counts[reason] += cancelled
+                    if cancelled < options['batch_size']:
+                        break
+            reaped = time.perf_counter() - started
+
+            after = self.time_available(client, points)
+            left = Ride.objects.filter(id__in=[ride.id for ride in fresh], status='pending').count()
+            remaining = Ride.objects.filter(id__in=ids, status='pending').count()
+        finally:
+            User.objects.filter(id__in=[user.id for user in riders] + [driver.id]).delete()
+
+        self.stdout.write(f"available/ nearby, unreaped: p50 {before:.1f}ms")
+        self.stdout.write(f"Reaped {counts['expired']:,} expired and {counts['overdue']:,} overdue rides in "
+                          f"{reaped:.2f}s, {len(batch_times)} batches (p50 {statistics.median(batch_times) * 1000:.1f}ms, "
+                          f"max {max(batch_times) * 1000:.1f}ms per transaction)")
+        self.stdout.write(f"available/ nearby, reaped:   p50 {after:.1f}ms")
+
+        if remaining or left != options['fresh']:
+            raise CommandError(f"{remaining} abandoned rides left pending, {options['fresh'] - left} live rides cancelled")
+        self.stdout.write(self.style.SUCCESS("✅ Every abandoned ride was cancelled and every live ride kept"))
+
+    def time_available(self, client, points):
+        timings = []
+        for lat, lng in points:
+            started = time.perf_counter()
+            response = client.get('/api/available/', {'lat': lat, 'lng': lng, 'radius': 3})
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(f"available/ returned {response.status_code}")
+        return statistics.median(timings) * 1000
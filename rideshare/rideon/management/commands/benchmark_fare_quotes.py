@@ -0,0 +1,56 @@
+import random
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from rideon.pricing import quote_matrix, surge_multiplier, KOBO_PER_NAIRA
+from rideon.seed import random_point
+from rideon.serializers import RideCreateSerializer
+from rideon.utils import calculate_fare
+
+
+class Command(BaseCommand):
+    help = 'Compare bulk fare quotes against the per-pair distance and fare path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--origins', type=int, default=100)
+        parser.add_argument('--destinations', type=int, default=100)
+
+    def handle(self, *args, **options):
+        rng = random.Random(7)
+        # Floats, as the quote endpoint receives them from JSON
+        origins = [[float(c) for c in random_point(rng)] for _ in range(options['origins'])]
+        destinations = [[float(c) for c in random_point(rng)] for _ in range(options['destinations'])]
+        pairs = len(origins) * len(destinations)
+
+        self.stdout.write(f"💰 Quoting {len(origins)} x {len(destinations)} = {pairs} pairs")
+        self.stdout.write("=" * 50)
+
+        started = time.perf_counter()
+        per_pair = []
+        for o in origins:
+            multiplier = surge_multiplier(o[0], o[1])
+            per_pair.append([
+                calculate_fare(RideCreateSerializer.calculate_distance(o[0], o[1], d[0], d[1]), multiplier)
+                for d in destinations
+            ])
+        per_pair_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, fares, _ = quote_matrix(origins, destinations)
+        bulk_seconds = time.perf_counter() - started
+
+        # Compare at the kobo, which is what Ride.fare stores
+        kobo = Decimal(1) / KOBO_PER_NAIRA
+        mismatches = sum(
+            int(expected.quantize(kobo) * KOBO_PER_NAIRA) != quoted
+            for expected_row, quoted_row in zip(per_pair, fares.tolist())
+            for expected, quoted in zip(expected_row, quoted_row)
+        )
+
+        self.stdout.write(f"Per pair:    {per_pair_seconds * 1000:.1f}ms ({pairs / per_pair_seconds:,.0f} pairs/s)")
+        self.stdout.write(f"Vectorised:  {bulk_seconds * 1000:.1f}ms ({pairs / bulk_seconds:,.0f} pairs/s)")
+        self.stdout.write(f"Speedup:     {per_pair_seconds / bulk_seconds:.0f}x")
+
+        if mismatches:
+            raise CommandError(f"{mismatches} of {pairs} fares differ from calculate_fare()")
+        self.stdout.write(self.style.SUCCESS("✅ Every fare matches calculate_fare() to the kobo"))
@@ -0,0 +1,97 @@
+import random
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.models import DriverProfile
+from rideon.geo import geohash_encode
+from rideon.locations import location_buffer
+from rideon.seed import seed_users, seed_driver_profiles, random_point
+
+User = get_user_model()
+
+
+class StatementCounter:
+    """execute_wrapper that counts the statements sent to the database"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Compare per-ping location UPDATEs with buffered, batched ingestion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', type=int, default=2000, help='Drivers reporting locations')
+        parser.add_argument('--pings', type=int, default=5000, help='Pings to ingest per method')
+        parser.add_argument('--requests', type=int, default=1000, help='Pings sent through the API')
+
+    def handle(self, *args, **options):
+        rng = random.Random(3)
+        pings = options['pings']
+
+        self.stdout.write(f"📍 {options['drivers']} drivers, {pings} pings")
+        self.stdout.write("=" * 50)
+
+        # The flush timer must not write concurrently with the measurements below
+        location_buffer.interval = 3600
+
+        # Committed so the flush sees them; removed at the end
+        drivers = seed_users(options['drivers'], user_type='DRIVER', prefix='gpsdriver')
+        try:
+            seed_driver_profiles(drivers)
+            stream = [(rng.choice(drivers).id, *map(float, random_point(rng))) for _ in range(pings)]
+
+            # Naive: one UPDATE per ping
+            started = time.perf_counter()
+            for driver_id, latitude, longitude in stream:
+                DriverProfile.objects.filter(user_id=driver_id).update(
+                    latitude=latitude, longitude=longitude,
+                    location_geohash=geohash_encode(latitude, longitude),
+                    location_updated_at=timezone.now(),
+                )
+            naive = time.perf_counter() - started
+
+            # Buffered: pings coalesce in memory, one flush writes them
+            started = time.perf_counter()
+            for driver_id, latitude, longitude in stream:
+                location_buffer.record(driver_id, latitude, longitude, timezone.now())
+            buffered_record = time.perf_counter() - started
+            coalesced = location_buffer.pending
+
+            flush_statements = StatementCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(flush_statements):
+                location_buffer.flush()
+            flush = time.perf_counter() - started
+
+            # Full request path for one worker: auth, parsing and buffering
+            driver = drivers[0]
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(driver).access_token}')
+            client.post('/api/location/', {'latitude': 6.5, 'longitude': 3.4}, content_type='application/json')
+            api_statements = StatementCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(api_statements):
+                for _ in range(options['requests']):
+                    latitude, longitude = map(float, random_point(rng))
+                    client.post('/api/location/', {'latitude': latitude, 'longitude': longitude},
+                                content_type='application/json')
+            api = time.perf_counter() - started
+            location_buffer.flush()
+        finally:
+            User.objects.filter(id__in=[driver.id for driver in drivers]).delete()
+
+        self.stdout.write(f"Per-ping UPDATE:      {pings / naive:,.0f} pings/s ({pings} statements)")
+        self.stdout.write(f"Buffered record:      {pings / buffered_record:,.0f} pings/s")
+        self.stdout.write(f"Flush:                {coalesced} drivers in {flush * 1000:.0f}ms "
+                          f"({flush_statements.count} statements)")
+        self.stdout.write(f"Buffered end to end:  {pings / (buffered_record + flush):,.0f} pings/s")
+        self.stdout.write(f"API, one worker:      {options['requests'] / api:,.0f} pings/s "
+                          f"({api_statements.count} statements for {options['requests']} requests)")
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+from rideon.events import RideEventBroker
+from rideon.seed import seed_users, seed_rides
+
+
+def percentiles(samples):
+    """Get p50/p99 of a list of durations in seconds, as milliseconds"""
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return value, value
+    cuts = statistics.quantiles(samples, n=100)
+    return cuts[49] * 1000, cuts[98] * 1000
+
+
+class Command(BaseCommand):
+    help = 'Compare the live ride feed against 30-second polling of available rides'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', type=int, default=500, help='Connected drivers')
+        parser.add_argument('--rides', type=int, default=500, help='Pending rides in the pool')
+        parser.add_argument('--events', type=int, default=100, help='Ride events published during the run')
+        parser.add_argument('--window', type=int, default=300, help='Simulated window in seconds')
+        parser.add_argument('--poll-interval', type=int, default=30, help='Polling interval in seconds')
+        parser.add_argument('--samples', type=int, default=30, help='available/ requests to time')
+
+    def handle(self, *args, **options):
+        drivers = options['drivers']
+        window = options['window']
+        interval = options['poll_interval']
+        events = options['events']
+
+        self.stdout.write(f"Benchmarking {drivers} drivers, {options['rides']} pending rides, "
+                          f"{events} events over {window}s")
+        self.stdout.write("=" * 60)
+
+        # Polling: time real available/ requests against a seeded pool, then roll it back
+        with transaction.atomic():
+            riders = seed_users(20, prefix='feedrider')
+            driver = seed_users(1, user_type='DRIVER', prefix='feeddriver')[0]
+            seed_rides(riders, options['rides'])
+
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(driver).access_token}')
+            request_times = []
+            response_bytes = 0
+            for _ in range(options['samples']):
+                started = time.perf_counter()
+                response = client.get('/api/available/')
+                request_times.append(time.perf_counter() - started)
+                response_bytes = len(response.content)
+            transaction.set_rollback(True)
+
+        poll_requests = drivers * (window // interval)
+        # A change becomes visible at the driver's next poll plus that request's latency
+        rng = random.Random(0)
+        poll_delays = [rng.uniform(0, interval) + rng.choice(request_times)
+                       for _ in range(events * min(drivers, 200))]
+        request_p50, request_p99 = percentiles(request_times)
+        poll_p50, poll_p99 = percentiles(poll_delays)
+
+        # Push: one broker fanning events out to every subscribed driver
+        push_delays = asyncio.run(self.run_feed(drivers, events))
+        push_p50, push_p99 = percentiles(push_delays)
+
+        self.stdout.write(f"\navailable/ request: p50 {request_p50:.1f}ms, p99 {request_p99:.1f}ms, "
+                          f"{response_bytes / 1024:.1f} KiB per response")
+        self.stdout.write("\nPolling every %ss:" % interval)
+        self.stdout.write(f"  Requests in window:   {poll_requests}")
+        self.stdout.write(f"  Bytes in window:      {poll_requests * response_bytes / 1024 / 1024:.1f} MiB")
+        self.stdout.write(f"  Event latency:        p50 {poll_p50:.1f}ms, p99 {poll_p99:.1f}ms")
+        self.stdout.write("\nLive feed:")
+        self.stdout.write(f"  Requests in window:   {drivers * 2} (initial load + one stream per driver)")
+        self.stdout.write(f"  Event deliveries:     {len(push_delays)}")
+        self.stdout.write(f"  Event latency:        p50 {push_p50:.2f}ms, p99 {push_p99:.2f}ms")
+
+    async def run_feed(self, drivers, events):
+        broker = RideEventBroker(queue_size=events + 1)
+        subscriptions = [broker.subscribe() for _ in range(drivers)]
+        delays = []
+
+        async def consume(queue):
+            for _ in range(events):
+                event = await queue.get()
+                delays.append(time.perf_counter() - json.loads(event['data'])['sent'])
+
+        def publish():
+            # Published from a worker thread, as the model signal would be
+            for i in range(events):
+                broker.publish('ride_created', {'id': i, 'sent': time.perf_counter()})
+                time.sleep(0.001)
+
+        consumers = [asyncio.create_task(consume(queue)) for _, queue in subscriptions]
+        await asyncio.get_running_loop().run_in_executor(None, publish)
+        await asyncio.gather(*consumers)
+        return delays
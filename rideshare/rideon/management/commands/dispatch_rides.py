@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from rideon.dispatch import DISPATCH_TICK_SECONDS, dispatch_once
+
+
+class Command(BaseCommand):
+    help = 'Match pending rides to the nearest free drivers in batches and offer each ride to its match'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=DISPATCH_TICK_SECONDS, help='Seconds between ticks')
+        parser.add_argument('--once', action='store_true', help='Dispatch once and exit')
+
+    def handle(self, *args, **options):
+        since = None
+        while True:
+            started = time.perf_counter()
+            close_old_connections()
+            # Taken before the tick, so consecutive ticks' windows overlap rather than leave a gap
+            tick_at = timezone.now()
+            stats = dispatch_once(since)
+            since = tick_at
+            elapsed = time.perf_counter() - started
+
+            if stats['rides'] or options['once']:
+                waves = ', '.join(f"wave {wave}: {count}" for wave, count in sorted(stats['offers'].items()))
+                self.stdout.write(f"🚕 {stats['rides']} rides, {stats['drivers']} free drivers, "
+                                  f"{sum(stats['offers'].values())} offers{f' ({waves})' if waves else ''} "
+                                  f"(solve {stats['solve_ms']:.0f}ms, tick {elapsed * 1000:.0f}ms)")
+
+            if options['once']:
+                return
+            time.sleep(max(0, options['interval'] - elapsed))
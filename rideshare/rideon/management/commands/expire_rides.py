@@ -0,0 +1,37 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from rideon.reaper import REAPER_BATCH_SIZE, REAPER_INTERVAL_SECONDS, sweep
+
+
+class Command(BaseCommand):
+    help = 'Cancel pending rides nobody accepted in time, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=REAPER_INTERVAL_SECONDS, help='Seconds between sweeps')
+        parser.add_argument('--batch-size', type=int, default=REAPER_BATCH_SIZE, help='Rides cancelled per transaction')
+        parser.add_argument('--ttl', type=int, default=settings.PENDING_RIDE_TTL_MINUTES,
+                            help='Minutes an immediate ride waits for a driver')
+        parser.add_argument('--grace', type=int, default=settings.SCHEDULED_RIDE_GRACE_MINUTES,
+                            help='Minutes past pickup a scheduled ride waits for a driver')
+        parser.add_argument('--once', action='store_true', help='Sweep once and exit')
+
+    def handle(self, *args, **options):
+        ttl = timedelta(minutes=options['ttl'])
+        grace = timedelta(minutes=options['grace'])
+        while True:
+            started = time.perf_counter()
+            close_old_connections()
+            counts = sweep(options['batch_size'], ttl, grace)
+            elapsed = time.perf_counter() - started
+
+            if counts['expired'] or counts['overdue'] or options['once']:
+                self.stdout.write(f"🧹 Cancelled {counts['expired']} expired and {counts['overdue']} overdue rides "
+                                  f"in {counts['batches']} batches ({elapsed * 1000:.0f}ms), "
+                                  f"{counts['pending']} still pending")
+
+            if options['once']:
+                return
+            time.sleep(max(0, options['interval'] - elapsed))
@@ -0,0 +1,100 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rideon.geo import covering_geohashes
+from rideon.models import RELEASED_RIDES, Ride, RideMessage, Rating
+from rideon.scheduler import SCHEDULER_HORIZON, upcoming_rides
+from rideon.seed import seed_users, seed_rides, seed_messages, seed_ratings
+
+RIDE_STATUS_MIX = {
+    'pending': 0.05,
+    'accepted': 0.02,
+    'in_progress': 0.01,
+    'completed': 0.80,
+    'cancelled': 0.12,
+}
+
+
+class Command(BaseCommand):
+    help = 'Seed a dataset and report query plans and timings for the hot rideon queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--riders', type=int, default=2000)
+        parser.add_argument('--drivers', type=int, default=500)
+        parser.add_argument('--rides', type=int, default=20000)
+        parser.add_argument('--messages', type=int, default=2000, help='Messages on the sampled ride')
+        parser.add_argument('--ratings', type=int, default=1000, help='Ratings for the sampled driver')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded data')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write("🌱 Seeding dataset...")
+            sample = self.seed(options)
+
+            if connection.vendor == 'postgresql':
+                # Refresh planner statistics so plans reflect the seeded data
+                with connection.cursor() as cursor:
+                    for model in (Ride, RideMessage, Rating):
+                        cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+            for name, queryset in self.hot_queries(sample).items():
+                self.report(name, queryset, options['repeat'])
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def seed(self, options):
+        rng = random.Random(42)
+        riders = seed_users(options['riders'], prefix='plan_rider')
+        drivers = seed_users(options['drivers'], user_type='DRIVER', prefix='plan_driver')
+
+        for ride_status, share in RIDE_STATUS_MIX.items():
+            seed_rides(riders, int(options['rides'] * share), status=ride_status, drivers=drivers, rng=rng)
+
+        driver = drivers[0]
+        ride = seed_rides(riders, 1, status='accepted', drivers=[driver], rng=rng)[0]
+        seed_messages(ride, options['messages'])
+        seed_ratings(driver, [rng.choice(riders) for _ in range(options['ratings'])], rng=rng)
+
+        return {'driver': driver, 'rider': ride.rider, 'ride': ride}
+
+    def hot_queries(self, sample):
+        driver, rider, ride = sample['driver'], sample['rider'], sample['ride']
+        pending = Ride.objects.filter(status='pending').filter(RELEASED_RIDES)
+
+        cells = Q()
+        for cell in covering_geohashes(6.55, 3.375, 10):
+            cells |= Q(pickup_geohash__startswith=cell)
+
+        return {
+            'available_rides': pending.exclude(rider=driver).order_by('-created_at'),
+            'available_rides_nearby': pending.exclude(rider=driver).filter(cells),
+            'scheduled_release': upcoming_rides(timezone.now() + SCHEDULER_HORIZON),
+            'ride_history': Ride.objects.filter(Q(rider=rider) | Q(driver=rider)).order_by('-created_at', '-id')[:21],
+            'driver_history': Ride.objects.filter(driver=driver).order_by('-created_at', '-id')[:21],
+            'ride_messages': RideMessage.objects.filter(ride=ride).order_by('-created_at'),
+            'user_ratings': Rating.objects.filter(rated_user=driver).order_by('-created_at'),
+        }
+
+    def report(self, name, queryset, repeat):
+        if connection.vendor == 'postgresql':
+            plan = queryset.explain(analyze=True, buffers=True)
+        else:
+            plan = queryset.explain()
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(f"\n=== {name} ===")
+        self.stdout.write(plan)
+        self.stdout.write(self.style.SUCCESS(
+            f"median {statistics.median(timings):.2f}ms, max {max(timings):.2f}ms over {repeat} runs"
+        ))
@@ -0,0 +1,31 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rideon.dispatch import wave_metrics
+
+
+def seconds(value):
+    return '-' if value is None else f'{value:.0f}s'
+
+
+class Command(BaseCommand):
+    help = 'Report offer acceptance and time to accept per dispatch wave'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24, help='Report on offers made this many hours back')
+
+    def handle(self, *args, **options):
+        metrics = wave_metrics(timezone.now() - timedelta(hours=options['hours']))
+
+        self.stdout.write(f"📨 Offers in the last {options['hours']:g}h")
+        self.stdout.write("=" * 50)
+        if not metrics:
+            self.stdout.write("No offers")
+            return
+
+        self.stdout.write(f"{'Wave':<6}{'Rides':>8}{'Offers':>8}{'Accepted':>10}{'Rate':>7}"
+                          f"{'p50 req':>9}{'p90 req':>9}{'p50 offer':>11}")
+        for row in metrics:
+            self.stdout.write(f"{row['wave']:<6}{row['rides']:>8}{row['offers']:>8}{row['accepted']:>10}"
+                              f"{row['acceptance_rate']:>7.0%}{seconds(row['p50_from_request']):>9}"
+                              f"{seconds(row['p90_from_request']):>9}{seconds(row['p50_from_offer']):>11}")
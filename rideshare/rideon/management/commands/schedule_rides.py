@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from rideon.scheduler import (SCHEDULER_HORIZON, SCHEDULER_REFRESH_SECONDS, WHEEL_TICK_SECONDS, TimingWheel,
+                              load_upcoming, release_rides)
+
+
+class Command(BaseCommand):
+    help = 'Release scheduled rides to drivers and the dispatcher shortly before pickup (run one)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lead', type=int, default=settings.SCHEDULED_RIDE_LEAD_MINUTES,
+                            help='Minutes before pickup to release a ride')
+        parser.add_argument('--horizon', type=int, default=int(SCHEDULER_HORIZON.total_seconds() // 60),
+                            help='Minutes past the lead time to hold in memory')
+        parser.add_argument('--refresh', type=float, default=SCHEDULER_REFRESH_SECONDS,
+                            help='Seconds between reloads that pick up new bookings')
+        parser.add_argument('--once', action='store_true', help='Release the rides due now and exit')
+
+    def handle(self, *args, **options):
+        lead = timedelta(minutes=options['lead'])
+        horizon = timedelta(minutes=options['horizon'])
+        wheel = TimingWheel(time.time())
+        if horizon.total_seconds() + options['refresh'] >= wheel.span * WHEEL_TICK_SECONDS:
+            raise CommandError(f"Horizon must be under {wheel.span * WHEEL_TICK_SECONDS // 60} minutes")
+
+        loaded_at = time.monotonic()
+        loaded = load_upcoming(wheel, lead, horizon)
+        self.stdout.write(f"⏰ {loaded} scheduled rides due for release in the next "
+                          f"{options['horizon']} minutes ({options['lead']} minutes before pickup)")
+
+        while True:
+            due = wheel.advance(time.time())
+            if due:
+                close_old_connections()
+                released = release_rides(due)
+                self.stdout.write(f"🚦 Released {released} scheduled rides ({len(wheel)} waiting)")
+
+            if options['once']:
+                return
+            if time.monotonic() - loaded_at >= options['refresh']:
+                close_old_connections()
+                loaded_at = time.monotonic()
+                load_upcoming(wheel, lead, horizon)
+            time.sleep(WHEEL_TICK_SECONDS - time.time() % WHEEL_TICK_SECONDS)
@@ -0,0 +1,34 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from rideon.driver_table import DriverTable, sync_driver_table
+
+
+class Command(BaseCommand):
+    help = 'Keep the shared-memory driver table in sync with driver positions and availability (one per host)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1, help='Seconds between syncs')
+        parser.add_argument('--once', action='store_true', help='Sync once and exit')
+        parser.add_argument('--path', default=settings.DRIVER_TABLE_PATH)
+        parser.add_argument('--capacity', type=int, default=settings.DRIVER_TABLE_CAPACITY)
+
+    def handle(self, *args, **options):
+        try:
+            table = DriverTable.create(options['path'], options['capacity'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"🗺️  Driver table at {table.path} ({table.capacity} slots, {table.count} in use)")
+
+        while True:
+            started = time.perf_counter()
+            close_old_connections()
+            changed = sync_driver_table(table)
+            elapsed = (time.perf_counter() - started) * 1000
+            if changed or options['once']:
+                self.stdout.write(f"{table.count} drivers, {changed} changed ({elapsed:.0f}ms)")
+
+            if options['once']:
+                return
+            time.sleep(max(0, options['interval'] - elapsed / 1000))
@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+from collections import Counter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+from rideon.models import Ride
+from rideon.seed import seed_users, seed_rides
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Fire parallel accepts at the same rides and check exactly one driver wins each'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', type=int, default=20, help='Drivers racing for each ride')
+        parser.add_argument('--rides', type=int, default=50, help='Rides to race for')
+
+    def handle(self, *args, **options):
+        driver_count = options['drivers']
+        ride_count = options['rides']
+
+        self.stdout.write(f"🏁 {driver_count} drivers racing for {ride_count} rides")
+        self.stdout.write("=" * 50)
+
+        # Losing accepts are expected; don't log a warning for each 409
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+
+        # Seeded rows must be committed so every thread's connection can see them
+        riders = seed_users(1, prefix='racerider')
+        drivers = seed_users(driver_count, user_type='DRIVER', prefix='racedriver')
+        seeded_users = riders + drivers
+        tokens = [str(RefreshToken.for_user(driver).access_token) for driver in drivers]
+
+        try:
+            rides = seed_rides(riders, ride_count)
+            outcomes = Counter()
+            failures = []
+            elapsed = 0.0
+
+            for ride in rides:
+                results = []
+                barrier = threading.Barrier(driver_count)
+
+                def accept(token):
+                    client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+                    try:
+                        barrier.wait()
+                        results.append(client.put(f'/api/{ride.id}/accept/').status_code)
+                    finally:
+                        connection.close()
+
+                threads = [threading.Thread(target=accept, args=(token,)) for token in tokens]
+                started = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed += time.perf_counter() - started
+
+                outcomes.update(results)
+                if results.count(200) != 1 or results.count(409) != driver_count - 1:
+                    failures.append((ride.id, Counter(results)))
+
+            winners = Ride.objects.filter(id__in=[ride.id for ride in rides], status='accepted').count()
+        finally:
+            User.objects.filter(id__in=[user.id for user in seeded_users]).delete()
+
+        total = ride_count * driver_count
+        self.stdout.write(f"Responses: {dict(outcomes)}")
+        self.stdout.write(f"Accepted rides: {winners}/{ride_count}")
+        self.stdout.write(f"Throughput: {total / elapsed:.0f} accept requests/s "
+                          f"({elapsed / ride_count * 1000:.1f}ms per contested ride)")
+
+        if failures or winners != ride_count:
+            for ride_id, counts in failures[:10]:
+                self.stdout.write(self.style.ERROR(f"❌ Ride {ride_id}: {dict(counts)}"))
+            raise CommandError('Accept race produced more or fewer than one winner per ride')
+
+        self.stdout.write(self.style.SUCCESS("✅ Exactly one driver won every ride"))
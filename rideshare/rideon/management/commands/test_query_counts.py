@@ -0,0 +1,100 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.authentication import user_cache_enabled
+from core.caching import clear_local
+from rideon.seed import seed_users, seed_rides, seed_messages, seed_ratings
+
+# Maximum queries per request with a warm auth cache, independent of list size
+QUERY_BUDGETS = {
+    'rides': 1,
+    'available_rides': 2,  # Cold cache: live offers and the pending pool; 1 once the pool is cached
+    'available_rides_nearby': 1,
+    'ride_messages': 2,
+    'ride_messages_after': 2,
+    'unread_messages': 1,
+    'my_ratings': 1,
+    'driver_dashboard': 0,
+    'fare_info_surge': 0,
+}
+
+LIST_SIZES = [1, 100, 1000]
+
+
+class Command(BaseCommand):
+    help = 'Check that ride list endpoints run a fixed number of queries for any list size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=LIST_SIZES,
+                            help='List sizes to seed and measure')
+
+    def handle(self, *args, **options):
+        self.stdout.write("🔍 Measuring queries per request")
+        self.stdout.write("=" * 50)
+
+        counts = {name: {} for name in QUERY_BUDGETS}
+        for size in options['sizes']:
+            for name, queries in self.measure(size).items():
+                counts[name][size] = queries
+
+        # Without a shared cache every request loads its user (see core.authentication)
+        user_queries = 0 if user_cache_enabled() else 1
+        if user_queries:
+            self.stdout.write("Auth user cache off (per-process cache), allowing a user query per request")
+
+        failures = []
+        for name, by_size in counts.items():
+            budget = QUERY_BUDGETS[name] + user_queries
+            line = ', '.join(f'{size}: {queries}' for size, queries in by_size.items())
+            if len(set(by_size.values())) > 1 or max(by_size.values()) > budget:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"❌ {name} ({line}; budget {budget})"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"✅ {name} ({line})"))
+
+        if failures:
+            raise CommandError(f"Query count regression in: {', '.join(failures)}")
+
+    def measure(self, size):
+        """Seed `size` rows per list in a rolled-back transaction and count queries per endpoint"""
+        with transaction.atomic():
+            riders = seed_users(size, prefix=f'qc{size}rider')
+            driver = seed_users(1, user_type='DRIVER', prefix=f'qc{size}driver')[0]
+            seed_rides(riders, size)
+            accepted = seed_rides(riders, size, status='accepted', drivers=[driver])
+            messages = seed_messages(accepted[0], size)
+            seed_ratings(driver, riders)
+
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(driver).access_token}')
+            requests = {
+                'rides': '/api/',
+                'available_rides': '/api/available/',
+                'available_rides_nearby': '/api/available/?lat=6.55&lng=3.375&radius=50&limit=100',
+                'ride_messages': f'/api/{accepted[0].id}/messages/',
+                'ride_messages_after': f'/api/{accepted[0].id}/messages/?after={messages[size // 2].id}',
+                'unread_messages': '/api/messages/unread/',
+                'my_ratings': '/api/my-ratings/',
+                'driver_dashboard': '/driver-dashboard/',
+                'fare_info_surge': '/api/fare-info/?lat=6.55&lng=3.375',
+            }
+
+            # Warm the auth cache so only the steady-state queries are counted
+            client.get('/driver-dashboard/')
+
+            counts = {}
+            for name, url in requests.items():
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                if response.status_code != 200:
+                    raise CommandError(f"{url} returned {response.status_code}")
+                counts[name] = len(queries)
+
+            transaction.set_rollback(True)
+
+        # Rolled-back ids get reused, so cached users and reads from this run must not leak into the next
+        cache.clear()
+        clear_local()
+        return counts
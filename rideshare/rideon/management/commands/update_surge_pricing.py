@@ -0,0 +1,36 @@
+import time
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from core.caching import is_process_local
+from rideon.pricing import SurgeTable
+
+
+class Command(BaseCommand):
+    help = 'Keep the surge multiplier table up to date from pending rides and free drivers, recomputing only changed cells'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=10, help='Seconds between updates')
+        parser.add_argument('--once', action='store_true', help='Update once and exit')
+
+    def handle(self, *args, **options):
+        # The table is published for the web workers; in this process's memory they would never see it
+        if is_process_local(DEFAULT_CACHE_ALIAS):
+            raise CommandError("The default cache is per-process memory, so web workers can't read the surge table; "
+                               "set CACHE_BACKEND and CACHE_LOCATION to a shared cache (Redis or memcached)")
+        surge = SurgeTable()
+        while True:
+            started = time.perf_counter()
+            close_old_connections()
+            stats = surge.update()
+            elapsed = (time.perf_counter() - started) * 1000
+
+            table = stats['table']
+            peak = max(table.values(), default=1.0)
+            recomputed = 'all' if stats['rebuilt'] else stats['recomputed']
+            self.stdout.write(f"⚡ {len(table)} surging cells, {stats['changed']} changed, "
+                              f"{recomputed} cells recomputed, peak {peak:.1f}x ({elapsed:.0f}ms)")
+
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+from rideon.geo import geohash_encode
+
+
+def backfill_pickup_geohash(apps, schema_editor):
+    Ride = apps.get_model('rideon', 'Ride')
+    rides = Ride.objects.filter(pickup_geohash='').only('id', 'pickup_latitude', 'pickup_longitude')
+    batch = []
+    for ride in rides.iterator(chunk_size=1000):
+        ride.pickup_geohash = geohash_encode(float(ride.pickup_latitude), float(ride.pickup_longitude))
+        batch.append(ride)
+        if len(batch) >= 1000:
+            Ride.objects.bulk_update(batch, ['pickup_geohash'])
+            batch = []
+    if batch:
+        Ride.objects.bulk_update(batch, ['pickup_geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rideon', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='pickup_geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Geohash of the pickup point, used for proximity lookups', max_length=12),
+        ),
+        migrations.RunPython(backfill_pickup_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rideon', '0002_ride_pickup_geohash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['rated_user', '-created_at'], name='rating_rated_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['rider', '-created_at', '-id'], name='ride_rider_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['driver', '-created_at', '-id'], name='ride_driver_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['-created_at'], name='ride_pending_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['pickup_geohash'], name='ride_pending_geohash_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='ridemessage',
+            index=models.Index(fields=['ride', '-created_at'], name='ridemessage_ride_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='rating',
+            name='rated_user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ratings_received', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='ride',
+            name='driver',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rides_as_driver', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='ride',
+            name='pickup_geohash',
+            field=models.CharField(blank=True, editable=False, help_text='Geohash of the pickup point, used for proximity lookups', max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='ride',
+            name='rider',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='rides_as_rider', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='ridemessage',
+            name='ride',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='rideon.ride'),
+        ),
+    ]
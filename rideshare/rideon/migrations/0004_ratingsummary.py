@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+CATEGORIES = ['rating', 'punctuality', 'communication', 'cleanliness', 'professionalism']
+
+
+def backfill_rating_summaries(apps, schema_editor):
+    Rating = apps.get_model('rideon', 'Rating')
+    RatingSummary = apps.get_model('rideon', 'RatingSummary')
+    DriverProfile = apps.get_model('core', 'DriverProfile')
+
+    aggregates = {}
+    for category in CATEGORIES:
+        aggregates[f'{category}_count'] = Count(category)
+        aggregates[f'{category}_sum'] = Sum(category)
+
+    summaries = []
+    for row in Rating.objects.values('rated_user_id').annotate(**aggregates).order_by():
+        summary = RatingSummary(user_id=row['rated_user_id'])
+        for category in CATEGORIES:
+            setattr(summary, f'{category}_count', row[f'{category}_count'])
+            setattr(summary, f'{category}_sum', row[f'{category}_sum'] or 0)
+        summaries.append(summary)
+    RatingSummary.objects.bulk_create(summaries, batch_size=1000)
+
+    for summary in summaries:
+        average = round(summary.rating_sum / summary.rating_count, 2)
+        DriverProfile.objects.filter(user_id=summary.user_id).update(rating=average)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_phoneverification_lookup_index'),
+        ('rideon', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('punctuality_count', models.PositiveIntegerField(default=0)),
+                ('punctuality_sum', models.PositiveIntegerField(default=0)),
+                ('communication_count', models.PositiveIntegerField(default=0)),
+                ('communication_sum', models.PositiveIntegerField(default=0)),
+                ('cleanliness_count', models.PositiveIntegerField(default=0)),
+                ('cleanliness_sum', models.PositiveIntegerField(default=0)),
+                ('professionalism_count', models.PositiveIntegerField(default=0)),
+                ('professionalism_sum', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_rating_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rideon', '0005_riderequest_offers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='riderequest',
+            name='accepted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='riderequest',
+            name='wave',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
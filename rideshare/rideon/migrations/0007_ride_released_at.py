@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rideon', '0006_riderequest_waves'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='released_at',
+            field=models.DateTimeField(blank=True, help_text='When a scheduled ride was released to drivers ahead of pickup', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(condition=models.Q(('is_scheduled', True), ('released_at__isnull', True), ('status', 'pending')), fields=['scheduled_pickup_time'], name='ride_scheduled_pickup_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rideon', '0007_ride_released_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ride',
+            name='ride_scheduled_pickup_idx',
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(condition=models.Q(('is_scheduled', True), ('status', 'pending')), fields=['scheduled_pickup_time'], name='ride_scheduled_pickup_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+
+
+def backfill_unread_counters(apps, schema_editor):
+    Ride = apps.get_model('rideon', 'Ride')
+    RideMessage = apps.get_model('rideon', 'RideMessage')
+    UnreadCounter = apps.get_model('rideon', 'UnreadCounter')
+
+    # Nothing could be marked read before, so start finished rides' conversations as read
+    RideMessage.objects.filter(ride__status__in=['completed', 'cancelled']).update(is_read=True)
+
+    rides = Ride.objects.filter(pk=OuterRef('ride_id'))
+    RideMessage.objects.filter(sender=F('ride__rider')).update(recipient=Subquery(rides.values('driver_id')[:1]))
+    RideMessage.objects.exclude(sender=F('ride__rider')).update(recipient=Subquery(rides.values('rider_id')[:1]))
+
+    unread = (RideMessage.objects
+              .filter(is_read=False, recipient__isnull=False)
+              .values('recipient_id')
+              .annotate(messages=Count('id'))
+              .order_by())
+    UnreadCounter.objects.bulk_create(
+        [UnreadCounter(user_id=row['recipient_id'], messages=row['messages']) for row in unread],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_driverprofile_heading'),
+        ('rideon', '0008_scheduled_pickup_index_all'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('messages', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ridemessage',
+            name='recipient',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages_received', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_unread_counters, migrations.RunPython.noop),
+    ]
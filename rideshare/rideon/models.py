@@ -1,8 +1,17 @@
+from datetime import timedelta
+from django.conf import settings
 from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
 from django.contrib.auth import get_user_model
+from .geo import geohash_encode
 
 User = get_user_model()
 
+# Rides open to drivers and the dispatcher: immediate rides, and scheduled
+# rides once the scheduler has released them
+RELEASED_RIDES = Q(is_scheduled=False) | Q(scheduled_pickup_time__isnull=True) | Q(released_at__isnull=False)
+
 class Ride(models.Model):
     RIDE_STATUS = [
         ('pending', 'Pending'),
@@ -12,12 +21,15 @@ class Ride(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
-    rider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rides_as_rider')
-    driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rides_as_driver', null=True, blank=True)
+    # Covered by the composite (rider|driver, created_at, id) indexes below
+    rider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rides_as_rider', db_index=False)
+    driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rides_as_driver', null=True, blank=True, db_index=False)
     
     pickup_location = models.CharField(max_length=255)
     pickup_latitude = models.DecimalField(max_digits=9, decimal_places=6)
     pickup_longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    pickup_geohash = models.CharField(max_length=12, blank=True, editable=False,
+                                      help_text="Geohash of the pickup point, used for proximity lookups")
     
     dropoff_location = models.CharField(max_length=255)
     dropoff_latitude = models.DecimalField(max_digits=9, decimal_places=6)
@@ -31,6 +43,8 @@ class Ride(models.Model):
     # Scheduling
     scheduled_pickup_time = models.DateTimeField(null=True, blank=True, help_text="When the rider wants to be picked up")
     is_scheduled = models.BooleanField(default=False, help_text="True if this is a scheduled ride, False for immediate")
+    released_at = models.DateTimeField(null=True, blank=True,
+                                       help_text="When a scheduled ride was released to drivers ahead of pickup")
     
     # Payment
     payment_method = models.CharField(max_length=20, default='cash', choices=[
@@ -44,18 +58,59 @@ class Ride(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Ride history: rides(), keyset-paginated on (created_at, id)
+            models.Index(fields=['rider', '-created_at', '-id'], name='ride_rider_created_idx'),
+            models.Index(fields=['driver', '-created_at', '-id'], name='ride_driver_created_idx'),
+            # The pending pool: available_rides(), newest first and by pickup cell
+            models.Index(fields=['-created_at'], name='ride_pending_created_idx',
+                         condition=Q(status='pending')),
+            models.Index(fields=['pickup_geohash'], name='ride_pending_geohash_idx',
+                         opclasses=['varchar_pattern_ops'], condition=Q(status='pending')),
+            # Pending scheduled rides by pickup time: the scheduler's and the reaper's range scans
+            models.Index(fields=['scheduled_pickup_time'], name='ride_scheduled_pickup_idx',
+                         condition=Q(status='pending', is_scheduled=True)),
+        ]
+    
+    @property
+    def is_released(self):
+        """Whether the ride is open to drivers; matches RELEASED_RIDES"""
+        return not self.is_scheduled or self.scheduled_pickup_time is None or self.released_at is not None
+    
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.is_released:
+            # Booked too close to pickup to wait for the scheduler
+            if self.scheduled_pickup_time <= timezone.now() + timedelta(minutes=settings.SCHEDULED_RIDE_LEAD_MINUTES):
+                self.released_at = timezone.now()
+        if self.pickup_latitude is not None and self.pickup_longitude is not None:
+            self.pickup_geohash = geohash_encode(float(self.pickup_latitude), float(self.pickup_longitude))
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'pickup_geohash' not in update_fields:
+                if 'pickup_latitude' in update_fields or 'pickup_longitude' in update_fields:
+                    kwargs['update_fields'] = list(update_fields) + ['pickup_geohash']
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"Ride {self.id} - {self.rider.email} ({self.status})"
 
 class RideRequest(models.Model):
+    """A pending ride offered to one driver by the dispatcher"""
     ride = models.ForeignKey(Ride, on_delete=models.CASCADE)
     driver = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField(blank=True)
+    pickup_distance = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)  # km
+    wave = models.PositiveSmallIntegerField(default=1)  # See rideon.dispatch.OFFER_WAVES
+    # Only drivers holding an offer can accept the ride until then; declining moves it to now
+    expires_at = models.DateTimeField(null=True, blank=True)
+    accepted_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         unique_together = ['ride', 'driver']
+        indexes = [
+            # Outstanding offers: ride_offers() and the dispatcher's busy drivers
+            models.Index(fields=['driver', 'expires_at'], name='riderequest_driver_expires_idx'),
+        ]
     
     def __str__(self):
         return f"Request for Ride {self.ride.id} by {self.driver.email}"
@@ -69,8 +124,11 @@ class RideMessage(models.Model):
         ('route_change', 'Route Change'),
     ]
     
-    ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='messages')
+    ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='messages', db_index=False)
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
+    # The other party on the ride when the message was sent; nobody before a driver accepts
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True,
+                                  related_name='messages_received')
     message_type = models.CharField(max_length=20, choices=MESSAGE_TYPES, default='general')
     message = models.TextField()
     is_read = models.BooleanField(default=False)
@@ -78,11 +136,50 @@ class RideMessage(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['ride', '-created_at'], name='ridemessage_ride_created_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.recipient_id is None:
+            if self.sender_id == self.ride.rider_id:
+                self.recipient_id = self.ride.driver_id
+            else:
+                self.recipient_id = self.ride.rider_id
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"Message for Ride {self.ride.id} from {self.sender.email}"
 
 
+class UnreadCounter(models.Model):
+    """
+    Unread ride messages per recipient, kept in sync by the RideMessage
+    signal handlers and mark-read so the badge never counts message rows.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='unread_counter')
+    messages = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    @classmethod
+    def apply(cls, user_id, delta):
+        """
+        Atomically add to a user's unread count
+        
+        Args:
+            user_id (int): The recipient
+            delta (int): Messages received, or negative for messages read
+        """
+        if not delta:
+            return
+        if delta > 0:
+            cls.objects.get_or_create(user_id=user_id)
+        cls.objects.filter(user_id=user_id).update(messages=F('messages') + delta, updated_at=timezone.now())
+    
+    def __str__(self):
+        return f"{self.messages} unread messages for user {self.user_id}"
+
+
 class Rating(models.Model):
     RATING_CHOICES = [
         (1, '1 Star'),
@@ -94,7 +191,7 @@ class Rating(models.Model):
     
     ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='ratings')
     rater = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ratings_given')
-    rated_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ratings_received')
+    rated_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ratings_received', db_index=False)
     
     rating = models.IntegerField(choices=RATING_CHOICES)
     comment = models.TextField(blank=True, help_text="Optional comment about the rating")
@@ -111,6 +208,62 @@ class Rating(models.Model):
     class Meta:
         unique_together = ['ride', 'rater', 'rated_user']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['rated_user', '-created_at'], name='rating_rated_user_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Rating {self.rating}/5 for {self.rated_user.email} by {self.rater.email} (Ride {self.ride.id})"
+
+
+class RatingSummary(models.Model):
+    """
+    Running totals of the ratings a user has received, kept in sync by the
+    Rating signal handlers so averages never need an aggregate query.
+    """
+    CATEGORIES = ['rating', 'punctuality', 'communication', 'cleanliness', 'professionalism']
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    punctuality_count = models.PositiveIntegerField(default=0)
+    punctuality_sum = models.PositiveIntegerField(default=0)
+    communication_count = models.PositiveIntegerField(default=0)
+    communication_sum = models.PositiveIntegerField(default=0)
+    cleanliness_count = models.PositiveIntegerField(default=0)
+    cleanliness_sum = models.PositiveIntegerField(default=0)
+    professionalism_count = models.PositiveIntegerField(default=0)
+    professionalism_sum = models.PositiveIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def average(self, category):
+        """Average score for a category, or 0 when nothing has been rated"""
+        count = getattr(self, f'{category}_count')
+        if not count:
+            return 0
+        return round(getattr(self, f'{category}_sum') / count, 2)
+    
+    @classmethod
+    def apply(cls, user_id, deltas):
+        """
+        Atomically add per-category changes to a user's summary
+        
+        Args:
+            user_id (int): The rated user
+            deltas (dict): {category: (count_delta, sum_delta)}
+        """
+        updates = {}
+        for category, (count_delta, sum_delta) in deltas.items():
+            if count_delta:
+                updates[f'{category}_count'] = F(f'{category}_count') + count_delta
+            if sum_delta:
+                updates[f'{category}_sum'] = F(f'{category}_sum') + sum_delta
+        if not updates:
+            return
+        cls.objects.get_or_create(user_id=user_id)
+        cls.objects.filter(user_id=user_id).update(updated_at=timezone.now(), **updates)
     
     def __str__(self):
-        return f"Rating {self.rating}/5 for {self.rated_user.email} by {self.rater.email} (Ride {self.ride.id})"
\ No newline at end of file
+        return f"Rating summary for user {self.user_id} ({self.rating_count} ratings)"
@@ -0,0 +1,464 @@
+"""
+Fare pricing
+Vectorised distance and fare calculation for many origin/destination pairs,
+and the surge multiplier table fares are scaled by
+"""
+from collections import Counter
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+import numpy as np
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Substr
+from django.utils import timezone
+from core.caching import cached, is_process_local
+from core.models import DriverProfile
+from .geo import EARTH_RADIUS_KM, geohash_encode
+from .models import Ride
+from .utils import BASE_FARE, PER_KM_RATE
+
+KOBO_PER_NAIRA = 100
+
+# Integer kobo, so quote arithmetic is exact once distance is priced
+BASE_FARE_KOBO = int(BASE_FARE * KOBO_PER_NAIRA)
+PER_KM_RATE_KOBO = int(PER_KM_RATE * KOBO_PER_NAIRA)
+
+# Upper bound on origins x destinations in a single quote request
+MAX_QUOTE_PAIRS = 100_000
+
+# Surge grid: geohash cells of about 4.9km x 4.9km
+SURGE_CELL_PRECISION = 5
+SURGE_CACHE_PREFIX = 'surge:cell:'
+SURGE_SNAPSHOT_KEY = 'surge:table'
+SURGE_DIRTY_SEQUENCE_KEY = 'surge:dirty'  # Slots claimed in the dirty log
+SURGE_DIRTY_PREFIX = 'surge:dirty:'
+SURGE_MIN_DEMAND = 3  # Cells with fewer pending rides never surge
+SURGE_STEP = 0.25  # Added to the multiplier per unit of demand/supply above 1
+MAX_SURGE_MULTIPLIER = 3.0
+SURGE_TABLE_TTL = 600  # Cells fall back to 1.0 if the updater stops running
+SURGE_LOOKUP_TTL = 60  # Seconds a cell's multiplier is cached for fare_info; updates invalidate it sooner
+SURGE_SCHEDULED_HORIZON = timedelta(minutes=30)  # Scheduled rides count as demand this close to pickup
+SURGE_LOCATION_MAX_AGE = timedelta(minutes=5)  # Older driver positions fall back to the last drop-off
+SURGE_REBUILD_INTERVAL = timedelta(minutes=10)  # Full recompute, correcting anything the dirty log missed
+SURGE_MAX_DIRTY_CELLS = 500  # More dirty cells than this are cheaper to recompute in full
+SURGE_DRIVER_BATCH = 1000  # Drivers placed per query
+SURGE_LOG_BATCH = 1000  # Dirty log slots read per cache round trip
+
+
+def parse_points(points):
+    """
+    Convert a list of [lat, lng] pairs into an (N, 2) float array
+
+    Raises:
+        ValueError: If the points aren't numeric pairs within coordinate bounds
+    """
+    try:
+        array = np.asarray(points, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError('Points must be [lat, lng] number pairs')
+    if array.ndim != 2 or array.shape[1] != 2 or len(array) == 0:
+        raise ValueError('Points must be a non-empty list of [lat, lng] pairs')
+    if not np.isfinite(array).all():
+        raise ValueError('Points must be finite numbers')
+    if (np.abs(array[:, 0]) > 90).any() or (np.abs(array[:, 1]) > 180).any():
+        raise ValueError('Invalid coordinates')
+    return array
+
+
+def distance_matrix(origins, destinations):
+    """
+    Haversine distance from every origin to every destination
+
+    Args:
+        origins (ndarray): (N, 2) array of [lat, lng] in degrees
+        destinations (ndarray): (M, 2) array of [lat, lng] in degrees
+
+    Returns:
+        ndarray: (N, M) distances in kilometers
+    """
+    origins = np.radians(origins)
+    destinations = np.radians(destinations)
+    lat1 = origins[:, 0:1]
+    lat2 = destinations[:, 0]
+    dlat = lat2 - lat1
+    dlon = destinations[:, 1] - origins[:, 1:2]
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def fares_kobo(distances_km, surge_multipliers=None):
+    """
+    Fares for a matrix of distances, in integer kobo
+
+    Matches calculate_fare() rounded to the kobo the way Ride.fare stores it:
+    the fare is rounded half to even, and non-positive distances pay the
+    base fare only.
+
+    Args:
+        distances_km (ndarray): (N, M) distances in kilometers
+        surge_multipliers (ndarray): Optional (N,) multiplier per origin
+
+    Returns:
+        ndarray: int64 fares in kobo, same shape as distances_km
+    """
+    fares = BASE_FARE_KOBO + np.maximum(distances_km, 0) * PER_KM_RATE_KOBO
+    if surge_multipliers is not None:
+        fares = fares * surge_multipliers[:, np.newaxis]
+    return np.rint(fares).astype(np.int64)
+
+
+def quote_matrix(origins, destinations):
+    """
+    Distances and fares for every origin/destination pair
+
+    Args:
+        origins (list): [lat, lng] pickup points
+        destinations (list): [lat, lng] destination points
+
+    Returns:
+        tuple: (N, M) distances in kilometers, (N, M) fares in kobo and the
+        (N,) surge multiplier applied at each origin
+
+    Raises:
+        ValueError: If the points are invalid or the matrix exceeds MAX_QUOTE_PAIRS
+    """
+    origins = parse_points(origins)
+    destinations = parse_points(destinations)
+    if len(origins) * len(destinations) > MAX_QUOTE_PAIRS:
+        raise ValueError(f'At most {MAX_QUOTE_PAIRS} origin/destination pairs per request')
+
+    distances = distance_matrix(origins, destinations)
+    multipliers = surge_multipliers(origins)
+    return distances, fares_kobo(distances, multipliers), multipliers
+
+
+def surge_cell(latitude, longitude):
+    """Get the surge grid cell containing a point"""
+    return geohash_encode(float(latitude), float(longitude), SURGE_CELL_PRECISION)
+
+
+def surge_multiplier(latitude, longitude):
+    """
+    Get the current surge multiplier for a pickup point
+
+    The table is precomputed by SurgeTable; busy cells are served
+    from the process's LRU, the rest with a single shared cache read
+
+    Returns:
+        float: The multiplier, 1.0 outside surging cells
+    """
+    return cell_surge(surge_cell(latitude, longitude))
+
+
+@cached('surge', ttl=SURGE_LOOKUP_TTL)
+def cell_surge(cell):
+    """A cell's multiplier from the published surge table"""
+    return cache.get(f'{SURGE_CACHE_PREFIX}{cell}', 1.0)
+
+
+def surge_multipliers(points):
+    """
+    Get the surge multiplier for each of an (N, 2) array of pickup points
+
+    Returns:
+        ndarray: (N,) multipliers
+    """
+    keys = [f'{SURGE_CACHE_PREFIX}{surge_cell(lat, lng)}' for lat, lng in points]
+    table = cache.get_many(set(keys))
+    return np.array([table.get(key, 1.0) for key in keys], dtype=np.float64)
+
+
+def multiplier_for(demand, supply):
+    """
+    Surge multiplier for a cell from its pending rides and available drivers
+
+    Rises by SURGE_STEP for every unit the demand/supply ratio exceeds 1,
+    in steps of 0.1, capped at MAX_SURGE_MULTIPLIER.
+    """
+    if demand < SURGE_MIN_DEMAND or demand <= supply:
+        return 1.0
+    ratio = demand / max(supply, 1)
+    return min(MAX_SURGE_MULTIPLIER, round(1 + (ratio - 1) * SURGE_STEP, 1))
+
+
+def mark_surge_dirty(cells=(), drivers=()):
+    """
+    Log surge cells whose pending rides changed, and drivers whose position
+    or availability changed, for the surge worker's next update, once the
+    transaction commits
+
+    Entries go in numbered slots of the shared cache, claimed with one
+    atomic incr; nothing is logged with a per-process cache, where the
+    worker can't run.
+
+    Args:
+        cells (iterable): Pickup geohashes, of any precision from SURGE_CELL_PRECISION
+        drivers (iterable): Driver user ids
+    """
+    entries = ([('cell', cell) for cell in {cell[:SURGE_CELL_PRECISION] for cell in cells if cell}]
+               + [('driver', driver_id) for driver_id in set(drivers) if driver_id])
+    if not entries or is_process_local(DEFAULT_CACHE_ALIAS):
+        return
+
+    def log():
+        try:
+            head = cache.incr(SURGE_DIRTY_SEQUENCE_KEY, len(entries))
+        except ValueError:
+            cache.add(SURGE_DIRTY_SEQUENCE_KEY, 0, timeout=None)
+            head = cache.incr(SURGE_DIRTY_SEQUENCE_KEY, len(entries))
+        first = head - len(entries) + 1
+        cache.set_many({f'{SURGE_DIRTY_PREFIX}{first + i}': entry for i, entry in enumerate(entries)},
+                       timeout=SURGE_TABLE_TTL)
+    transaction.on_commit(log)
+
+
+def cell_demand(cells=None):
+    """
+    Count pending rides per surge cell, in one grouped query on the pending index
+
+    Args:
+        cells (iterable): Only count these cells, None for every cell
+    """
+    now = timezone.now()
+    pending = Ride.objects.filter(status='pending').filter(
+        Q(is_scheduled=False) | Q(scheduled_pickup_time__lte=now + SURGE_SCHEDULED_HORIZON)
+    ).exclude(pickup_geohash='')
+    if cells is not None:
+        if not cells:
+            return {}
+        pending = pending.filter(reduce(or_, (Q(pickup_geohash__startswith=cell) for cell in cells)))
+    rows = (pending
+            .annotate(cell=Substr('pickup_geohash', 1, SURGE_CELL_PRECISION))
+            .values('cell')
+            .annotate(rides=Count('id'))
+            .order_by())
+    return {row['cell']: row['rides'] for row in rows}
+
+
+def place_drivers(driver_ids=None):
+    """
+    Place drivers in surge cells
+
+    An available driver who isn't on a ride is placed at their last reported
+    position while it is fresh, otherwise where their last completed ride
+    dropped off; anyone else, or a driver with neither, has no cell. A fixed
+    number of batched queries per SURGE_DRIVER_BATCH drivers, none of them
+    correlated per driver.
+
+    Args:
+        driver_ids (list): Drivers to place, None for every available driver
+
+    Returns:
+        tuple: {driver id: cell or None}, and {driver id: when their reported
+        position goes stale} for the drivers placed by it
+    """
+    now = timezone.now()
+    if driver_ids is None:
+        batches = [(DriverProfile.objects.filter(is_available=True),
+                    Ride.objects.filter(status__in=['accepted', 'in_progress']))]
+    else:
+        driver_ids = list(driver_ids)
+        batches = [(DriverProfile.objects.filter(user_id__in=ids),
+                    Ride.objects.filter(status__in=['accepted', 'in_progress'], driver_id__in=ids))
+                   for ids in (driver_ids[i:i + SURGE_DRIVER_BATCH]
+                               for i in range(0, len(driver_ids), SURGE_DRIVER_BATCH))]
+
+    cells = dict.fromkeys(driver_ids or (), None)
+    stale_at = {}
+    unplaced = []
+    for profiles, active in batches:
+        busy = set(active.values_list('driver_id', flat=True))
+        for driver_id, is_available, latitude, longitude, updated_at in profiles.values_list(
+                'user_id', 'is_available', 'latitude', 'longitude', 'location_updated_at'):
+            if not is_available or driver_id in busy:
+                cells[driver_id] = None
+            elif updated_at is not None and latitude is not None and updated_at > now - SURGE_LOCATION_MAX_AGE:
+                cells[driver_id] = surge_cell(latitude, longitude)
+                stale_at[driver_id] = updated_at + SURGE_LOCATION_MAX_AGE
+            else:
+                cells[driver_id] = None
+                unplaced.append(driver_id)
+
+    # Each driver's latest completed ride (ids follow created_at), then their drop-offs
+    for i in range(0, len(unplaced), SURGE_DRIVER_BATCH):
+        latest = (Ride.objects
+                  .filter(status='completed', driver_id__in=unplaced[i:i + SURGE_DRIVER_BATCH])
+                  .values('driver_id').annotate(latest=Max('id')).values('latest'))
+        for driver_id, latitude, longitude in (Ride.objects.filter(id__in=latest)
+                                               .values_list('driver_id', 'dropoff_latitude', 'dropoff_longitude')):
+            if latitude is not None and longitude is not None:
+                cells[driver_id] = surge_cell(latitude, longitude)
+    return cells, stale_at
+
+
+def horizon_cells(since, until):
+    """Cells of the pending scheduled rides that came within SURGE_SCHEDULED_HORIZON of pickup between two moments"""
+    geohashes = (Ride.objects
+                 .filter(status='pending', is_scheduled=True,
+                         scheduled_pickup_time__gt=since + SURGE_SCHEDULED_HORIZON,
+                         scheduled_pickup_time__lte=until + SURGE_SCHEDULED_HORIZON)
+                 .values_list('pickup_geohash', flat=True))
+    return {geohash[:SURGE_CELL_PRECISION] for geohash in geohashes if geohash}
+
+
+class SurgeTable:
+    """
+    The surge table, kept by the update_surge_pricing worker and published to the cache
+
+    The worker holds pending rides per cell and each free driver's cell in
+    memory. An update recomputes only the cells and drivers logged by
+    mark_surge_dirty() since the previous one, plus the drivers whose
+    position went stale and the scheduled rides that came within
+    SURGE_SCHEDULED_HORIZON meanwhile, and republishes the cells whose
+    multiplier that changes. Everything is recomputed on the first update,
+    every SURGE_REBUILD_INTERVAL to correct any drift, and whenever logged
+    entries were lost or more than SURGE_MAX_DIRTY_CELLS cells are dirty.
+    """
+
+    def __init__(self):
+        self.demand = {}
+        self.supply = Counter()
+        self.driver_cells = {}
+        self.stale_at = {}
+        self.table = None
+        self.cursor = None
+        self.gap = None
+        self.updated_at = None
+        self.rebuilt_at = None
+
+    def update(self):
+        """
+        Bring the table up to date and publish it
+
+        Returns:
+            dict: Surging cells, multipliers changed, cells recomputed and
+            whether it was a full rebuild
+        """
+        now = timezone.now()
+        logged = self.read_log()
+        cells = None
+        if logged is not None and self.rebuilt_at is not None and now - self.rebuilt_at < SURGE_REBUILD_INTERVAL:
+            cells, drivers = logged
+            drivers |= {driver_id for driver_id, stale_at in self.stale_at.items() if stale_at <= now}
+            cells |= self.place(place_drivers(drivers))
+            cells |= horizon_cells(self.updated_at, now)
+            if len(cells) > SURGE_MAX_DIRTY_CELLS:
+                cells = None
+
+        if cells is None:
+            self.rebuild(now)
+            cells = set(self.demand) | set(self.table)
+        else:
+            counts = cell_demand(cells)
+            for cell in cells:
+                if counts.get(cell):
+                    self.demand[cell] = counts[cell]
+                else:
+                    self.demand.pop(cell, None)
+        self.updated_at = now
+        changed = self.publish(cells)
+        return {'table': self.table, 'changed': changed, 'recomputed': len(cells), 'rebuilt': self.rebuilt_at == now}
+
+    def rebuild(self, now):
+        """Recompute every cell and driver"""
+        if self.table is None:
+            # Cells published before this worker started are recomputed, so any no longer surging are cleared
+            self.table = cache.get(SURGE_SNAPSHOT_KEY) or {}
+        self.demand = cell_demand()
+        self.driver_cells, self.stale_at = {}, {}
+        self.supply = Counter()
+        self.place(place_drivers())
+        self.rebuilt_at = now
+
+    def place(self, placed):
+        """
+        Move drivers to their new cells
+
+        Args:
+            placed (tuple): place_drivers()'s result
+
+        Returns:
+            set: Cells whose supply changed
+        """
+        cells, stale_at = placed
+        moved = set()
+        for driver_id, cell in cells.items():
+            previous = self.driver_cells.pop(driver_id, None)
+            self.stale_at.pop(driver_id, None)
+            if cell is not None:
+                self.driver_cells[driver_id] = cell
+            if previous == cell:
+                continue
+            for counted, delta in ((previous, -1), (cell, 1)):
+                if counted is not None:
+                    self.supply[counted] += delta
+                    moved.add(counted)
+        self.stale_at.update(stale_at)
+        self.supply = +self.supply
+        return moved
+
+    def read_log(self):
+        """
+        Collect the cells and drivers logged since the last update
+
+        A slot claimed but not yet written is waited for until the next
+        update; one still missing then was lost, e.g. evicted.
+
+        Returns:
+            tuple: Sets of cells and of driver ids, or None if entries were lost
+        """
+        head = cache.get(SURGE_DIRTY_SEQUENCE_KEY) or 0
+        if self.cursor is None or head < self.cursor:
+            # First update, or the log was reset
+            self.cursor, self.gap = head, None
+            return None
+
+        cells, drivers = set(), set()
+        slots = range(self.cursor + 1, head + 1)
+        for start in range(0, len(slots), SURGE_LOG_BATCH):
+            keys = [f'{SURGE_DIRTY_PREFIX}{slot}' for slot in slots[start:start + SURGE_LOG_BATCH]]
+            entries = cache.get_many(keys)
+            for slot, key in zip(slots[start:start + SURGE_LOG_BATCH], keys):
+                if key not in entries:
+                    if slot == self.gap:
+                        self.cursor, self.gap = head, None
+                        return None
+                    self.gap = slot
+                    return cells, drivers
+                kind, value = entries[key]
+                (cells if kind == 'cell' else drivers).add(value)
+                self.cursor = slot
+        self.gap = None
+        return cells, drivers
+
+    def publish(self, cells):
+        """
+        Recompute the multipliers of the given cells and publish the table
+
+        Surging cells are re-set every update to refresh their TTL; cells
+        that stopped surging are deleted and any other cell reads as 1.0.
+
+        Returns:
+            int: Cells whose multiplier changed
+        """
+        cleared = []
+        changed = 0
+        for cell in cells:
+            multiplier = multiplier_for(self.demand.get(cell, 0), self.supply.get(cell, 0))
+            if multiplier > 1:
+                changed += self.table.get(cell) != multiplier
+                self.table[cell] = multiplier
+            elif self.table.pop(cell, None) is not None:
+                cleared.append(cell)
+        changed += len(cleared)
+
+        cache.set_many({f'{SURGE_CACHE_PREFIX}{cell}': m for cell, m in self.table.items()}, timeout=SURGE_TABLE_TTL)
+        if cleared:
+            cache.delete_many([f'{SURGE_CACHE_PREFIX}{cell}' for cell in cleared])
+        cache.set(SURGE_SNAPSHOT_KEY, self.table, timeout=SURGE_TABLE_TTL)
+        if changed:
+            cell_surge.invalidate()
+        return changed
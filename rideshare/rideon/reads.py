@@ -0,0 +1,103 @@
+"""
+Cached hot reads
+Per-user ride totals and rating summaries, and the open ride list, served
+through core.caching and invalidated when the rows behind them change
+"""
+from django.db.models import Count, Q, Sum
+from core.caching import cached
+from .models import RELEASED_RIDES, Ride, RatingSummary
+from .serializers import RideSerializer
+
+RIDE_TOTALS_TTL = 300
+RATING_SUMMARY_TTL = 300
+# New rides don't invalidate the list, so this bounds how long one takes to appear (drivers
+# with the feed open see it at once), and how stale rider details in the list can be
+PENDING_RIDES_TTL = 10
+
+
+def _user_scope(user_id):
+    return user_id
+
+
+@cached('ride_totals', ttl=RIDE_TOTALS_TTL, scope=_user_scope)
+def ride_totals(user_id):
+    """
+    Lifetime ride counts and fare totals for a user, as rider and as driver, in one query
+
+    Returns:
+        dict: {'rider': {...}, 'driver': {...}} with total, by_status, total_fare and completed_fare
+    """
+    aggregates = {}
+    for role in ('rider', 'driver'):
+        mine = Q(**{f'{role}_id': user_id})
+        aggregates[f'{role}_total'] = Count('id', filter=mine)
+        aggregates[f'{role}_fare'] = Sum('fare', filter=mine)
+        aggregates[f'{role}_completed_fare'] = Sum('fare', filter=mine & Q(status='completed'))
+        for choice, _ in Ride.RIDE_STATUS:
+            aggregates[f'{role}_{choice}'] = Count('id', filter=mine & Q(status=choice))
+
+    totals = Ride.objects.filter(Q(rider_id=user_id) | Q(driver_id=user_id)).aggregate(**aggregates)
+
+    return {
+        role: {
+            'total': totals[f'{role}_total'],
+            'by_status': {choice: totals[f'{role}_{choice}'] for choice, _ in Ride.RIDE_STATUS},
+            'total_fare': totals[f'{role}_fare'] or 0,
+            'completed_fare': totals[f'{role}_completed_fare'] or 0,
+        }
+        for role in ('rider', 'driver')
+    }
+
+
+@cached('rating_summary', ttl=RATING_SUMMARY_TTL, scope=_user_scope)
+def rating_summary(user_id):
+    """
+    A user's rating count and per-category averages
+
+    Returns:
+        dict: total_ratings and averages
+    """
+    summary = RatingSummary.objects.filter(user_id=user_id).first() or RatingSummary(user_id=user_id)
+    return {
+        'total_ratings': summary.rating_count,
+        'averages': {
+            'overall': summary.average('rating'),
+            'punctuality': summary.average('punctuality'),
+            'communication': summary.average('communication'),
+            'cleanliness': summary.average('cleanliness'),
+            'professionalism': summary.average('professionalism')
+        }
+    }
+
+
+@cached('pending_rides', ttl=PENDING_RIDES_TTL)
+def pending_rides():
+    """
+    Every pending ride open to drivers, serialized
+
+    Returns:
+        list: RideSerializer data, newest first
+    """
+    rides = (Ride.objects.filter(status='pending')
+             .filter(RELEASED_RIDES)
+             .select_related('rider', 'driver'))
+    return list(RideSerializer(rides, many=True).data)
+
+
+def rides_changed(*user_ids, pool=True):
+    """
+    Invalidate the reads that depend on rides of these users, once the
+    transaction commits. Call this for changes made with queryset.update(),
+    which sends no post_save.
+
+    Args:
+        user_ids (int): Riders and drivers whose rides changed
+        pool (bool): Whether rides may have left the pending list. New rides
+            are left to PENDING_RIDES_TTL, so a burst of bookings doesn't
+            recompute the list in every process on every insert.
+    """
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if user_ids:
+        ride_totals.invalidate(*user_ids)
+    if pool:
+        pending_rides.invalidate()
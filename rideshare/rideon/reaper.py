@@ -0,0 +1,101 @@
+"""
+Pending ride reaper
+Cancels rides nobody accepted in time, a small batch per transaction, so the
+pending set that drivers and the dispatcher scan stays small
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Ride
+from .pricing import mark_surge_dirty
+from .reads import rides_changed
+from .signals import notify_ride_status
+
+logger = logging.getLogger(__name__)
+
+# Rides cancelled per transaction; bounds how long the reaper holds row locks
+REAPER_BATCH_SIZE = 500
+
+# Seconds between sweeps
+REAPER_INTERVAL_SECONDS = 60
+
+
+def stale_rides(now, ttl=None, grace=None):
+    """
+    Pending rides past their time to live, by reason, each ordered for a
+    range scan of a partial index on the pending set
+
+    Args:
+        now (datetime): The moment to measure from
+        ttl (timedelta): How long an immediate ride waits for a driver
+        grace (timedelta): How long past its pickup time a scheduled ride waits
+
+    Returns:
+        dict: Queryset of stale rides per reason, 'expired' for immediate
+        rides and 'overdue' for scheduled ones
+    """
+    ttl = ttl or timedelta(minutes=settings.PENDING_RIDE_TTL_MINUTES)
+    grace = grace or timedelta(minutes=settings.SCHEDULED_RIDE_GRACE_MINUTES)
+    return {
+        'expired': (Ride.objects
+                    .filter(status='pending', created_at__lt=now - ttl)
+                    .filter(Q(is_scheduled=False) | Q(scheduled_pickup_time__isnull=True))
+                    .order_by('created_at')),
+        'overdue': (Ride.objects
+                    .filter(status='pending', is_scheduled=True, scheduled_pickup_time__lt=now - grace)
+                    .order_by('scheduled_pickup_time')),
+    }
+
+
+def cancel_batch(rides, batch_size=REAPER_BATCH_SIZE):
+    """
+    Cancel up to batch_size rides in one short transaction. Rows another
+    transaction holds, e.g. a driver accepting the ride right now, are
+    skipped rather than waited for. A ride_cancelled event is published for
+    each once the transaction commits.
+
+    Returns:
+        int: Rides cancelled
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = {ride_id: (rider_id, cell) for ride_id, rider_id, cell in
+                   rides.select_for_update(skip_locked=True).values_list('id', 'rider_id', 'pickup_geohash')[:batch_size]}
+        if not claimed:
+            return 0
+        rides_changed(*{rider_id for rider_id, _ in claimed.values()})
+        mark_surge_dirty(cells=[cell for _, cell in claimed.values()])
+        cancelled = (Ride.objects
+                     .filter(id__in=claimed, status='pending')
+                     .update(status='cancelled', updated_at=now))
+        # The UPDATE sends no post_save; tell connected drivers the rides are gone
+        for ride_id in claimed:
+            notify_ride_status(ride_id, 'cancelled')
+        return cancelled
+
+
+def sweep(batch_size=REAPER_BATCH_SIZE, ttl=None, grace=None):
+    """
+    Cancel every stale pending ride, batch by batch
+
+    Returns:
+        Counter: Rides cancelled per reason, the batches run, and the size of
+        the pending set afterwards
+    """
+    counts = Counter()
+    for reason, rides in stale_rides(timezone.now(), ttl, grace).items():
+        while True:
+            cancelled = cancel_batch(rides, batch_size)
+            counts[reason] += cancelled
+            counts['batches'] += 1
+            if cancelled < batch_size:
+                break
+    counts['pending'] = Ride.objects.filter(status='pending').count()
+    if counts['expired'] or counts['overdue']:
+        logger.info(f"Reaper cancelled {counts['expired']} expired and {counts['overdue']} overdue rides "
+                    f"in {counts['batches']} batches, {counts['pending']} pending")
+    return counts
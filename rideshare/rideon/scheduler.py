@@ -0,0 +1,168 @@
+"""
+Scheduled ride release
+Scheduled rides stay out of the pending pool until shortly before pickup. A
+single scheduler process holds the upcoming ones in a timing wheel and
+releases each to drivers and the dispatcher at its lead time.
+"""
+import math
+from datetime import timedelta
+from django.utils import timezone
+from .events import ride_events
+from .models import Ride
+from .reads import pending_rides
+from .signals import notify_ride_created
+
+# A slot per second, and 64 slots on each of 3 levels: the wheel spans 64**3 s (about 72 hours)
+WHEEL_TICK_SECONDS = 1
+WHEEL_SLOTS = 64
+WHEEL_LEVELS = 3
+
+# How far past the lead time the scheduler loads rides, and how often it reloads to pick up new bookings
+SCHEDULER_HORIZON = timedelta(hours=1)
+SCHEDULER_REFRESH_SECONDS = 30
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel of keys due at given times
+
+    A slot on level n spans WHEEL_SLOTS**n ticks. Keys go into the lowest
+    level whose range reaches their due tick and cascade down a level each
+    time the wheel turns past their slot, so adding a key and collecting the
+    due ones costs the same however many are waiting. Re-adding a key moves
+    it; its old slot entry is skipped when reached.
+    """
+
+    def __init__(self, start, tick_seconds=WHEEL_TICK_SECONDS, slots=WHEEL_SLOTS, levels=WHEEL_LEVELS):
+        """
+        Args:
+            start (float): Epoch seconds the wheel starts turning from
+        """
+        self.tick_seconds = tick_seconds
+        self.slots = slots
+        self.span = slots ** levels
+        self.levels = [[[] for _ in range(slots)] for _ in range(levels)]
+        self.current = int(start // tick_seconds)
+        self.entries = {}  # key -> due tick
+        self.ready = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, key, when):
+        """
+        Schedule a key; keys already due come out of the next advance()
+
+        Args:
+            key: Hashable identifier, e.g. a ride id
+            when (float): Epoch seconds the key is due
+
+        Raises:
+            ValueError: When is further ahead than the wheel spans
+        """
+        due = math.ceil(when / self.tick_seconds)
+        if self.entries.get(key) == due:
+            return
+        if due - self.current >= self.span:
+            raise ValueError(f"{key} is due beyond the wheel's {self.span * self.tick_seconds}s span")
+        self.entries[key] = due
+        if due <= self.current:
+            self.ready.append((key, due))
+        else:
+            self._place(key, due)
+
+    def advance(self, now):
+        """
+        Turn the wheel up to now
+
+        Args:
+            now (float): Epoch seconds
+
+        Returns:
+            list: Keys that fell due, in due order
+        """
+        due = []
+        entries, self.ready = self.ready, []
+        self._expire(entries, due)
+        target = int(now // self.tick_seconds)
+        while self.current < target:
+            self.current += 1
+            # Cascade every level whose slot boundary this tick crosses, top down
+            for level in range(len(self.levels) - 1, 0, -1):
+                if self.current % self.slots ** level == 0:
+                    slot = (self.current // self.slots ** level) % self.slots
+                    entries, self.levels[level][slot] = self.levels[level][slot], []
+                    for key, tick in entries:
+                        if self.entries.get(key) == tick:
+                            self._place(key, tick)
+            slot = self.current % self.slots
+            entries, self.levels[0][slot] = self.levels[0][slot], []
+            self._expire(entries, due)
+        return due
+
+    def _expire(self, entries, due):
+        for key, tick in entries:
+            if self.entries.get(key) == tick:
+                del self.entries[key]
+                due.append(key)
+
+    def _place(self, key, tick):
+        delta = tick - self.current
+        level = 0
+        while delta >= self.slots ** (level + 1):
+            level += 1
+        self.levels[level][(tick // self.slots ** level) % self.slots].append((key, tick))
+
+
+def upcoming_rides(until):
+    """
+    Scheduled rides still waiting for release with pickup before a moment,
+    in one range scan of the ride_scheduled_pickup_idx partial index
+
+    Returns:
+        QuerySet: (ride id, scheduled pickup time) pairs, earliest first
+    """
+    return (Ride.objects
+            .filter(status='pending', is_scheduled=True, released_at__isnull=True,
+                    scheduled_pickup_time__lt=until)
+            .order_by('scheduled_pickup_time')
+            .values_list('id', 'scheduled_pickup_time'))
+
+
+def load_upcoming(wheel, lead, horizon=SCHEDULER_HORIZON):
+    """
+    Put every ride due for release within the horizon into the wheel
+
+    Rides already in the wheel keep their place, and rides whose release
+    time has passed, e.g. while the scheduler was down, come out of the next
+    advance().
+
+    Returns:
+        int: Rides loaded
+    """
+    rides = list(upcoming_rides(timezone.now() + lead + horizon))
+    for ride_id, pickup in rides:
+        wheel.add(ride_id, (pickup - lead).timestamp())
+    return len(rides)
+
+
+def release_rides(ride_ids):
+    """
+    Open scheduled rides to drivers and the dispatcher, and publish them to
+    the live ride feed. Rides cancelled or released since they were loaded
+    are left alone.
+
+    Returns:
+        int: Rides released
+    """
+    now = timezone.now()
+    released = (Ride.objects
+                .filter(id__in=ride_ids, status='pending', released_at__isnull=True)
+                .update(released_at=now, updated_at=now))
+    if released:
+        pending_rides.invalidate()
+        # The UPDATE sends no post_save; the rides this call released are the ones stamped with its time
+        if ride_events.has_audience:
+            for ride in Ride.objects.filter(id__in=ride_ids, released_at=now).select_related('rider', 'driver'):
+                notify_ride_created(ride)
+    return released
@@ -0,0 +1,141 @@
+"""
+Synthetic data for benchmark and diagnostic management commands
+"""
+import random
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from core.models import DriverProfile
+from .geo import geohash_encode
+from .models import Ride, RideMessage, Rating
+
+User = get_user_model()
+
+# Bounding box around Lagos used for generated coordinates
+LAGOS_BOUNDS = {
+    'lat': (6.40, 6.70),
+    'lng': (3.20, 3.55),
+}
+
+SEED_EMAIL_DOMAIN = 'seed.rideon.test'
+
+
+def random_point(rng=random):
+    """Get a random (lat, lng) inside the seed bounding box"""
+    lat = rng.uniform(*LAGOS_BOUNDS['lat'])
+    lng = rng.uniform(*LAGOS_BOUNDS['lng'])
+    return Decimal(f'{lat:.6f}'), Decimal(f'{lng:.6f}')
+
+
+def seed_users(count, user_type='RIDER', prefix='user'):
+    """
+    Create users for benchmarks with bulk_create
+
+    Returns:
+        list: Created users, with primary keys set
+    """
+    start = User.objects.filter(email__endswith=f'@{SEED_EMAIL_DOMAIN}').count()
+    users = [
+        User(
+            email=f'{prefix}{start + i}@{SEED_EMAIL_DOMAIN}',
+            phone_number=f'+999{start + i:011d}',
+            user_type=user_type,
+            is_email_verified=True,
+            is_phone_verified=True,
+        )
+        for i in range(count)
+    ]
+    for user in users:
+        user.set_unusable_password()
+    User.objects.bulk_create(users, batch_size=1000)
+    return list(User.objects.filter(email__in=[u.email for u in users]).order_by('id'))
+
+
+def seed_driver_profiles(drivers, located=False, rng=random):
+    """
+    Create a DriverProfile for each driver, optionally at a random current position
+
+    Returns:
+        list: Created profiles
+    """
+    profiles = []
+    for i, driver in enumerate(drivers):
+        profile = DriverProfile(
+            user=driver,
+            license_number=f'SEED{driver.id:08d}',
+            vehicle_make='Toyota',
+            vehicle_model='Corolla',
+            vehicle_year=2018,
+            vehicle_color='Silver',
+            vehicle_plate=f'SEED-{i:05d}',
+        )
+        if located:
+            profile.latitude, profile.longitude = random_point(rng)
+            profile.location_geohash = geohash_encode(float(profile.latitude), float(profile.longitude))
+            profile.location_updated_at = timezone.now()
+        profiles.append(profile)
+    return DriverProfile.objects.bulk_create(profiles, batch_size=1000)
+
+
+def seed_rides(riders, count, status='pending', drivers=None, rng=random):
+    """
+    Create rides for benchmarks with bulk_create
+
+    Returns:
+        list: Created rides
+    """
+    rides = []
+    for _ in range(count):
+        pickup_lat, pickup_lng = random_point(rng)
+        dropoff_lat, dropoff_lng = random_point(rng)
+        ride = Ride(
+            rider=rng.choice(riders),
+            driver=rng.choice(drivers) if drivers and status != 'pending' else None,
+            pickup_location='Seed pickup, Lagos',
+            pickup_latitude=pickup_lat,
+            pickup_longitude=pickup_lng,
+            # bulk_create skips save(), so fill the derived column here
+            pickup_geohash=geohash_encode(float(pickup_lat), float(pickup_lng)),
+            dropoff_location='Seed dropoff, Lagos',
+            dropoff_latitude=dropoff_lat,
+            dropoff_longitude=dropoff_lng,
+            status=status,
+            fare=Decimal('1000.00'),
+            distance=Decimal('10.00'),
+        )
+        rides.append(ride)
+    return Ride.objects.bulk_create(rides, batch_size=1000)
+
+
+def seed_messages(ride, count):
+    """Create chat messages on a ride, alternating between rider and driver"""
+    senders = [ride.rider, ride.driver or ride.rider]
+    messages = [
+        RideMessage(ride=ride, sender=senders[i % 2], message=f'Seed message {i}')
+        for i in range(count)
+    ]
+    return RideMessage.objects.bulk_create(messages, batch_size=1000)
+
+
+def seed_ratings(rated_user, raters, rng=random):
+    """
+    Create completed rides with rated_user as driver, each rated by its rider
+
+    Returns:
+        list: Created ratings
+    """
+    rides = seed_rides(raters, len(raters), status='completed', drivers=[rated_user], rng=rng)
+    ratings = [
+        Rating(
+            ride=ride,
+            rater=ride.rider,
+            rated_user=rated_user,
+            rating=rng.randint(1, 5),
+            punctuality=rng.randint(1, 5),
+            communication=rng.randint(1, 5),
+            cleanliness=rng.randint(1, 5),
+            professionalism=rng.randint(1, 5),
+        )
+        for ride in rides
+    ]
+    return Rating.objects.bulk_create(ratings, batch_size=1000)
@@ -3,6 +3,7 @@ from django.utils import timezone
 import math
 from .models import Ride, RideRequest, RideMessage, Rating
 from .utils import calculate_fare
+from .pricing import surge_multiplier
 from core.serializers import UserSerializer
 
 class RideSerializer(serializers.ModelSerializer):
@@ -13,6 +14,13 @@ class RideSerializer(serializers.ModelSerializer):
         model = Ride
         fields = '__all__'
         read_only_fields = ['rider', 'created_at', 'updated_at']
+    
+    def __init__(self, *args, fields=None, **kwargs):
+        """Optionally restrict output to the given field names (sparse fieldsets)"""
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
 
 class RideCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -59,23 +67,20 @@ class RideCreateSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         """Create ride with calculated distance and fare"""
-        ride = super().create(validated_data)
-        
-        # Calculate distance using Haversine formula
-        if (ride.pickup_latitude and ride.pickup_longitude and 
-            ride.dropoff_latitude and ride.dropoff_longitude):
+        # Calculate distance using Haversine formula, so the ride is inserted complete
+        if (validated_data.get('pickup_latitude') and validated_data.get('pickup_longitude') and 
+            validated_data.get('dropoff_latitude') and validated_data.get('dropoff_longitude')):
             distance = self.calculate_distance(
-                float(ride.pickup_latitude), float(ride.pickup_longitude),
-                float(ride.dropoff_latitude), float(ride.dropoff_longitude)
+                float(validated_data['pickup_latitude']), float(validated_data['pickup_longitude']),
+                float(validated_data['dropoff_latitude']), float(validated_data['dropoff_longitude'])
             )
-            ride.distance = round(distance, 2)
-            
-            # Calculate fare using centralized function
-            ride.fare = calculate_fare(distance)
+            validated_data['distance'] = round(distance, 2)
             
-            ride.save()
+            # Calculate fare using centralized function, with the pickup area's surge
+            multiplier = surge_multiplier(validated_data['pickup_latitude'], validated_data['pickup_longitude'])
+            validated_data['fare'] = calculate_fare(distance, multiplier)
         
-        return ride
+        return super().create(validated_data)
     
     @staticmethod
     def calculate_distance(lat1, lon1, lat2, lon2):
@@ -115,7 +120,7 @@ class RideMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = RideMessage
         fields = '__all__'
-        read_only_fields = ['id', 'ride', 'sender', 'created_at']
+        read_only_fields = ['id', 'ride', 'sender', 'recipient', 'is_read', 'created_at']
 
 
 class RatingSerializer(serializers.ModelSerializer):
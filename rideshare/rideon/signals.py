@@ -0,0 +1,148 @@
+"""
+Signal handlers for rideon models: the live ride feed, rating summaries,
+unread message counters and the cached reads built on them
+"""
+from decimal import Decimal
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from core.models import DriverProfile
+from .events import ride_events
+from .models import Ride, RideMessage, Rating, RatingSummary, UnreadCounter
+from .pricing import mark_surge_dirty
+from .reads import rating_summary, rides_changed
+
+
+@receiver(pre_save, sender=Ride)
+def remember_previous_status(sender, instance, update_fields=None, **kwargs):
+    """Keep the stored status of an edited ride so only a change of status is published"""
+    instance._previous_status = None
+    if instance.pk and not instance._state.adding and (update_fields is None or 'status' in update_fields):
+        instance._previous_status = Ride.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Ride)
+def publish_ride_event(sender, instance, created, **kwargs):
+    """Notify connected drivers when a ride enters or leaves the pending pool"""
+    if created and instance.is_released:
+        notify_ride_created(instance)
+    elif not created and getattr(instance, '_previous_status', None) not in (None, instance.status):
+        notify_ride_status(instance.pk, instance.status)
+
+
+@receiver(post_save, sender=Ride)
+@receiver(post_delete, sender=Ride)
+def mark_ride_surge(sender, instance, created=False, signal=None, **kwargs):
+    """Queue a ride's pickup cell and driver for the surge worker when it is added, removed or changes status"""
+    if created or signal is post_delete or getattr(instance, '_previous_status', None) not in (None, instance.status):
+        mark_surge_dirty(cells=[instance.pickup_geohash], drivers=[instance.driver_id])
+
+
+@receiver(post_save, sender=DriverProfile)
+def mark_driver_surge(sender, instance, **kwargs):
+    """Queue a driver for the surge worker when their profile, e.g. availability, changes"""
+    mark_surge_dirty(drivers=[instance.user_id])
+
+
+@receiver(post_save, sender=Ride)
+@receiver(post_delete, sender=Ride)
+def invalidate_ride_reads(sender, instance, created=False, **kwargs):
+    rides_changed(instance.rider_id, instance.driver_id, pool=not created)
+
+
+def notify_ride_created(ride, to=None):
+    """
+    Publish a ride entering the pending pool once the transaction commits.
+    Call this directly for rides released with queryset.update(), and with
+    `to` for the drivers getting back a ride they were told was reserved.
+    """
+    def publish_created():
+        from .serializers import RideSerializer
+        if ride_events.has_audience:
+            ride_events.publish('ride_created', RideSerializer(ride).data, to=to)
+    transaction.on_commit(publish_created)
+
+
+def notify_ride_reserved(ride_id, driver_ids):
+    """
+    Publish a dispatcher offer once the transaction commits, so every driver
+    but the ones offered the ride drops it from their list
+    """
+    def publish_reserved():
+        if ride_events.has_audience:
+            ride_events.publish('ride_reserved', {'id': ride_id}, exclude=driver_ids)
+    transaction.on_commit(publish_reserved)
+
+
+def notify_ride_status(ride_id, status):
+    """
+    Publish a status change once the transaction commits. Call this directly
+    for changes made with queryset.update(), which sends no post_save.
+    """
+    def publish_status():
+        if ride_events.has_audience:
+            ride_events.publish(f'ride_{status}', {'id': ride_id, 'status': status})
+    if status in ('accepted', 'cancelled'):
+        transaction.on_commit(publish_status)
+
+
+def rating_values(rating):
+    """Get {category: score} for the categories a rating filled in"""
+    return {
+        category: getattr(rating, category)
+        for category in RatingSummary.CATEGORIES
+        if getattr(rating, category) is not None
+    }
+
+
+def update_rating_summary(user_id, added=None, removed=None):
+    """Apply a rating's old and new scores to the summary and the driver profile"""
+    deltas = {}
+    for values, sign in ((added or {}, 1), (removed or {}, -1)):
+        for category, score in values.items():
+            count_delta, sum_delta = deltas.get(category, (0, 0))
+            deltas[category] = (count_delta + sign, sum_delta + sign * score)
+    RatingSummary.apply(user_id, deltas)
+    rating_summary.invalidate(user_id)
+    
+    if deltas.get('rating', (0, 0)) != (0, 0):
+        summary = RatingSummary.objects.get(user_id=user_id)
+        average = summary.average('rating') if summary.rating_count else 5
+        DriverProfile.objects.filter(user_id=user_id).update(rating=Decimal(str(average)))
+
+
+@receiver(pre_save, sender=Rating)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Keep the stored scores of an edited rating so the summary can subtract them"""
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = Rating.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Rating)
+def add_rating_to_summary(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if created or previous is None:
+        update_rating_summary(instance.rated_user_id, added=rating_values(instance))
+    elif previous.rated_user_id == instance.rated_user_id:
+        update_rating_summary(instance.rated_user_id, added=rating_values(instance), removed=rating_values(previous))
+    else:
+        update_rating_summary(previous.rated_user_id, removed=rating_values(previous))
+        update_rating_summary(instance.rated_user_id, added=rating_values(instance))
+
+
+@receiver(post_delete, sender=Rating)
+def remove_rating_from_summary(sender, instance, **kwargs):
+    update_rating_summary(instance.rated_user_id, removed=rating_values(instance))
+
+
+@receiver(post_save, sender=RideMessage)
+def count_unread_message(sender, instance, created, **kwargs):
+    if created and instance.recipient_id and not instance.is_read:
+        UnreadCounter.apply(instance.recipient_id, 1)
+
+
+@receiver(post_delete, sender=RideMessage)
+def uncount_unread_message(sender, instance, **kwargs):
+    if instance.recipient_id and not instance.is_read:
+        UnreadCounter.apply(instance.recipient_id, -1)
@@ -1,18 +1,30 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Under ASGI the read-heavy endpoints are served by coroutines; their writes still reach the DRF views
+reads = async_views if settings.ASYNC_API else views
 
 urlpatterns = [
-    path('', views.rides, name='rides'),
+    path('', reads.rides, name='rides'),
+    path('summary/', views.ride_summary, name='ride_summary'),
     path('fare-info/', views.fare_info, name='fare_info'),
-    path('available/', views.available_rides, name='available_rides'),
+    path('quotes/', views.fare_quotes, name='fare_quotes'),
+    path('available/', reads.available_rides, name='available_rides'),
+    path('feed/', views.ride_feed, name='ride_feed'),
+    path('location/', views.driver_location, name='driver_location'),
+    path('offers/', views.ride_offers, name='ride_offers'),
+    path('messages/unread/', views.unread_messages, name='unread_messages'),
     path('<int:ride_id>/accept/', views.accept_ride, name='accept_ride'),
+    path('<int:ride_id>/decline/', views.decline_ride, name='decline_ride'),
     path('<int:ride_id>/status/', views.update_ride_status, name='update_ride_status'),
-    path('<int:ride_id>/messages/', views.ride_messages, name='ride_messages'),
+    path('<int:ride_id>/messages/', reads.ride_messages, name='ride_messages'),
+    path('<int:ride_id>/messages/read/', views.mark_messages_read, name='mark_messages_read'),
     path('<int:ride_id>/arrival/', views.driver_arrival_notification, name='driver_arrival'),
     
     # Rating endpoints
     path('<int:ride_id>/ratings/', views.ride_ratings, name='ride_ratings'),
     path('ratings/<int:rating_id>/', views.rating_detail, name='rating_detail'),
-    path('users/<int:user_id>/ratings/', views.user_ratings, name='user_ratings'),
-    path('my-ratings/', views.user_ratings, name='my_ratings'),
+    path('users/<int:user_id>/ratings/', reads.user_ratings, name='user_ratings'),
+    path('my-ratings/', reads.user_ratings, name='my_ratings'),
 ]
\ No newline at end of file
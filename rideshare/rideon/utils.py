@@ -7,21 +7,23 @@ from decimal import Decimal
 BASE_FARE = Decimal('100.00')  # Base fare in Naira
 PER_KM_RATE = Decimal('50.00')  # Rate per kilometer in Naira
 
-def calculate_fare(distance_km):
+def calculate_fare(distance_km, surge_multiplier=1):
     """
     Calculate ride fare based on distance
     
     Args:
         distance_km (float): Distance in kilometers
+        surge_multiplier (float): Surge multiplier for the pickup area
         
     Returns:
         Decimal: Calculated fare in Naira
     """
+    multiplier = Decimal(str(surge_multiplier))
     if not distance_km or distance_km < 0:
-        return BASE_FARE
+        return BASE_FARE * multiplier
     
     distance = Decimal(str(distance_km))
-    return BASE_FARE + (distance * PER_KM_RATE)
+    return (BASE_FARE + (distance * PER_KM_RATE)) * multiplier
 
 def get_fare_info():
     """
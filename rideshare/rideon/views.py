@@ -1,26 +1,162 @@
+import asyncio
+from datetime import datetime
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Q, Avg
+from django.db import transaction
+from django.db.models import Q, Exists, OuterRef
 from django.views.generic import TemplateView
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.exceptions import TokenError
 from core.mixins import JWTRequiredMixin, RiderRequiredMixin
-from .models import Ride, RideRequest, RideMessage, Rating
+from .models import RELEASED_RIDES, Ride, RideRequest, RideMessage, Rating, UnreadCounter
 from .serializers import RideSerializer, RideCreateSerializer, RideRequestSerializer, RideMessageSerializer, RatingSerializer, RatingCreateSerializer
 from .utils import get_fare_info
+from .pricing import mark_surge_dirty, quote_matrix, surge_multiplier
+from .geo import haversine, covering_geohashes
+from .events import addressed_to, ride_events, format_sse
+from .locations import location_buffer
+from .driver_table import driver_position, pickup_estimate
+from .signals import notify_ride_status
+from .pagination import CreatedAtCursorPagination
+from .reads import ride_totals, rating_summary, rides_changed, pending_rides as cached_pending_rides
 # from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema
 
+# Proximity search limits for available rides
+DEFAULT_SEARCH_RADIUS_KM = 10
+MAX_SEARCH_RADIUS_KM = 50
+DEFAULT_NEAREST_LIMIT = 20
+MAX_NEAREST_LIMIT = 100
+
+# Seconds between keep-alive comments on the ride feed
+FEED_KEEPALIVE_SECONDS = 15
+
+# Pings accepted in one location upload
+MAX_PINGS_PER_REQUEST = 500
+
+User = get_user_model()
+
+
+def _parse_moment(value):
+    """Parse an ISO date or datetime query parameter into an aware datetime"""
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            moment = datetime.combine(day, datetime.min.time())
+    except ValueError:
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _offers_to_others(driver):
+    """
+    Unexpired dispatcher offers on rides this driver holds no unexpired offer for
+
+    The one definition of a ride being reserved for other drivers, read as an
+    expression by _offered_to_others() and as ride ids by _offered_elsewhere()
+    """
+    live = RideRequest.objects.filter(expires_at__gt=timezone.now())
+    return live.exclude(ride__in=live.filter(driver=driver).values('ride_id'))
+
+
+def _offered_to_others(driver):
+    """Whether the outer ride is under a dispatcher offer that this driver isn't part of"""
+    return Exists(_offers_to_others(driver).filter(ride=OuterRef('pk')))
+
+
+def _parse_ping(ping, now):
+    """Validate a location ping, returning (latitude, longitude, recorded_at, heading) or None"""
+    try:
+        latitude = float(ping['latitude'])
+        longitude = float(ping['longitude'])
+        heading = float(ping['heading']) if ping.get('heading') is not None else None
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    if heading is not None and not 0 <= heading <= 360:
+        return None
+    recorded_at = now
+    if ping.get('recorded_at'):
+        recorded_at = _parse_moment(str(ping['recorded_at']))
+        if recorded_at is None:
+            return None
+    # A device clock running fast mustn't pin the driver's position in the future
+    return latitude, longitude, min(recorded_at, now), heading
+
+
+def _user_rides(request):
+    """
+    The current user's rides, filtered by the query parameters
+
+    Shared by the rides view and its async counterpart in rideon.async_views.
+
+    Returns:
+        tuple: (queryset, fields), fields being the sparse fieldset or None
+
+    Raises:
+        ValidationError: If a parameter is invalid, with the message under 'error'
+    """
+    role = request.query_params.get('role')
+    if role == 'rider':
+        user_rides = Ride.objects.filter(rider=request.user)
+    elif role == 'driver':
+        user_rides = Ride.objects.filter(driver=request.user)
+    elif role is None:
+        user_rides = Ride.objects.filter(Q(rider=request.user) | Q(driver=request.user))
+    else:
+        raise ValidationError({'error': 'role must be rider or driver'})
+    
+    statuses = request.query_params.get('status')
+    if statuses:
+        statuses = statuses.split(',')
+        if not set(statuses) <= {choice for choice, _ in Ride.RIDE_STATUS}:
+            raise ValidationError({'error': 'Invalid status'})
+        user_rides = user_rides.filter(status__in=statuses)
+    
+    for param, lookup in (('created_after', 'created_at__gte'), ('created_before', 'created_at__lt')):
+        value = request.query_params.get(param)
+        if value:
+            moment = _parse_moment(value)
+            if moment is None:
+                raise ValidationError({'error': f'{param} must be an ISO date or datetime'})
+            user_rides = user_rides.filter(**{lookup: moment})
+    
+    # Sparse fieldsets: only load and serialize the requested fields
+    fields = request.query_params.get('fields')
+    if fields:
+        fields = fields.split(',')
+        unknown = set(fields) - set(RideSerializer().fields)
+        if unknown:
+            raise ValidationError({'error': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        related = [name for name in ('rider', 'driver') if name in fields]
+        return user_rides.select_related(*related).only('id', 'created_at', *fields), fields
+    return user_rides.select_related('rider', 'driver'), None
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 def rides(request):
     if request.method == 'GET':
-        # Get rides for the current user
-        user_rides = Ride.objects.filter(
-            Q(rider=request.user) | Q(driver=request.user)
-        )
-        serializer = RideSerializer(user_rides, many=True)
-        return Response(serializer.data)
+        # Get rides for the current user, one page at a time
+        user_rides, fields = _user_rides(request)
+        paginator = CreatedAtCursorPagination()
+        page = paginator.paginate_queryset(user_rides, request)
+        serializer = RideSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
     
     elif request.method == 'POST':
         serializer = RideCreateSerializer(data=request.data)
@@ -29,37 +165,182 @@ def rides(request):
             return Response(RideSerializer(ride).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def ride_summary(request):
+    """Get lifetime ride counts and fare totals for the current user, cached until their rides change"""
+    return Response(ride_totals(request.user.id))
+
+def _search_area(request, position):
+    """
+    Where an available rides search looks: ``lat`` and ``lng``, or the driver's position for ``near=me``
+
+    Args:
+        position (tuple | None): The driver's last reported (lat, lng), only used for ``near=me``
+
+    Returns:
+        tuple | None: (lat, lng, radius, limit), or None to list the whole pool
+
+    Raises:
+        ValidationError: If the parameters are invalid, with the message under 'error'
+    """
+    lat = request.query_params.get('lat')
+    lng = request.query_params.get('lng')
+    if request.query_params.get('near') == 'me':
+        if position is None:
+            raise ValidationError({'error': 'No recent location reported; send lat and lng instead'})
+        lat, lng = position
+    if lat is None and lng is None:
+        return None
+
+    try:
+        lat = float(lat)
+        lng = float(lng)
+        radius = float(request.query_params.get('radius', DEFAULT_SEARCH_RADIUS_KM))
+        limit = int(request.query_params.get('limit', DEFAULT_NEAREST_LIMIT))
+    except (TypeError, ValueError):
+        raise ValidationError({'error': 'lat, lng, radius and limit must be numeric'})
+
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValidationError({'error': 'Invalid coordinates'})
+    if radius <= 0 or limit <= 0:
+        raise ValidationError({'error': 'radius and limit must be positive'})
+    return lat, lng, min(radius, MAX_SEARCH_RADIUS_KM), min(limit, MAX_NEAREST_LIMIT)
+
+
+def _offered_elsewhere(driver):
+    """Ids of the rides under a dispatcher offer that this driver isn't part of, in one query"""
+    return _offers_to_others(driver).values_list('ride_id', flat=True)
+
+
+def _open_to(driver, pool, offered):
+    """The rides of the cached pool this driver may take"""
+    return [ride for ride in pool if ride['rider']['id'] != driver.id and ride['id'] not in offered]
+
+
+def _pending_near(driver, lat, lng, radius):
+    """Pending rides open to this driver in the geohash cells covering the search circle"""
+    # Narrow the candidates with the geohash index before computing exact distances
+    cell_filter = Q()
+    for cell in covering_geohashes(lat, lng, radius):
+        cell_filter |= Q(pickup_geohash__startswith=cell)
+
+    return (Ride.objects.filter(status='pending')
+            .filter(RELEASED_RIDES)
+            .exclude(rider=driver)
+            .exclude(_offered_to_others(driver))
+            .select_related('rider', 'driver')
+            .filter(cell_filter))
+
+
+def _nearest(rides, lat, lng, radius, limit):
+    """Serialize the nearest ``limit`` rides within ``radius`` km, closest first, with their pickup_distance"""
+    nearby = []
+    for ride in rides:
+        distance = haversine(lat, lng, float(ride.pickup_latitude), float(ride.pickup_longitude))
+        if distance <= radius:
+            nearby.append((distance, ride))
+    nearby.sort(key=lambda item: item[0])
+    nearby = nearby[:limit]
+
+    data = RideSerializer([ride for _, ride in nearby], many=True).data
+    for item, (distance, _) in zip(data, nearby):
+        item['pickup_distance'] = round(distance, 2)
+    return data
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 # @extend_schema(responses={200: RideSerializer(many=True)})
 def available_rides(request):
-    """Get all pending rides for drivers"""
-    pending_rides = Ride.objects.filter(status='pending').exclude(rider=request.user)
-    serializer = RideSerializer(pending_rides, many=True)
-    return Response(serializer.data)
+    """
+    Get pending rides for drivers.
+
+    When ``lat`` and ``lng`` are given, only the nearest ``limit`` rides whose
+    pickup is within ``radius`` km are returned, closest first. ``near=me``
+    searches around the driver's last reported position instead. Rides the
+    dispatcher is currently offering to another driver, and scheduled rides
+    not yet released, are left out.
+    """
+    position = driver_position(request.user.id) if request.query_params.get('near') == 'me' else None
+    area = _search_area(request, position)
+    if area is None:
+        # The whole pool is shared by every driver and cached; only the offers held by others are per request
+        return Response(_open_to(request.user, cached_pending_rides(), set(_offered_elsewhere(request.user))))
+
+    lat, lng, radius, limit = area
+    return Response(_nearest(_pending_near(request.user, lat, lng, radius), lat, lng, radius, limit))
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 # @extend_schema(responses={200: RideSerializer})
 def accept_ride(request, ride_id):
-    try:
-        ride = Ride.objects.get(id=ride_id, status='pending')
-        ride.driver = request.user
-        ride.status = 'accepted'
-        ride.save()
-        return Response(RideSerializer(ride).data)
-    except Ride.DoesNotExist:
-        return Response({'error': 'Ride not found'}, status=status.HTTP_404_NOT_FOUND)
+    # Claim the ride in a single conditional UPDATE so concurrent accepts can't both win,
+    # and a ride on offer to another driver can't be taken from them
+    claimed = (Ride.objects
+               .filter(RELEASED_RIDES, id=ride_id, status='pending')
+               .exclude(_offered_to_others(request.user))
+               .update(driver=request.user, status='accepted', updated_at=timezone.now()))
+    
+    if not claimed:
+        ride = Ride.objects.filter(id=ride_id).only('status', 'is_scheduled', 'scheduled_pickup_time', 'released_at').first()
+        if ride is None:
+            return Response({'error': 'Ride not found'}, status=status.HTTP_404_NOT_FOUND)
+        if ride.status == 'pending' and not ride.is_released:
+            return Response({'error': 'Scheduled ride is not open to drivers yet'}, status=status.HTTP_409_CONFLICT)
+        if ride.status == 'pending':
+            return Response({'error': 'Ride is currently offered to another driver'}, status=status.HTTP_409_CONFLICT)
+        return Response({'error': 'Ride is no longer available'}, status=status.HTTP_409_CONFLICT)
+    
+    # Time to accept per offer wave, for dispatch metrics
+    RideRequest.objects.filter(ride_id=ride_id, driver=request.user).update(accepted_at=timezone.now())
+    notify_ride_status(ride_id, 'accepted')
+    ride = Ride.objects.select_related('rider', 'driver').get(id=ride_id)
+    rides_changed(ride.rider_id, ride.driver_id)
+    mark_surge_dirty(cells=[ride.pickup_geohash], drivers=[ride.driver_id])
+    return Response(RideSerializer(ride).data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def ride_offers(request):
+    """
+    Get the rides the dispatcher is offering the driver, to accept before they expire
+    """
+    offers = (RideRequest.objects
+              .filter(driver=request.user, expires_at__gt=timezone.now(), ride__status='pending')
+              .select_related('ride__rider', 'ride__driver')
+              .order_by('expires_at'))
+    data = []
+    for offer in offers:
+        item = RideSerializer(offer.ride).data
+        item['pickup_distance'] = offer.pickup_distance
+        item['offer_wave'] = offer.wave
+        item['offer_expires_at'] = offer.expires_at
+        data.append(item)
+    return Response(data)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def decline_ride(request, ride_id):
+    """
+    Turn down an offered ride so the dispatcher offers it to another driver on its next tick
+    """
+    declined = RideRequest.objects.filter(
+        ride_id=ride_id, driver=request.user, expires_at__gt=timezone.now(),
+    ).update(expires_at=timezone.now())
+    if not declined:
+        return Response({'error': 'No open offer for this ride'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(status=status.HTTP_204_NO_CONTENT)
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 # @extend_schema(responses={200: RideSerializer})
 def update_ride_status(request, ride_id):
     try:
-        ride = Ride.objects.get(id=ride_id)
+        ride = Ride.objects.select_related('rider', 'driver').get(id=ride_id)
         
         # Check if user is involved in the ride
-        if ride.rider != request.user and ride.driver != request.user:
+        if ride.rider_id != request.user.id and ride.driver_id != request.user.id:
             return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
         
         new_status = request.data.get('status')
@@ -74,20 +355,41 @@ def update_ride_status(request, ride_id):
         return Response({'error': 'Ride not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
+def _thread(ride, request):
+    """
+    A ride's messages, or only those after the ``after`` message id
+
+    Raises:
+        ValidationError: If ``after`` isn't a message id
+    """
+    messages = RideMessage.objects.filter(ride=ride).select_related('sender')
+    after = request.query_params.get('after')
+    if after is not None:
+        try:
+            return messages.filter(id__gt=int(after))
+        except ValueError:
+            raise ValidationError({'error': 'after must be a message id'})
+    return messages
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 def ride_messages(request, ride_id):
-    """Get messages for a ride or send a new message"""
+    """
+    Get messages for a ride or send a new message
+
+    ``after=<message id>`` returns only the messages newer than the last one
+    the client has, so polling for replies doesn't re-download the thread.
+    """
     try:
         ride = Ride.objects.get(id=ride_id)
         
         # Check if user is involved in the ride
-        if ride.rider != request.user and ride.driver != request.user:
+        if ride.rider_id != request.user.id and ride.driver_id != request.user.id:
             return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
         
         if request.method == 'GET':
-            messages = RideMessage.objects.filter(ride=ride)
-            serializer = RideMessageSerializer(messages, many=True)
+            serializer = RideMessageSerializer(_thread(ride, request), many=True)
             return Response(serializer.data)
         
         elif request.method == 'POST':
@@ -101,6 +403,40 @@ def ride_messages(request, ride_id):
         return Response({'error': 'Ride not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_messages_read(request, ride_id):
+    """
+    Mark the messages the user received on a ride read, in one UPDATE
+
+    ``up_to=<message id>`` limits it to the messages the client has shown.
+    Returns how many were marked and the user's remaining unread count.
+    """
+    messages = RideMessage.objects.filter(ride_id=ride_id, recipient=request.user, is_read=False)
+    up_to = request.data.get('up_to')
+    if up_to is not None:
+        try:
+            messages = messages.filter(id__lte=int(up_to))
+        except (TypeError, ValueError):
+            return Response({'error': 'up_to must be a message id'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    with transaction.atomic():
+        marked = messages.update(is_read=True)
+        UnreadCounter.apply(request.user.id, -marked)
+    return Response({'marked': marked, 'unread': _unread_count(request.user)})
+
+
+def _unread_count(user):
+    return UnreadCounter.objects.filter(user=user).values_list('messages', flat=True).first() or 0
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def unread_messages(request):
+    """Get the user's unread message count for the dashboard badge, from their counter row"""
+    return Response({'unread': _unread_count(request.user)})
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def driver_arrival_notification(request, ride_id):
@@ -127,10 +463,10 @@ def driver_arrival_notification(request, ride_id):
 def ride_ratings(request, ride_id):
     """Get ratings for a ride or create a new rating"""
     try:
-        ride = Ride.objects.get(id=ride_id)
+        ride = Ride.objects.select_related('rider', 'driver').get(id=ride_id)
         
         # Check if user is involved in the ride
-        if ride.rider != request.user and ride.driver != request.user:
+        if ride.rider_id != request.user.id and ride.driver_id != request.user.id:
             return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
         
         # Only allow rating for completed rides
@@ -138,7 +474,7 @@ def ride_ratings(request, ride_id):
             return Response({'error': 'Can only rate completed rides'}, status=status.HTTP_400_BAD_REQUEST)
         
         if request.method == 'GET':
-            ratings = Rating.objects.filter(ride=ride)
+            ratings = Rating.objects.filter(ride=ride).select_related('rater', 'rated_user')
             serializer = RatingSerializer(ratings, many=True)
             return Response(serializer.data)
         
@@ -183,36 +519,23 @@ def ride_ratings(request, ride_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_ratings(request, user_id=None):
-    """Get ratings for a specific user or current user"""
+    """
+    Get the rating summary for a specific user or current user.
+    
+    Pass ``?details=true`` to include a page of the individual ratings.
+    """
     target_user_id = user_id or request.user.id
     
-    try:
-        # Get all ratings received by the user
-        ratings = Rating.objects.filter(rated_user_id=target_user_id)
-        
-        # Calculate average ratings
-        avg_overall = ratings.aggregate(Avg('rating'))['rating__avg'] or 0
-        avg_punctuality = ratings.aggregate(Avg('punctuality'))['punctuality__avg'] or 0
-        avg_communication = ratings.aggregate(Avg('communication'))['communication__avg'] or 0
-        avg_cleanliness = ratings.aggregate(Avg('cleanliness'))['cleanliness__avg'] or 0
-        avg_professionalism = ratings.aggregate(Avg('professionalism'))['professionalism__avg'] or 0
-        
-        ratings_data = RatingSerializer(ratings, many=True).data
-        
-        return Response({
-            'ratings': ratings_data,
-            'total_ratings': ratings.count(),
-            'averages': {
-                'overall': round(avg_overall, 2),
-                'punctuality': round(avg_punctuality, 2),
-                'communication': round(avg_communication, 2),
-                'cleanliness': round(avg_cleanliness, 2),
-                'professionalism': round(avg_professionalism, 2)
-            }
-        })
-        
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    data = dict(rating_summary(target_user_id))
+    
+    if request.query_params.get('details') in ('1', 'true'):
+        ratings = Rating.objects.filter(rated_user_id=target_user_id).select_related('rater', 'rated_user')
+        paginator = CreatedAtCursorPagination()
+        page = paginator.paginate_queryset(ratings, request)
+        data['ratings'] = RatingSerializer(page, many=True).data
+        data['next'] = paginator.get_next_link()
+    
+    return Response(data)
 
 
 @api_view(['PUT', 'DELETE'])
@@ -220,7 +543,7 @@ def user_ratings(request, user_id=None):
 def rating_detail(request, rating_id):
     """Update or delete a specific rating"""
     try:
-        rating = Rating.objects.get(id=rating_id, rater=request.user)
+        rating = Rating.objects.select_related('rater', 'rated_user').get(id=rating_id, rater=request.user)
         
         if request.method == 'PUT':
             serializer = RatingCreateSerializer(rating, data=request.data, partial=True)
@@ -239,8 +562,135 @@ def rating_detail(request, rating_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def fare_info(request):
-    """Get current fare calculation information"""
-    return Response(get_fare_info())
+    """
+    Get current fare calculation information.
+
+    With ``lat`` and ``lng``, also returns the surge multiplier for that pickup
+    point and, while the driver table is live, the free drivers nearby and the
+    nearest one's pickup ETA.
+    """
+    info = get_fare_info()
+    if 'lat' in request.query_params or 'lng' in request.query_params:
+        try:
+            lat = float(request.query_params['lat'])
+            lng = float(request.query_params['lng'])
+        except (KeyError, ValueError):
+            return Response({'error': 'lat and lng must both be numeric'}, status=status.HTTP_400_BAD_REQUEST)
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return Response({'error': 'Invalid coordinates'}, status=status.HTTP_400_BAD_REQUEST)
+        info['surge_multiplier'] = surge_multiplier(lat, lng)
+        info.update(pickup_estimate(lat, lng) or {})
+    return Response(info)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def driver_location(request):
+    """
+    Report the driver's position.
+
+    Body is one ping, ``{"latitude", "longitude", "heading"?, "recorded_at"?}``, or a batch
+    ``{"pings": [...]}`` uploaded after a connectivity gap. Only the newest ping
+    is kept; it is buffered in memory and written with other drivers' positions
+    in a bulk update every few seconds.
+    """
+    if request.user.user_type != 'DRIVER':
+        return Response({'error': 'Only drivers can report their location'}, status=status.HTTP_403_FORBIDDEN)
+
+    if not isinstance(request.data, dict):
+        return Response({'error': 'Expected a ping or {"pings": [...]}'}, status=status.HTTP_400_BAD_REQUEST)
+    pings = request.data['pings'] if 'pings' in request.data else [request.data]
+    if not isinstance(pings, list) or not pings:
+        return Response({'error': 'pings must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(pings) > MAX_PINGS_PER_REQUEST:
+        return Response({'error': f'At most {MAX_PINGS_PER_REQUEST} pings per request'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    now = timezone.now()
+    parsed = [_parse_ping(ping, now) if isinstance(ping, dict) else None for ping in pings]
+    if None in parsed:
+        return Response({'error': 'Each ping needs numeric latitude and longitude; recorded_at must be '
+                                  'ISO 8601 and heading between 0 and 360'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    latitude, longitude, recorded_at, heading = max(parsed, key=lambda ping: ping[2])
+    location_buffer.record(request.user.id, latitude, longitude, recorded_at, heading)
+    return Response({'accepted': len(parsed)}, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def fare_quotes(request):
+    """
+    Quote every origin/destination pair in one request.
+
+    Body: ``{"origins": [[lat, lng], ...], "destinations": [[lat, lng], ...]}``.
+    Returns N x M matrices of distances in km and fares in integer kobo, with
+    the surge multiplier applied at each origin.
+    """
+    try:
+        distances, fares, multipliers = quote_matrix(request.data.get('origins'), request.data.get('destinations'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'currency': 'NGN',
+        'distances_km': distances.round(3).tolist(),
+        'fares_kobo': fares.tolist(),
+        'surge_multipliers': multipliers.tolist(),
+    })
+
+async def ride_feed(request):
+    """
+    Stream ride events to drivers as Server-Sent Events.
+
+    Replaces polling ``available/``: clients load the list once, then apply
+    ``ride_created``, ``ride_accepted`` and ``ride_cancelled`` events, and
+    reload on ``resync``. While the dispatcher offers a ride to some drivers
+    the others get ``ride_reserved`` and drop it, as available/ does. Requires
+    the ASGI server.
+    """
+    if not isinstance(request, ASGIRequest):
+        # A long-lived stream would pin a WSGI worker; clients fall back to polling
+        return JsonResponse({'error': 'Ride feed requires the ASGI server'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    # Not taken from the query string, which would put tokens in access logs
+    token = request.COOKIES.get('access_token')
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not token and auth_header.startswith('Bearer '):
+        token = auth_header.split(' ')[1]
+
+    try:
+        user_id = AccessToken(token)['user_id'] if token else None
+        user = await User.objects.aget(id=user_id, is_active=True) if user_id else None
+    except (TokenError, KeyError, User.DoesNotExist):
+        user = None
+
+    if user is None:
+        return JsonResponse({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    async def stream():
+        subscription = ride_events.subscribe()
+        queue = subscription[1]
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=FEED_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                if addressed_to(event, user.id):
+                    yield format_sse(event)
+        finally:
+            ride_events.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 
 class RequestRideView(RiderRequiredMixin, TemplateView):
     """Custom view for request ride page with Google Maps API key and JWT authentication"""
@@ -2,6 +2,8 @@
 ASGI config for rideshare project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with gunicorn's uvicorn worker:
+gunicorn -c gunicorn.conf.py -k uvicorn_worker.UvicornWorker rideshare.asgi
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -12,5 +14,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rideshare.settings')
+# Route the read-heavy API endpoints to their async views, see ASYNC_API in settings
+os.environ.setdefault('ASYNC_API', 'True')
 
 application = get_asgi_application()
@@ -39,8 +39,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ConnectionCheckoutMiddleware',  # First, so checkouts by any later middleware are timed
+    'core.middleware.QueryCountMiddleware',  # Only with DB_QUERY_TIMING
     'corsheaders.middleware.CorsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.StaticFilesMiddleware',  # WhiteNoise, without forcing async requests onto a thread
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,6 +52,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Serve the read-heavy rideon endpoints with async views (rideon.async_views). rideshare/asgi.py turns
+# this on; under WSGI every request holds a thread anyway and the DRF views are cheaper.
+ASYNC_API = config('ASYNC_API', default=False, cast=bool)
+
 ROOT_URLCONF = 'rideshare.urls'
 
 TEMPLATES = [
@@ -74,17 +80,47 @@ WSGI_APPLICATION = 'rideshare.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Connections are kept per worker thread for DB_CONN_MAX_AGE seconds and health-checked before reuse;
+# 0 opens a new one per request. DB_POOL_SIZE > 0 uses a psycopg 3 pool of that many connections per
+# worker process instead (pip install "psycopg[binary,pool]"); size it to at least the worker's threads.
+# Under ASGI the ORM runs on a thread per request, so connections aren't kept there: use the pool.
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=600, cast=int)
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=0, cast=int)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # Django's PostgreSQL backend, timing connection checkouts for ConnectionCheckoutMiddleware
+        'ENGINE': 'core.db.backends.postgresql',
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE or ASYNC_API else DB_CONN_MAX_AGE,  # The pool keeps connections itself
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
 }
 
+if DB_POOL_SIZE:
+    from psycopg_pool import ConnectionPool
+
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': min(DB_POOL_SIZE, config('DB_POOL_MIN_SIZE', default=2, cast=int)),
+        'max_size': DB_POOL_SIZE,
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),  # Seconds a request waits for a free connection
+        'max_idle': 300,  # Idle connections above min_size are closed after this many seconds
+        'max_lifetime': 3600,
+        'check': ConnectionPool.check_connection,  # Health-check each connection as it is handed out
+    }
+
+# Seconds between log lines with the process's connection checkout totals
+DB_CHECKOUT_LOG_SECONDS = 60
+
+# Report each request's query count and time in a Server-Timing header (core.middleware.QueryCountMiddleware);
+# for load tests, as it tells clients about the queries behind each endpoint
+DB_QUERY_TIMING = config('DB_QUERY_TIMING', default=False, cast=bool)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -147,10 +183,56 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK ={
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    ]
+        "core.authentication.CachedJWTAuthentication",
+    ],
+    "EXCEPTION_HANDLER": "core.throttling.exception_handler",
+    # Proxies in front of the app that append to X-Forwarded-For. At 0 the client address
+    # is REMOTE_ADDR and X-Forwarded-For is ignored, so per-IP throttles can't be sidestepped
+    "NUM_PROXIES": config('NUM_PROXIES', default=0, cast=int),
+    # Sliding-window limits for the auth and OTP endpoints, see core.throttling
+    "DEFAULT_THROTTLE_RATES": {
+        "login": "20/min",  # Per IP address
+        "login_account": "10/min",  # Per email, across addresses
+        "register": "5/hour",
+        "register_account": "3/hour",  # Per email
+        "register_phone": "3/hour",  # Per phone number
+        "password_reset": "5/hour",
+        "password_reset_account": "3/hour",
+        "otp_send": "3/min",  # Per user
+        "otp_verify": "10/min",
+    },
+}
+
+# Shared cache. Defaults to per-process memory; set CACHE_BACKEND and CACHE_LOCATION to a shared
+# server (e.g. django.core.cache.backends.redis.RedisCache, redis://...) when running several workers
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='rideshare'),
+        'KEY_PREFIX': 'rideshare',
+        'TIMEOUT': 300,
+    },
 }
 
+# Read-through cache for hot reads (core.caching): a per-process LRU in front of TIERED_CACHE
+TIERED_CACHE = config('TIERED_CACHE', default='default')
+CACHE_LOCAL_MAX_ENTRIES = 2048
+CACHE_LOCAL_TTL_SECONDS = 2  # How long other processes may serve a value after it is invalidated
+CACHE_EARLY_RECOMPUTE_BETA = 1.0  # Above 1 recomputes earlier, 0 disables early recomputation
+CACHE_LOCK_SECONDS = 5  # Longest a reader waits for another's recomputation before doing it itself
+CACHE_STATS_FLUSH_SECONDS = 10
+
+# Scales every DEFAULT_THROTTLE_RATES limit. Keep it at 1; load tests raise it, as their virtual users share an address
+THROTTLE_RATE_MULTIPLIER = config('THROTTLE_RATE_MULTIPLIER', default=1, cast=int)
+
+# Cache holding the throttle counters; point it at a shared cache (Redis, memcached) when running several workers
+THROTTLE_CACHE = config('THROTTLE_CACHE', default='default')
+
+# Phone verification codes (core.otp): cache holding live codes and their attempt counters
+OTP_CACHE = config('OTP_CACHE', default='default')
+OTP_TTL_MINUTES = 10
+OTP_MAX_ATTEMPTS = 3
+
 REST_AUTH_SERIALIZERS = {
     'USER_DETAILS_SERIALIZER': 'core.serializers.CustomUserDetailsSerializer',
 }
@@ -167,6 +249,10 @@ SIMPLE_JWT = {
     'UPDATE_LAST_LOGIN': False,
 }
 
+# Seconds a user loaded for JWT authentication is served from cache; saves invalidate it. Only used
+# with a shared CACHE_BACKEND, as other workers wouldn't see the invalidation in per-process memory
+AUTH_USER_CACHE_SECONDS = 60
+
 # CORS settings for frontend
 CORS_ALLOW_ALL_ORIGINS = DEBUG  # Only for development
 CORS_ALLOWED_ORIGINS = [
@@ -206,7 +292,13 @@ FRONTEND_URL = config("FRONTEND_URL", default="http://localhost:8000")
 # SMS Service Configuration
 # SMS Service Configuration
 SMS_ENABLED = True  # Enable SMS service
-SMS_PROVIDER = config('SMS_PROVIDER', default='mock')  # 'mock', 'twilio', or 'termii'
+# 'mock', 'twilio', 'termii' or 'fake'. Defaults to Twilio once its credentials are set, as the outbox
+# worker delivers through the configured provider; without them messages are only logged
+SMS_PROVIDER = config('SMS_PROVIDER', default='twilio' if config('TWILIO_ACCOUNT_SID', default='') else 'mock')
+SMS_FAKE_LATENCY_MS = config('SMS_FAKE_LATENCY_MS', default=200, cast=int)  # Round trip simulated by the fake provider
+SMS_FAKE_FAILURE_RATE = config('SMS_FAKE_FAILURE_RATE', default=0.0, cast=float)
+SMS_POOL_SIZE = 16  # Keep-alive connections per provider host; also caps send_many() concurrency
+SMS_TIMEOUTS = {'twilio': (3.05, 10), 'termii': (3.05, 15)}  # (connect, read) seconds
 
 # Twilio Configuration
 TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID', default='')
@@ -214,6 +306,27 @@ TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN', default='')
 TWILIO_PHONE_NUMBER = config('TWILIO_PHONE_NUMBER', default='')
 
 
+# Outbox worker (python manage.py send_outbox) delivering queued SMS and email
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=5, cast=int)  # Dead-letter after this many failures
+OUTBOX_RETRY_BASE_SECONDS = config('OUTBOX_RETRY_BASE_SECONDS', default=30, cast=int)  # Doubles on every retry
+OUTBOX_LEASE_SECONDS = 120  # A claimed message becomes due again if its worker dies mid-send
+
+
+# Shared-memory driver table, written by python manage.py sync_driver_table (one per host)
+DRIVER_TABLE_PATH = config('DRIVER_TABLE_PATH', default='/dev/shm/rideon-drivers' if os.path.isdir('/dev/shm')
+                           else os.path.join(BASE_DIR, 'rideon-drivers'))
+DRIVER_TABLE_CAPACITY = config('DRIVER_TABLE_CAPACITY', default=65536, cast=int)  # 48 bytes per driver
+
+
+# Scheduled rides are released to drivers this long before pickup by python manage.py schedule_rides
+SCHEDULED_RIDE_LEAD_MINUTES = config('SCHEDULED_RIDE_LEAD_MINUTES', default=15, cast=int)
+
+# Pending rides nobody accepted are cancelled by python manage.py expire_rides: immediate rides this long
+# after the request, scheduled rides this long after their pickup time
+PENDING_RIDE_TTL_MINUTES = config('PENDING_RIDE_TTL_MINUTES', default=30, cast=int)
+SCHEDULED_RIDE_GRACE_MINUTES = config('SCHEDULED_RIDE_GRACE_MINUTES', default=15, cast=int)
+
+
 # Phone Verification Settings
 PHONE_VERIFICATION_CODE_LENGTH = 6
 PHONE_VERIFICATION_CODE_EXPIRY_MINUTES = 10